@@ -1,21 +1,64 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, session, jsonify
+from flask import Flask, before_render_template, template_rendered, render_template, stream_template, request, redirect, url_for, flash, send_from_directory, session, jsonify, g, has_request_context, Response, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from markupsafe import Markup
+from datetime import datetime, timedelta
+import click
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+import hashlib
+import json
+import mimetypes
+import time
+from sqlalchemy import event, func, tuple_
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
 from functools import wraps
-import hashlib
-import scrypt
 
-# Monkey patch hashlib.scrypt to use the scrypt package since Python may not have it
-if not hasattr(hashlib, 'scrypt'):
-    def _scrypt(password, salt, n, r, p, buflen=64, maxmem=0):
-        return scrypt.hash(password, salt, N=n, r=r, p=p, buflen=buflen)
-    hashlib.scrypt = _scrypt
+# Sibling modules: importable both as `cba.app` (gunicorn) and as `app` (tests, python app.py)
+try:
+    from . import migrations
+    from .generations import FileCounter
+    from .hashing import HashingBusy, HashingPool
+    from . import sqlite_tuning
+    from . import images
+    from . import blobstore
+    from . import assets
+    from . import dataio
+    from .rendercache import RenderCache
+    from . import search
+    from . import plates
+    from . import changelog
+    from . import serializers
+    from .serializers import Field
+    from . import metrics
+    from . import profiler
+except ImportError:
+    import migrations
+    from generations import FileCounter
+    from hashing import HashingBusy, HashingPool
+    import sqlite_tuning
+    import images
+    import blobstore
+    import assets
+    import dataio
+    from rendercache import RenderCache
+    import search
+    import plates
+    import changelog
+    import serializers
+    from serializers import Field
+    import metrics
+    import profiler
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///clamping_business.db'
+app.json = serializers.JSONProvider(app)
+# DATABASE_URL lets tests and scripts point the app at a different database
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///clamping_business.db')
 
 # Load SECRET_KEY from environment. If not set, generate a secure runtime
 # fallback and warn the operator. The runtime fallback is suitable for
@@ -32,109 +75,71 @@ else:
     print("WARNING: No SECRET_KEY set in environment. Using a runtime-generated fallback secret.")
     print("Set the environment variable SECRET_KEY to a persistent secret to enable stable sessions and to rotate the key safely.")
 
+# Directory for state shared by all workers on this host (counters, caches)
+app.config['STATE_DIR'] = os.environ.get('CBA_STATE_DIR') or app.instance_path
+
+# Password hashing runs in a small process pool per server process. Changing
+# PASSWORD_HASH_METHOD (e.g. 'scrypt:65536:8:1') rehashes each user's
+# password at their next login. HASH_POOL_WORKERS=0 hashes inline.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['HASH_POOL_WORKERS'] = int(os.environ.get('HASH_POOL_WORKERS', 2))
+app.config['HASH_POOL_MAX_PENDING'] = int(os.environ.get('HASH_POOL_MAX_PENDING', 16))
+password_hasher = HashingPool(workers=app.config['HASH_POOL_WORKERS'],
+                              max_pending=app.config['HASH_POOL_MAX_PENDING'],
+                              method=app.config['PASSWORD_HASH_METHOD'])
+
+# SQLite profile for several workers sharing one database file: see sqlite_tuning.py.
+# SQLITE_POOL_SIZE is per worker process; SQLITE_PRAGMAS overrides single pragmas.
+app.config['SQLITE_PRAGMAS'] = sqlite_tuning.parse_pragmas(os.environ.get('SQLITE_PRAGMAS'))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_tuning.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=int(os.environ.get('SQLITE_POOL_SIZE', 5)),
+    busy_timeout_ms=int(app.config['SQLITE_PRAGMAS']['busy_timeout']))
+
 db = SQLAlchemy(app)
+with app.app_context():
+    sqlite_tuning.install(db.engine, app.config['SQLITE_PRAGMAS'])
+
+# The schema is changed offline (`flask --app app migrate`, see migrations/). A
+# starting worker only compares the database's recorded version with the newest
+# migration: SCHEMA_CHECK=warn logs a mismatch, strict refuses to start, off skips it.
+app.config['SCHEMA_CHECK'] = os.environ.get('SCHEMA_CHECK', 'warn')
+
+
+def check_schema():
+    mode = app.config['SCHEMA_CHECK']
+    if mode == 'off':
+        return
+    current, expected = migrations.check(db.engine)
+    if current == expected:
+        return
+    if current is not None and current > expected:
+        app.logger.warning('Database schema is at v%04d, newer than this code (v%04d)', current, expected)
+        return
+    message = (f"Database schema is at {'no version' if current is None else f'v{current:04d}'}, "
+               f'this code needs v{expected:04d}: run `flask --app app migrate`')
+    if mode == 'strict':
+        raise migrations.SchemaOutOfDate(message)
+    app.logger.warning(message)
+
+
+with app.app_context():
+    check_schema()
 
 
 @app.context_processor
 def inject_common():
     # provide current year and whether the logged-in user is admin for templates
     try:
-        uid = session.get('user_id')
-        is_admin = False
-        username = None
-        if uid:
-            try:
-                user = User.query.get(uid)
-                is_admin = bool(user and user.is_admin)
-                username = user.username if user else None
-            except Exception:
-                is_admin = False
+        identity = current_identity()
+        is_admin = bool(identity and identity['is_admin'])
+        username = identity['username'] if identity else None
         return {'current_year': datetime.now().year, 'is_admin': is_admin, 'current_username': username}
     except RuntimeError:
         # session or DB not available during some CLI operations
         return {'current_year': datetime.now().year, 'is_admin': False, 'current_username': None}
 
 
-def _sqlite_db_path_from_uri(uri: str):
-    # support forms: sqlite:///relative.db or sqlite:////absolute/path.db
-    if not uri.startswith('sqlite:'):
-        return None
-    # strip prefix
-    path = uri.split(':', 1)[1]
-    # remove leading ///
-    if path.startswith('///'):
-        path = path[3:]
-    elif path.startswith('//'):
-        path = path[2:]
-    if path == ':memory:':
-        return None
-    return os.path.abspath(path)
-
-
-def ensure_force_password_column():
-    """If using SQLite and the `user` table exists without the
-    `force_password_change` column, add it via ALTER TABLE.
-    This is non-destructive and idempotent.
-    """
-    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
-    candidate_paths = []
-    # First, try the path from the SQLALCHEMY URI
-    db_path = _sqlite_db_path_from_uri(uri)
-    if db_path:
-        candidate_paths.append(db_path)
-    # Next, try the app instance DB (Flask's instance path)
-    try:
-        inst_path = os.path.join(app.instance_path or '', 'clamping_business.db')
-        candidate_paths.append(inst_path)
-    except Exception:
-        pass
-    # Finally, try current working directory DB
-    candidate_paths.append(os.path.abspath('clamping_business.db'))
-
-    # We'll ensure both `user.force_password_change` and `clamp_data.amount_paid` exist
-    required = [
-        ("user", "force_password_change", "INTEGER", "0"),
-        ("clamp_data", "amount_paid", "REAL", "0.0"),
-        ("clamp_data", "image_filename", "TEXT", "''"),
-        ("clamp_data", "time_called", "TEXT", "''"),
-        ("clamp_data", "car_type", "TEXT", "''"),
-        ("clamp_data", "color", "TEXT", "''"),
-        ("clamp_data", "clamp_ref", "TEXT", "''"),
-    ]
-    import sqlite3
-    for path in candidate_paths:
-        if not path or not os.path.exists(path):
-            continue
-        try:
-            conn = sqlite3.connect(path)
-            migrated_any = False
-            for table, col, coltype, default in required:
-                try:
-                    cur = conn.execute(f"PRAGMA table_info('{table}')")
-                    cols = [r[1] for r in cur.fetchall()]
-                except sqlite3.OperationalError:
-                    # table doesn't exist in this DB, skip
-                    continue
-                if col in cols:
-                    continue
-                # Add the column
-                sql = f"ALTER TABLE {table} ADD COLUMN {col} {coltype} DEFAULT {default}"
-                conn.execute(sql)
-                migrated_any = True
-                print(f"Migration: added column {col} to {table} in {path}")
-            if migrated_any:
-                conn.commit()
-            conn.close()
-            if migrated_any:
-                return
-        except Exception as e:
-            try:
-                conn.close()
-            except Exception:
-                pass
-            print(f'Migration warning for {path}: could not ensure schema columns: {e}')
-    # nothing migrated
-
 # Database Model
 class ClampData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -148,29 +153,122 @@ class ClampData(db.Model):
     color = db.Column(db.String(100))
     clamp_ref = db.Column(db.String(200))
     image_filename = db.Column(db.String(300))
+    # resized, EXIF-free copies of image_filename (see images.py); NULL until built
+    image_small = db.Column(db.String(300))
+    image_medium = db.Column(db.String(300))
+    # idempotency key generated by the client (offline queue, form resubmits)
+    client_key = db.Column(db.String(64))
+    # registration reduced to A-Z0-9 (plates.normalize), set on every write
+    plate = db.Column(db.String(100))
     offense = db.Column(db.String(300), nullable=False)
     payment_status = db.Column(db.String(50), default='Processing')  # Paid, Not Paid, Processing
     amount_paid = db.Column(db.Float, default=0.0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # bumped on every change to the row (see _bump_revision); keys the
+    # rendered-invoice cache and the ETag of the clamp's JSON
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Composite indexes end in id so keyset pages (ORDER BY clamp_date, id) stay
+    # index range reads under each filter. Existing databases get these from
+    # migrations/v0001_hot_column_indexes.py.
+    __table_args__ = (
+        db.Index('ix_clamp_data_clamp_date_id', 'clamp_date', 'id'),
+        db.Index('ix_clamp_data_status_date_id', 'payment_status', 'clamp_date', 'id'),
+        db.Index('ix_clamp_data_location_date_id', 'location', 'clamp_date', 'id'),
+        db.Index('ix_clamp_data_registration_date_id', 'registration', 'clamp_date', 'id'),
+        db.Index('ix_clamp_data_client_key', 'client_key', unique=True),
+        db.Index('ix_clamp_data_plate_date_id', 'plate', 'clamp_date', 'id'),
+    )
 
     def __repr__(self):
         return f'<ClampData {self.id}>'
 
+
 # Appeals Model
 class Appeal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    clamp_id = db.Column(db.Integer, db.ForeignKey('clamp_data.id'), nullable=False)
-    clamp = db.relationship('ClampData', backref='appeals')
+    clamp_id = db.Column(db.Integer, db.ForeignKey('clamp_data.id'), nullable=False, index=True)
+    # passive_deletes: routes delete appeals explicitly before their clamp, so
+    # deleting a clamp must not lazy-load its appeal collection first
+    clamp = db.relationship('ClampData', backref=db.backref('appeals', passive_deletes=True))
     appeal_date = db.Column(db.Date, nullable=False, default=datetime.today)
     appeal_reason = db.Column(db.Text, nullable=False)
     appeal_status = db.Column(db.String(50), default='Pending')  # Pending, Approved, Rejected
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
         return f'<Appeal {self.id}>'
 
 
+def _bump_revision(mapper, connection, target):
+    # Only for real column changes (not relationship-only flushes). The SQL
+    # expression makes concurrent edits in other workers each count.
+    if sa_inspect(target).session.is_modified(target, include_collections=False):
+        target.revision = mapper.class_.revision + 1
+        target.updated_at = datetime.utcnow()
+
+
+for _versioned in (ClampData, Appeal):
+    event.listen(_versioned, 'before_update', _bump_revision)
+
+
+# The full-text (search.py) and plate trigram (plates.py) indexes live and die
+# with clamp_data; existing databases get them from migrations v0008 and v0009.
+for _index in (search, plates):
+    event.listen(ClampData.__table__, 'after_create', lambda target, connection, _index=_index, **kw: _index.install(connection))
+    event.listen(ClampData.__table__, 'before_drop', lambda target, connection, _index=_index, **kw: _index.drop(connection))
+
+# Writes to both tables are logged by triggers (changelog.py) for the live
+# change feed; existing databases get the log from migration v0010.
+for _logged in (ClampData.__table__, Appeal.__table__):
+    event.listen(_logged, 'after_create', lambda target, connection, **kw: changelog.install(connection, target.name))
+event.listen(ClampData.__table__, 'before_drop', lambda target, connection, **kw: changelog.drop(connection))
+
+
+@event.listens_for(ClampData, 'before_insert')
+@event.listens_for(ClampData, 'before_update')
+def _normalize_plate(mapper, connection, target):
+    target.plate = plates.normalize(target.registration)
+
+
+# Generation of clamp_data, shared by all workers: bumped after every commit
+# that wrote clamp rows (ORM flushes and UPDATE/DELETE/INSERT statements run
+# through the session), so anything derived from the table can be cached
+# under the generation it was built from. Writers going around the session
+# (bulk imports) bump it themselves.
+_clamp_generation = FileCounter(os.path.join(app.config['STATE_DIR'], 'clamp_generation'))
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_clamp_flush(session, flush_context):
+    if any(isinstance(o, ClampData) for o in (*session.new, *session.dirty, *session.deleted)):
+        session.info['clamps_written'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_clamp_statement(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    # ORM statements carry an annotated copy of the table, so compare names
+    if getattr(getattr(orm_execute_state.statement, 'table', None), 'name', None) == ClampData.__table__.name:
+        orm_execute_state.session.info['clamps_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_clamp_generation(session):
+    if session.info.pop('clamps_written', False):
+        _clamp_generation.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_clamp_writes(session):
+    session.info.pop('clamps_written', None)
+
+
 # Simple user model for authentication
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -178,19 +276,460 @@ class User(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     force_password_change = db.Column(db.Boolean, default=False)
+    # bumped whenever the password or role changes; sessions carrying an older value are revoked
+    credential_version = db.Column(db.Integer, nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def set_password(self, password):
+        self.password_hash = password_hasher.hash(password)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 
+# Daily revenue rollup: one row per (status, day, location, offense) holding the
+# clamp count and amount total. Kept current by the ClampData mapper events
+# below, so invoicing totals are read from a handful of rollup rows instead of
+# scanning clamp_data. The primary key leads with payment_status/day so a
+# "Paid between X and Y" read is a single index range.
+class ClampDailyRollup(db.Model):
+    __tablename__ = 'clamp_daily_rollup'
+    payment_status = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    location = db.Column(db.String(200), primary_key=True)
+    offense = db.Column(db.String(300), primary_key=True)
+    clamp_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<ClampDailyRollup {self.payment_status} {self.day} {self.location}>'
+
+
+ROLLUP_FIELDS = ('payment_status', 'clamp_date', 'location', 'offense', 'amount_paid')
+
+
+def _rollup_apply(connection, values, sign):
+    """Add (sign=1) or remove (sign=-1) one clamp's contribution to its rollup row."""
+    status, day, location, offense, amount = values
+    key = {'payment_status': status or 'Processing', 'day': day,
+           'location': location or '', 'offense': offense or ''}
+    table = ClampDailyRollup.__table__
+    stmt = sqlite_insert(table).values(clamp_count=sign, amount_total=sign * float(amount or 0.0), **key)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={'clamp_count': table.c.clamp_count + stmt.excluded.clamp_count,
+              'amount_total': table.c.amount_total + stmt.excluded.amount_total},
+    )
+    connection.execute(stmt)
+    if sign < 0:
+        connection.execute(table.delete().where(
+            *[table.c[k] == v for k, v in key.items()], table.c.clamp_count <= 0))
+
+
+@event.listens_for(ClampData, 'after_insert')
+def _rollup_after_insert(mapper, connection, target):
+    _rollup_apply(connection, [getattr(target, f) for f in ROLLUP_FIELDS], 1)
+
+
+@event.listens_for(ClampData, 'after_update')
+def _rollup_after_update(mapper, connection, target):
+    state = sa_inspect(target)
+    old, changed = [], False
+    for f in ROLLUP_FIELDS:
+        hist = state.attrs[f].history
+        if hist.has_changes():
+            changed = True
+            old.append(hist.deleted[0] if hist.deleted else None)
+        else:
+            old.append(getattr(target, f))
+    if changed:
+        _rollup_apply(connection, old, -1)
+        _rollup_apply(connection, [getattr(target, f) for f in ROLLUP_FIELDS], 1)
+
+
+@event.listens_for(ClampData, 'after_delete')
+def _rollup_after_delete(mapper, connection, target):
+    _rollup_apply(connection, [getattr(target, f) for f in ROLLUP_FIELDS], -1)
+
+
+def rebuild_clamp_rollup():
+    """Recompute clamp_daily_rollup from clamp_data in one INSERT ... SELECT.
+
+    Needed once for databases created before the rollup existed, and after
+    bulk writes that bypass the ORM events.
+    """
+    table = ClampDailyRollup.__table__
+    status = func.coalesce(ClampData.payment_status, 'Processing')
+    location = func.coalesce(ClampData.location, '')
+    offense = func.coalesce(ClampData.offense, '')
+    select_stmt = db.select(
+        status, ClampData.clamp_date, location, offense,
+        func.count(ClampData.id), func.coalesce(func.sum(ClampData.amount_paid), 0.0),
+    ).group_by(status, ClampData.clamp_date, location, offense)
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['payment_status', 'day', 'location', 'offense', 'clamp_count', 'amount_total'], select_stmt))
+    db.session.commit()
+
+
+def ensure_clamp_rollup():
+    """Populate an empty rollup table from existing clamps (no-op once populated)."""
+    has_rollup = db.session.query(ClampDailyRollup.day).first() is not None
+    if not has_rollup and db.session.query(ClampData.id).first() is not None:
+        rebuild_clamp_rollup()
+        print('Rebuilt clamp_daily_rollup from existing clamp records')
+
+
+# Reference counts for content-addressed photo blobs (blobstore.py). Kept by the
+# ClampData mapper events below, like the rollup; a blob whose count drops to
+# zero is deleted by sweep_photo_blobs once it has been idle for the grace period.
+class PhotoBlob(db.Model):
+    __tablename__ = 'photo_blob'
+    path = db.Column(db.String(300), primary_key=True)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<PhotoBlob {self.path} x{self.refcount}>'
+
+
+def _blob_ref(connection, path, delta):
+    if not blobstore.is_blob(path):
+        return  # legacy flat uploads are not reference counted
+    table = PhotoBlob.__table__
+    now = datetime.utcnow()
+    if delta > 0:
+        stmt = sqlite_insert(table).values(path=path, refcount=delta, updated_at=now)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['path'], set_={'refcount': table.c.refcount + delta, 'updated_at': now}))
+    else:
+        connection.execute(table.update().where(table.c.path == path).values(
+            refcount=table.c.refcount + delta, updated_at=now))
+
+
+@event.listens_for(ClampData, 'after_insert')
+def _blob_after_insert(mapper, connection, target):
+    if target.image_filename:
+        _blob_ref(connection, target.image_filename, 1)
+
+
+@event.listens_for(ClampData, 'after_update')
+def _blob_after_update(mapper, connection, target):
+    hist = sa_inspect(target).attrs.image_filename.history
+    if hist.has_changes():
+        for path in hist.deleted:
+            if path:
+                _blob_ref(connection, path, -1)
+        for path in hist.added:
+            if path:
+                _blob_ref(connection, path, 1)
+
+
+@event.listens_for(ClampData, 'after_delete')
+def _blob_after_delete(mapper, connection, target):
+    if target.image_filename:
+        _blob_ref(connection, target.image_filename, -1)
+
+
+app.config['PHOTO_GC_INTERVAL'] = int(os.environ.get('PHOTO_GC_INTERVAL', 3600))  # seconds; 0 disables
+app.config['PHOTO_GC_GRACE'] = int(os.environ.get('PHOTO_GC_GRACE', 3600))
+
+
+def sweep_photo_blobs(walk=False, grace=None):
+    """Delete unreferenced photo blobs (and their variants); return the removed paths.
+
+    A blob is removed only when its count is zero and both the count and the
+    file have been idle for the grace period, so an upload that has written
+    its blob but not yet committed its clamp row is never swept. walk=True
+    also scans the shard directories for blobs with no photo_blob row at all,
+    left behind by requests that failed after saving the upload.
+    """
+    grace = app.config['PHOTO_GC_GRACE'] if grace is None else grace
+    static_root = os.path.join(app.root_path, 'static')
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    file_cutoff = (datetime.now() - timedelta(seconds=grace)).timestamp()
+    table = PhotoBlob.__table__
+    removed = []
+    with app.app_context():
+        candidates = db.session.query(PhotoBlob.path).filter(
+            PhotoBlob.refcount <= 0, PhotoBlob.updated_at < cutoff).all()
+        for (path,) in candidates:
+            if not blobstore.older_than(static_root, path, file_cutoff):
+                continue
+            # re-check the count in the DELETE itself: a new reference may have arrived
+            deleted = db.session.execute(table.delete().where(
+                table.c.path == path, table.c.refcount <= 0)).rowcount
+            db.session.commit()
+            if deleted:
+                blobstore.remove(static_root, path, [images.variant_path(path, v) for v in images.VARIANTS])
+                removed.append(path)
+        if walk:
+            for path in blobstore.walk_blobs(static_root):
+                if (blobstore.older_than(static_root, path, file_cutoff)
+                        and db.session.get(PhotoBlob, path) is None
+                        and db.session.query(ClampData.id).filter_by(image_filename=path).first() is None):
+                    blobstore.remove(static_root, path, [images.variant_path(path, v) for v in images.VARIANTS])
+                    removed.append(path)
+        db.session.remove()
+    return removed
+
+
+_photo_sweeper = blobstore.Sweeper(sweep_photo_blobs, app.config['PHOTO_GC_INTERVAL'],
+                                   os.path.join(app.config['STATE_DIR'], 'photo_gc.lock'))
+
+
+@app.before_request
+def _start_photo_sweeper():
+    if not app.testing:
+        _photo_sweeper.start()
+
+
+@app.cli.command('gc-photos')
+@click.option('--walk', is_flag=True, help='Also scan shard directories for untracked blobs.')
+@click.option('--grace', type=int, default=None, help='Seconds a blob must be idle (default PHOTO_GC_GRACE).')
+def gc_photos_command(walk, grace):
+    """Delete photo blobs no clamp record references any more."""
+    removed = sweep_photo_blobs(walk=walk, grace=grace)
+    print(f'Removed {len(removed)} photo blobs')
+
+
+def upgrade_schema(target=None, verbose=True):
+    """Create missing tables, then apply pending migrations up to target (default: all).
+    Offline work: run by `flask migrate` and the development server, never by workers."""
+    db.create_all()
+    applied = migrations.apply_migrations(db.engine, verbose=verbose, target=target)
+    ensure_clamp_rollup()
+    return applied
+
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='Show the schema version and pending migrations; change nothing.')
+@click.option('--to', 'target', type=int, default=None, help='Apply migrations up to this version only.')
+def migrate_command(status, target):
+    """Create missing tables and apply pending schema migrations (see migrations/)."""
+    if status:
+        current, expected = migrations.check(db.engine)
+        print(f"Database: {'no version' if current is None else f'v{current:04d}'}; code: v{expected:04d}")
+        for version, name in migrations.pending(db.engine):
+            print(f'  pending v{version:04d} {name}')
+        return
+    applied = upgrade_schema(target)
+    if not applied:
+        print('Schema is up to date')
+
+
+@app.cli.command('image-variants')
+def image_variants_command():
+    """Build missing thumbnail/medium variants for uploaded clamp photos."""
+    pending = db.session.query(ClampData.id, ClampData.image_filename).filter(
+        ClampData.image_filename.isnot(None), ClampData.image_filename != '', ClampData.image_small.is_(None)).all()
+    for clamp_id, image_filename in pending:
+        build_image_variants(clamp_id, image_filename)
+    print(f'Processed {len(pending)} photos')
+
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Recreate the clamp full-text index from clamp_data."""
+    with db.engine.begin() as conn:
+        search.install(conn)
+        search.rebuild(conn)
+    print('Search index rebuilt')
+
+
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Recompute the daily revenue rollup from clamp_data."""
+    rebuild_clamp_rollup()
+    print('clamp_daily_rollup rebuilt')
+
+
+def rebuild_photo_refcounts():
+    """Recount photo_blob from clamp_data, after writes that bypass the ORM events."""
+    table = PhotoBlob.__table__
+    select_stmt = db.select(ClampData.image_filename, func.count(ClampData.id), db.literal(datetime.utcnow(), db.DateTime)).where(
+        ClampData.image_filename.like(blobstore.UPLOAD_PREFIX + '/__/__/%')).group_by(ClampData.image_filename)
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(['path', 'refcount', 'updated_at'], select_stmt))
+    db.session.commit()
+
+
+# Whole-table export/import (dataio.py): streamed CSV/NDJSON out, chunked bulk inserts in.
+DATA_TABLES = {'clamps': ClampData.__table__, 'appeals': Appeal.__table__}
+
+
+def import_table(name, stream, fmt):
+    """Bulk-import records into a DATA_TABLES table; return (inserted, errors)."""
+    inserted = None  # not known after an unexpected error
+    try:
+        with db.engine.connect() as conn:
+            inserted, errors = dataio.import_records(conn, DATA_TABLES[name], dataio.read_records(stream, fmt))
+        return inserted, errors
+    except dataio.ImportErrorLimit as e:
+        inserted = e.inserted
+        raise
+    finally:
+        # the chunks written before an abort stay, so they need the same upkeep
+        _after_import(name, True if inserted is None else inserted)
+
+
+def _after_import(name, inserted):
+    if name == 'clamps' and inserted:
+        # bulk inserts skip the mapper events that keep these current
+        rebuild_clamp_rollup()
+        rebuild_photo_refcounts()
+        # imported rows may reuse the ids of deleted ones
+        invoice_cache.drop()
+        with db.engine.connect() as conn:
+            plates.backfill(conn)
+        _clamp_generation.bump()
+
+
+def _format_from(path, fmt):
+    return fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+
+@app.cli.command('export-data')
+@click.argument('name', type=click.Choice(sorted(DATA_TABLES)))
+@click.option('--format', 'fmt', type=click.Choice(dataio.FORMATS), default=None)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default='-', help='File to write (default stdout).')
+def export_data_command(name, fmt, output):
+    """Stream a table out as CSV or NDJSON."""
+    table = DATA_TABLES[name]
+    fmt = _format_from(output, fmt)
+    with click.open_file(output, 'w', encoding='utf-8') as out, db.engine.connect() as conn:
+        for chunk in dataio.export_chunks(dataio.iter_rows(conn, table), [c.name for c in table.columns], fmt):
+            out.write(chunk)
+
+
+@app.cli.command('import-data')
+@click.argument('name', type=click.Choice(sorted(DATA_TABLES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(dataio.FORMATS), default=None)
+def import_data_command(name, path, fmt):
+    """Bulk-import CSV or NDJSON records into a table (appeals after their clamps)."""
+    with click.open_file(path, 'r', encoding='utf-8') as stream:
+        try:
+            inserted, errors = import_table(name, stream, _format_from(path, fmt))
+        except dataio.ImportErrorLimit as e:
+            raise click.ClickException(str(e))
+    for lineno, message in errors:
+        print(f'line {lineno}: {message}')
+    print(f'Imported {inserted} {name}, skipped {len(errors)} invalid rows')
+
+
+def _rollup_query(columns, status='Paid', date_from=None, date_to=None, location=None):
+    query = db.session.query(*columns).filter(ClampDailyRollup.payment_status == status)
+    if date_from:
+        query = query.filter(ClampDailyRollup.day >= date_from)
+    if date_to:
+        query = query.filter(ClampDailyRollup.day <= date_to)
+    if location:
+        query = query.filter(ClampDailyRollup.location == location)
+    return query
+
+
+def revenue_summary(status='Paid', date_from=None, date_to=None, location=None):
+    """Total clamp count and amount for a status over an inclusive date range."""
+    count, total = _rollup_query(
+        [func.coalesce(func.sum(ClampDailyRollup.clamp_count), 0),
+         func.coalesce(func.sum(ClampDailyRollup.amount_total), 0.0)],
+        status, date_from, date_to, location,
+    ).one()
+    return {'count': int(count), 'total': float(total)}
+
+
+REVENUE_GROUPS = {
+    'day': ClampDailyRollup.day,
+    'location': ClampDailyRollup.location,
+    'offense': ClampDailyRollup.offense,
+}
+
+
+def revenue_breakdown(group_by, status='Paid', date_from=None, date_to=None, location=None):
+    """Per-day, per-location or per-offense counts and totals, as a list of dicts."""
+    key = REVENUE_GROUPS[group_by]
+    rows = _rollup_query(
+        [key, func.sum(ClampDailyRollup.clamp_count), func.sum(ClampDailyRollup.amount_total)],
+        status, date_from, date_to, location,
+    ).group_by(key).order_by(key).all()
+    return [{'key': k, 'count': int(c), 'total': float(t or 0.0)} for k, c, t in rows]
+
+
+# Request identity comes from claims in the signed session cookie (user id,
+# username, role, credential version), so the common path needs no user query.
+# Each worker remembers the current credential_version per user id; the cache
+# is dropped whenever the shared auth epoch counter moves, which happens on
+# every password change, role change or user deletion (in any worker).
+_auth_epoch = FileCounter(os.path.join(app.config['STATE_DIR'], 'auth_epoch'))
+_credential_versions = {}
+_credential_epoch = [None]
+
+
+def session_claims(user):
+    """The session keys that identify a logged-in user."""
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'role': 'admin' if user.is_admin else 'user',
+        'cred_v': user.credential_version or 0,
+    }
+
+
+def bump_credential_version(user):
+    """Revoke the user's existing sessions; call before committing a password or role change."""
+    user.credential_version = (user.credential_version or 0) + 1
+
+
+def _credential_version(uid):
+    epoch = _auth_epoch.current()
+    if epoch != _credential_epoch[0]:
+        _credential_versions.clear()
+        _credential_epoch[0] = epoch
+    if uid not in _credential_versions:
+        row = db.session.query(User.credential_version).filter_by(id=uid).first()
+        # None marks a deleted user
+        _credential_versions[uid] = (row[0] or 0) if row else None
+    return _credential_versions[uid]
+
+
+def _resolve_identity():
+    uid = session.get('user_id')
+    if not uid:
+        return None
+    if 'cred_v' not in session:
+        # session from before claims existed: load the user once and upgrade it
+        user = db.session.get(User, uid)
+        if not user:
+            session.clear()
+            return None
+        session.update(session_claims(user))
+    if _credential_version(uid) != session.get('cred_v'):
+        session.clear()
+        return None
+    return {'id': uid, 'username': session.get('username'), 'is_admin': session.get('role') == 'admin'}
+
+
+def current_identity():
+    """The logged-in user's {id, username, is_admin}, or None; resolved once per request."""
+    if 'identity' not in g:
+        g.identity = _resolve_identity()
+    return g.identity
+
+
+@app.before_request
+def _reset_identity():
+    # g may outlive a request when an app context is already pushed (CLI, tests)
+    g.pop('identity', None)
+
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get('user_id'):
+        if not current_identity():
             return redirect(url_for('login', next=request.path))
         return f(*args, **kwargs)
     return decorated
@@ -199,12 +738,11 @@ def login_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        uid = session.get('user_id')
-        if not uid:
+        identity = current_identity()
+        if not identity:
             return redirect(url_for('login', next=request.path))
-        user = User.query.get(uid)
         # If the user is not found or not an admin, show a friendly access denied page
-        if not user or not user.is_admin:
+        if not identity['is_admin']:
             # Provide a helpful message and HTTP 403 status
             message = 'Admin access required to view this page.'
             return render_template('access_denied.html', message=message), 403
@@ -212,6 +750,345 @@ def admin_required(f):
     return decorated
 
 
+# Per-request SQL statement counter and timer. The listeners are attached to
+# every Engine and count only while a request is active. The count is exposed as
+# the X-Query-Count header in debug/testing and logged when it exceeds
+# QUERY_BUDGET_WARN; count and time both go to the request metrics below.
+app.config.setdefault('QUERY_BUDGET_WARN', 25)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_request_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        if context is not None:
+            context.cba_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_request_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'cba_started', None)
+    if started is not None and has_request_context():
+        g.query_seconds = g.get('query_seconds', 0.0) + time.perf_counter() - started
+
+
+@app.before_request
+def _reset_query_count():
+    # reset explicitly: g can outlive a request when an app context is already pushed
+    g.query_count = 0
+    g.query_seconds = 0.0
+
+
+@app.after_request
+def _report_query_count(response):
+    count = g.get('query_count', 0)
+    if app.debug or app.testing:
+        response.headers['X-Query-Count'] = str(count)
+    if count > app.config['QUERY_BUDGET_WARN']:
+        app.logger.warning('%s issued %d SQL statements (budget %d)',
+                           request.endpoint, count, app.config['QUERY_BUDGET_WARN'])
+    return response
+
+
+# Request metrics (metrics.py), summed over the workers at /metrics: latency per
+# endpoint up to the last byte sent (streamed pages included), SQL statements
+# and time, template rendering and upload bytes. A scraper authenticates with
+# `Authorization: Bearer <METRICS_TOKEN>`; without a token only admins can read them.
+app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+request_metrics = metrics.Metrics(os.path.join(app.config['STATE_DIR'], 'metrics'))
+for _name, _text in {
+    'cba_http_request_duration_seconds': 'Time from the start of a request to the end of its response.',
+    'cba_http_requests_total': 'Requests answered, by endpoint, method and status.',
+    'cba_db_statements_total': 'SQL statements run while handling requests.',
+    'cba_db_seconds_total': 'Time spent executing SQL statements while handling requests.',
+    'cba_template_render_seconds': 'Time spent rendering each template.',
+    'cba_upload_bytes_total': 'Bytes received in multipart uploads.',
+}.items():
+    request_metrics.describe(_name, _text)
+
+# Admins can profile one request by sending `X-Profile: 1`: a sampling profiler
+# (profiler.py) records its stacks, and the response's X-Profile header gives the
+# URL of the result. PROFILER=0 turns this off.
+app.config.setdefault('PROFILER_ENABLED', os.environ.get('PROFILER', '1') != '0')
+app.config.setdefault('PROFILE_INTERVAL_MS', float(os.environ.get('PROFILE_INTERVAL_MS', 5)))
+profile_store = profiler.ProfileStore(os.path.join(app.config['STATE_DIR'], 'profiles'))
+
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _time_template(sender, template, context, **extra):
+    started = g.get('template_started') if has_request_context() else None
+    if started:
+        request_metrics.observe('cba_template_render_seconds', {'template': template.name or '(string)'},
+                                time.perf_counter() - started.pop())
+
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    if request.headers.get('X-Profile') and app.config['PROFILER_ENABLED']:
+        identity = current_identity()
+        if identity and identity['is_admin']:
+            g.profiler = profiler.Sampler(interval=app.config['PROFILE_INTERVAL_MS'] / 1000).start()
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    # g itself, not the proxy: record() may run after the context is popped
+    request_g = g._get_current_object()
+    endpoint = request.endpoint or 'unmatched'
+    method, status = request.method, str(response.status_code)
+    if request.mimetype == 'multipart/form-data' and request.content_length:
+        request_metrics.inc('cba_upload_bytes_total', {'endpoint': endpoint}, request.content_length)
+    sampler = g.pop('profiler', None)
+    if sampler is not None:
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{''.join(c if c.isalnum() else '_' for c in endpoint)}"
+        response.headers['X-Profile'] = url_for('view_profile', name=name)
+
+    def record():
+        # on close, after the last byte: statements run while streaming count too
+        labels = {'endpoint': endpoint}
+        request_metrics.observe('cba_http_request_duration_seconds', {'endpoint': endpoint, 'method': method},
+                                time.perf_counter() - started)
+        request_metrics.inc('cba_http_requests_total', {'endpoint': endpoint, 'method': method, 'status': status})
+        request_metrics.inc('cba_db_statements_total', labels, request_g.get('query_count', 0))
+        request_metrics.inc('cba_db_seconds_total', labels, request_g.get('query_seconds', 0.0))
+        if sampler is not None:
+            profile_store.save(name, sampler.stop())
+    response.call_on_close(record)
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not (token and secrets.compare_digest(authorization, f'Bearer {token}')):
+        identity = current_identity()
+        if not (identity and identity['is_admin']):
+            abort(403)
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/profiles')
+@admin_required
+def list_profiles():
+    """Saved request profiles, newest first."""
+    return Response(''.join(f"{url_for('view_profile', name=name)}\n" for name in profile_store.names()),
+                    mimetype='text/plain')
+
+
+@app.route('/profiles/<name>')
+@admin_required
+def view_profile(name):
+    """A saved profile: the busiest functions, or ?format=folded for flame graph tools."""
+    folded = profile_store.load(name)
+    if folded is None:
+        abort(404)
+    text = folded if request.args.get('format') == 'folded' else profiler.summary(folded)
+    return Response(text, mimetype='text/plain')
+
+
+def _time_str(t):
+    try:
+        return t.strftime('%H:%M') if t else None
+    except Exception:
+        return None
+
+
+def _date_str(d):
+    return d.strftime('%Y-%m-%d') if d else None
+
+
+# JSON shapes of the two record types (serializers.py). Every endpoint that
+# returns clamps or appeals uses these, and ?fields= selects among them.
+clamp_json = serializers.Schema(ClampData, [
+    Field('id'),
+    Field('location'),
+    Field('registration', lambda v: v or ''),
+    Field('clamp_date', _date_str),
+    Field('time_in', _time_str),
+    Field('time_called', _time_str),
+    Field('time_released', _time_str),
+    Field('car_type', lambda v: v or ''),
+    Field('color', lambda v: v or ''),
+    Field('clamp_ref', lambda v: v or ''),
+    Field('offense', lambda v: v or ''),
+    Field('amount_paid', lambda v: float(v or 0.0)),
+    Field('payment_status'),
+    Field('image_filename', lambda v: v or None),
+    Field('image_url', compute=lambda c: url_for('static', filename=c.image_filename) if c.image_filename else None,
+          columns=('image_filename',)),
+    Field('thumb_url', compute=lambda c: clamp_image_url(c, 'small'), columns=('image_filename', 'image_small')),
+    Field('plate', default=False),
+    Field('revision', default=False),
+])
+
+appeal_json = serializers.Schema(Appeal, [
+    Field('id'),
+    Field('clamp_id'),
+    Field('appeal_date', _date_str),
+    Field('appeal_reason'),
+    Field('appeal_status'),
+    Field('notes', lambda v: v or ''),
+    Field('revision', default=False),
+])
+# /clamp/<id>/appeals lists one clamp's appeals without repeating its id
+APPEAL_LIST_FIELDS = ('id', 'appeal_date', 'appeal_reason', 'appeal_status', 'notes')
+
+
+# Conditional GET for the per-record JSON endpoints. The validators come from
+# row versions, so a request whose If-None-Match still matches is answered 304
+# before any payload is built. Bump JSON_REPR_VERSION whenever one of these
+# payloads changes shape, so clients holding the old shape fetch it again.
+JSON_REPR_VERSION = 1
+
+
+def _with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # clients may keep the body but must revalidate before each use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _not_modified(etag, last_modified=None):
+    """A 304 response when the request's validators match, else None."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return _with_validators(Response(status=304), etag, last_modified)
+
+
+# Keyset pagination for clamp listings. Pages are addressed by an opaque cursor
+# holding the sort key of the last row served, so every page is an index range
+# read no matter how deep the client has scrolled (no OFFSET).
+CLAMP_PAGE_SIZE = 50
+CLAMP_PAGE_MAX = 200
+CLAMP_IDS_MAX = 200     # clamps per ?ids= request
+CLAMP_SORTS = ('clamp_date', 'id')
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    if not isinstance(values, list):
+        raise ValueError('malformed cursor')
+    return values
+
+
+def _parse_date_arg(args, name):
+    value = (args.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be YYYY-MM-DD')
+
+
+def clamp_filters_from_args(args):
+    """Translate query-string filters into SQLAlchemy criteria.
+
+    Supported: status (comma separated), date_from, date_to (inclusive,
+    YYYY-MM-DD), location and registration (exact match). Raises ValueError
+    with a user-facing message on bad input.
+    """
+    criteria = []
+    status = (args.get('status') or '').strip()
+    if status:
+        statuses = [s.strip() for s in status.split(',') if s.strip()]
+        criteria.append(ClampData.payment_status.in_(statuses))
+    date_from = _parse_date_arg(args, 'date_from')
+    if date_from:
+        criteria.append(ClampData.clamp_date >= date_from)
+    date_to = _parse_date_arg(args, 'date_to')
+    if date_to:
+        criteria.append(ClampData.clamp_date <= date_to)
+    location = (args.get('location') or '').strip()
+    if location:
+        criteria.append(ClampData.location == location)
+    registration = (args.get('registration') or '').strip()
+    if registration:
+        criteria.append(ClampData.registration == registration)
+    return criteria
+
+
+def clamp_page(criteria=(), sort='clamp_date', order='desc', cursor=None, limit=CLAMP_PAGE_SIZE, columns=None):
+    """Return (rows, next_cursor) for one page of clamps.
+
+    Rows are ordered by (sort, id) so the ordering is total and the cursor
+    can resume exactly after the last row. next_cursor is None on the last page.
+    With columns, only those (and the sort keys) are loaded.
+    """
+    if sort not in CLAMP_SORTS:
+        raise ValueError(f'sort must be one of: {", ".join(CLAMP_SORTS)}')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    limit = max(1, min(int(limit), CLAMP_PAGE_MAX))
+
+    keys = [ClampData.id] if sort == 'id' else [ClampData.clamp_date, ClampData.id]
+    query = ClampData.query.filter(*criteria)
+    if columns is not None:
+        query = query.options(load_only(*columns, *keys))
+    if cursor:
+        try:
+            values = _decode_cursor(cursor)
+            if len(values) != len(keys):
+                raise ValueError
+            if sort == 'clamp_date':
+                values = [datetime.strptime(values[0], '%Y-%m-%d').date(), int(values[1])]
+            else:
+                values = [int(values[0])]
+        except (ValueError, TypeError):
+            raise ValueError('invalid cursor')
+        if order == 'desc':
+            query = query.filter(tuple_(*keys) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*keys) > tuple_(*values))
+    query = query.order_by(*[k.desc() if order == 'desc' else k.asc() for k in keys])
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort == 'clamp_date':
+            next_cursor = _encode_cursor([last.clamp_date.strftime('%Y-%m-%d'), last.id])
+        else:
+            next_cursor = _encode_cursor([last.id])
+    return rows, next_cursor
+
+
+def clamp_page_from_args(args, columns=None):
+    """clamp_page() driven by request args (filters, sort, order, cursor, limit)."""
+    try:
+        limit = int(args.get('limit') or CLAMP_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return clamp_page(
+        clamp_filters_from_args(args),
+        sort=args.get('sort') or 'clamp_date',
+        order=args.get('order') or 'desc',
+        cursor=args.get('cursor') or None,
+        limit=limit,
+        columns=columns,
+    )
+
+
 # Enforce login for all routes except a small whitelist (login, static files, service worker)
 # @app.before_request
 # def require_login():
@@ -231,22 +1108,76 @@ def admin_required(f):
 #     return redirect(url_for('login', next=request.path))
 
 # Routes
+# The dashboard's clamp table, paid tab and appeal <select> are cached as
+# rendered HTML on disk (shared by all workers), keyed by the clamp generation
+# and the asset build whose URLs they embed. Between writes a dashboard
+# request reads a few files instead of querying and looping over the rows.
+fragment_cache = RenderCache(os.path.join(app.config['STATE_DIR'], 'fragments'))
+
+
+def _fragment(name, variant, stamp, render):
+    """Cached HTML for one dashboard section, calling render() only on a miss."""
+    key = (name, variant, stamp)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = fragment_cache.put(key, render(), exclusive=True)
+    return Markup(html)
+
+
 @app.route('/')
 def index():
-    clamps = ClampData.query.all()
-    # include users for admin tab rendering so admins can manage users from the dashboard
-    try:
-        users = User.query.order_by(User.created_at.desc()).all()
-    except Exception:
-        users = []
-    return render_template('index.html', clamps=clamps, users=users)
+    identity = current_identity()
+    admin = bool(identity and identity['is_admin'])
+    # read before any query: a write landing meanwhile files the render under the older generation
+    stamp = f"{_clamp_generation.current()}-{_asset_manifest['version']}"
+    first_page = []
+
+    def clamps():
+        # only the first page is rendered server-side; the tabs fetch further pages from /api/clamps
+        if not first_page:
+            first_page.extend(clamp_page())
+        return first_page
+
+    def render_clamp_rows():
+        rows, next_cursor = clamps()
+        return render_template('partials/clamp_rows.html', clamps=rows, next_cursor=next_cursor)
+
+    def render_paid():
+        paid_clamps, paid_next_cursor = clamp_page([ClampData.payment_status == 'Paid'])
+        return render_template('partials/paid_clamps.html', paid_clamps=paid_clamps,
+                               paid_next_cursor=paid_next_cursor, paid_summary=revenue_summary('Paid'))
+
+    sections = {'clamp_rows': _fragment('clamp_rows', 'admin' if admin else 'user', stamp, render_clamp_rows)}
+    users = []
+    # the paid tab, appeals tab and user admin are only rendered for admins
+    if admin:
+        sections['paid_clamps'] = _fragment('paid_clamps', 'admin', stamp, render_paid)
+        sections['appeal_options'] = _fragment('appeal_options', 'admin', stamp, lambda: render_template(
+            'partials/appeal_options.html', clamps=clamps()[0]))
+        # include users for admin tab rendering so admins can manage users from the dashboard
+        try:
+            users = User.query.order_by(User.created_at.desc()).all()
+        except Exception:
+            users = []
+    return render_template('index.html', users=users, clamp_ids_max=CLAMP_IDS_MAX, **sections)
+
+
+@app.route('/api/cache-stats')
+@admin_required
+def cache_stats():
+    """This worker's hit/miss counts for the on-disk render caches."""
+    return jsonify({'pid': os.getpid(), 'clamp_generation': _clamp_generation.current(),
+                    'fragments': fragment_cache.stats(), 'invoices': invoice_cache.stats()})
 
 
 # Compatibility routes referenced by templates
 @app.route('/dashboard')
 def dashboard():
-    clamps = ClampData.query.all()
-    return render_template('dashboard.html', clamps=clamps)
+    total_clamps = db.session.query(func.count(ClampData.id)).scalar()
+    total_customers = db.session.query(func.count(func.distinct(ClampData.registration))).scalar()
+    pending_orders = db.session.query(func.count(ClampData.id)).filter(ClampData.payment_status != 'Paid').scalar()
+    return render_template('dashboard.html', total_clamps=total_clamps,
+                           total_customers=total_customers, pending_orders=pending_orders)
 
 
 @app.route('/clamp_form')
@@ -259,46 +1190,144 @@ def clamp_form():
 @app.route('/clamp_list')
 @app.route('/clamp-list')
 def clamp_list():
-    clamps = ClampData.query.all()
-    return render_template('clamp_list.html', clamps=clamps)
+    try:
+        clamps, next_cursor = clamp_page_from_args(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        clamps, next_cursor = clamp_page()
+    # carry the active filters over to the next-page link
+    next_args = {k: v for k, v in request.args.items() if k != 'cursor'}
+    return render_template('clamp_list.html', clamps=clamps, next_cursor=next_cursor, next_args=next_args)
+
+# Fingerprinted static assets (assets.py). After `flask build-assets`, url_for('static', ...)
+# points at content-hashed copies under static/dist/, which are served precompressed
+# and cached by browsers without ever revalidating.
+_asset_manifest = {}
+
+
+def load_asset_manifest():
+    _asset_manifest.clear()
+    _asset_manifest.update(assets.load_manifest(app.static_folder))
+
+
+load_asset_manifest()
+
+
+@app.url_defaults
+def _fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static':
+        hashed = _asset_manifest['files'].get(values.get('filename'))
+        if hashed:
+            values['filename'] = hashed
+
+
+def _serve_static(filename):
+    if not filename.startswith(assets.DIST + '/'):
+        return app.send_static_file(filename)
+    encoding, served = assets.precompressed(app.static_folder, filename, request.accept_encodings)
+    resp = send_from_directory(app.static_folder, served, mimetype=mimetypes.guess_type(filename)[0],
+                               max_age=365 * 24 * 3600)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    resp.vary.add('Accept-Encoding')
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    return resp
+
+
+app.view_functions['static'] = _serve_static
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static assets into static/dist/."""
+    manifest = assets.build(app.static_folder, app.static_url_path)
+    load_asset_manifest()
+    print(f"Built {len(manifest['files'])} assets, version {manifest['version']}")
+
+
+# Uploaded photos. The original is saved during the request; the small and
+# medium variants that list views show are built afterwards (images.py).
+app.config.setdefault('IMAGE_VARIANTS_SYNC', False)
+_variant_worker = images.VariantWorker()
+
+
+def save_upload(image):
+    """Store an uploaded file by content hash (blobstore.py); return its static-relative path."""
+    return blobstore.store(os.path.join(app.root_path, 'static'), image.stream, secure_filename(image.filename))
+
+
+def build_image_variants(clamp_id, image_filename):
+    paths = images.make_variants(os.path.join(app.root_path, 'static'), image_filename)
+    if not paths:
+        return
+    with app.app_context():
+        # only if the photo was not replaced in the meantime
+        ClampData.query.filter_by(id=clamp_id, image_filename=image_filename).update(
+            {'image_small': paths['small'], 'image_medium': paths['medium'],
+             'revision': ClampData.revision + 1, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+
+def schedule_image_variants(clamp_id, image_filename):
+    sync = app.config['IMAGE_VARIANTS_SYNC'] or app.testing
+    _variant_worker.submit(build_image_variants, clamp_id, image_filename, sync=sync)
+
+
+@app.template_global()
+def clamp_image_url(clamp, variant='small'):
+    """URL of a resized variant of the clamp photo, or of the original until it exists."""
+    path = getattr(clamp, f'image_{variant}', None) or clamp.image_filename
+    return url_for('static', filename=path) if path else None
+
+
+def clamp_from_fields(fields):
+    """Build a new ClampData from form-style fields (a form or a JSON object).
+
+    Raises KeyError for a missing required field and ValueError for a bad value.
+    """
+    new_clamp = ClampData(
+        location=fields['location'],
+        registration=fields.get('registration',''),
+        clamp_date=datetime.strptime(fields['clamp_date'], '%Y-%m-%d').date(),
+        time_in=datetime.strptime(fields['time_in'], '%H:%M').time(),
+        time_called=datetime.strptime(fields['time_called'], '%H:%M').time() if fields.get('time_called') else None,
+        time_released=datetime.strptime(fields['time_released'], '%H:%M').time() if fields.get('time_released') else None,
+        offense=fields['offense'],
+        payment_status=fields['payment_status'],
+        car_type=fields.get('car_type',''),
+        color=fields.get('color',''),
+        clamp_ref=fields.get('clamp_ref',''),
+        client_key=fields.get('client_key') or None,
+    )
+    # optional amount_paid
+    try:
+        amt = fields.get('amount_paid')
+        if amt is not None and amt != '':
+            new_clamp.amount_paid = float(amt)
+    except Exception:
+        pass
+    return new_clamp
+
 
 @app.route('/add-clamp', methods=['POST'])
 def add_clamp():
     try:
+        # a resubmitted form (same client_key) must not record the clamp twice
+        key = request.form.get('client_key')
+        if key and db.session.query(ClampData.id).filter_by(client_key=key).first() is not None:
+            flash('This clamp was already recorded.', 'success')
+            return redirect(url_for('index'))
         # Create new clamp record with extra fields
-        new_clamp = ClampData(
-            location=request.form['location'],
-            registration=request.form.get('registration',''),
-            clamp_date=datetime.strptime(request.form['clamp_date'], '%Y-%m-%d').date(),
-            time_in=datetime.strptime(request.form['time_in'], '%H:%M').time(),
-            time_called=datetime.strptime(request.form['time_called'], '%H:%M').time() if request.form.get('time_called') else None,
-            time_released=datetime.strptime(request.form['time_released'], '%H:%M').time() if request.form.get('time_released') else None,
-            offense=request.form['offense'],
-            payment_status=request.form['payment_status'],
-            car_type=request.form.get('car_type',''),
-            color=request.form.get('color',''),
-            clamp_ref=request.form.get('clamp_ref','')
-        )
-        # optional amount_paid
-        try:
-            amt = request.form.get('amount_paid')
-            if amt is not None and amt != '':
-                new_clamp.amount_paid = float(amt)
-        except Exception:
-            pass
+        new_clamp = clamp_from_fields(request.form)
         # handle image upload
         image = request.files.get('image')
         if image and image.filename:
-            upload_folder = os.path.join(app.root_path, 'static', 'images', 'uploads')
-            os.makedirs(upload_folder, exist_ok=True)
-            fname = secure_filename(image.filename)
-            timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
-            saved_name = f"{timestamp}_{fname}"
-            path = os.path.join(upload_folder, saved_name)
-            image.save(path)
-            new_clamp.image_filename = os.path.join('images', 'uploads', saved_name)
+            new_clamp.image_filename = save_upload(image)
         db.session.add(new_clamp)
         db.session.commit()
+        if new_clamp.image_filename:
+            schedule_image_variants(new_clamp.id, new_clamp.image_filename)
         flash('Clamp data added successfully!', 'success')
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
@@ -316,10 +1345,10 @@ def delete_clamp(id):
     try:
         clamp = ClampData.query.get_or_404(id)
         # Prevent deleting a clamp that has associated appeals to avoid foreign-key integrity errors.
-        if getattr(clamp, 'appeals', None):
-            if len(clamp.appeals) > 0:
-                flash('Cannot delete clamp: there are appeals linked to this record. Delete appeals first.', 'error')
-                return redirect(url_for('index'))
+        # An indexed existence check, rather than loading the whole appeals collection.
+        if db.session.query(Appeal.id).filter_by(clamp_id=clamp.id).first() is not None:
+            flash('Cannot delete clamp: there are appeals linked to this record. Delete appeals first.', 'error')
+            return redirect(url_for('index'))
         db.session.delete(clamp)
         db.session.commit()
         flash('Clamp data deleted successfully!', 'success')
@@ -350,23 +1379,16 @@ def edit_clamp(id):
         clamp.clamp_ref = request.form.get('clamp_ref','')
         # handle image upload (replace existing)
         image = request.files.get('image')
+        new_image = None
         if image and image.filename:
-            upload_folder = os.path.join(app.root_path, 'static', 'images', 'uploads')
-            os.makedirs(upload_folder, exist_ok=True)
-            fname = secure_filename(image.filename)
-            timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
-            saved_name = f"{timestamp}_{fname}"
-            path = os.path.join(upload_folder, saved_name)
-            image.save(path)
-            # Optionally remove old file
-            try:
-                if clamp.image_filename:
-                    old_path = os.path.join(app.root_path, 'static', clamp.image_filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-            except Exception:
-                pass
-            clamp.image_filename = os.path.join('images', 'uploads', saved_name)
+            new_image = save_upload(image)
+            # the old photo may be shared with other records: its reference
+            # count drops on commit and the photo sweep removes it when unused
+            if new_image != clamp.image_filename:
+                clamp.image_filename = new_image
+                clamp.image_small = clamp.image_medium = None
+            else:
+                new_image = None
         clamp.offense = request.form['offense']
         clamp.payment_status = request.form['payment_status']
         # optional amount_paid update
@@ -377,61 +1399,203 @@ def edit_clamp(id):
         except Exception:
             pass
         db.session.commit()
+        if new_image:
+            schedule_image_variants(clamp.id, new_image)
         flash('Clamp data updated successfully!', 'success')
         # If the client expects JSON (AJAX/modal submit), return the updated clamp as JSON
         accept = request.headers.get('Accept','')
         xhr = request.headers.get('X-Requested-With','')
         if 'application/json' in accept or xhr == 'XMLHttpRequest':
-            def time_str_local(t):
-                try:
-                    return t.strftime('%H:%M') if t else None
-                except Exception:
-                    return None
-            return jsonify({
-                'id': clamp.id,
-                'location': clamp.location,
-                'registration': clamp.registration or '',
-                'clamp_date': clamp.clamp_date.strftime('%Y-%m-%d') if clamp.clamp_date else None,
-                'time_in': time_str_local(clamp.time_in),
-                'time_called': time_str_local(clamp.time_called),
-                'time_released': time_str_local(clamp.time_released),
-                'car_type': clamp.car_type or '',
-                'color': clamp.color or '',
-                'clamp_ref': clamp.clamp_ref or '',
-                'offense': clamp.offense or '',
-                'amount_paid': float(clamp.amount_paid or 0.0),
-                'payment_status': clamp.payment_status,
-                'image_filename': clamp.image_filename or None,
-                'image_url': url_for('static', filename=clamp.image_filename) if clamp.image_filename else None,
-            })
+            return jsonify(clamp_json.dump(clamp))
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
     
     return redirect(url_for('index'))
 
+INVOICE_FETCH_ROWS = 500      # rows per cursor batch while the report streams
+INVOICE_FLUSH_BYTES = 8192    # rendered HTML is sent in pieces of about this size
+
+
+def _invoice_rows(criteria):
+    """Yield the listed invoice rows as plain tuples, straight from the cursor.
+
+    Only the printed columns are selected and no ORM objects are built, so the
+    worker holds one fetch batch at a time however long the period is.
+    """
+    stmt = (db.select(ClampData.id, ClampData.location, ClampData.clamp_date, ClampData.time_in,
+                      ClampData.time_released, ClampData.offense, ClampData.amount_paid)
+            .where(*criteria).order_by(ClampData.clamp_date, ClampData.id)
+            .execution_options(yield_per=INVOICE_FETCH_ROWS))
+    for partition in db.session.execute(stmt).partitions():
+        yield from partition
+
+
+def _coalesce(chunks, size=INVOICE_FLUSH_BYTES):
+    # Jinja yields a fragment per template statement; batch them into fewer writes
+    buf, length = [], 0
+    for chunk in chunks:
+        buf.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buf)
+            buf, length = [], 0
+    if buf:
+        yield ''.join(buf)
+
+
+def _invoice_period():
+    """(date_from, date_to, location, redirect) from the request's report arguments.
+
+    Reports are always for an explicit period: when either date is missing or
+    invalid, redirect is a response sending the client to the same endpoint
+    for the current month, so the URL says what was printed. Otherwise it is None.
+    """
+    today = datetime.now().date()
+    location = (request.args.get('location') or '').strip() or None
+    try:
+        date_from = _parse_date_arg(request.args, 'date_from')
+        date_to = _parse_date_arg(request.args, 'date_to')
+        if date_from and date_to and date_from > date_to:
+            raise ValueError('date_from must not be after date_to')
+    except ValueError as e:
+        flash(str(e), 'error')
+        date_from = date_to = None
+    if not (date_from and date_to):
+        return None, None, None, redirect(url_for(
+            request.endpoint, date_from=(date_from or today.replace(day=1)).isoformat(),
+            date_to=(date_to or today).isoformat(), location=location))
+    return date_from, date_to, location, None
+
+
 @app.route('/invoicing')
 @admin_required
 def invoicing():
-    paid_clamps = ClampData.query.filter_by(payment_status='Paid').all()
-    total_amount = sum((c.amount_paid or 0.0) for c in paid_clamps)
-    return render_template('invoicing.html', paid_clamps=paid_clamps, now=datetime.now(), total_amount=total_amount)
+    date_from, date_to, location, fix = _invoice_period()
+    if fix:
+        return fix
+
+    # totals and breakdowns come from the rollup table before the first byte
+    # is sent; the listed rows are streamed from clamp_data as they render
+    summary = revenue_summary('Paid', date_from, date_to, location)
+    by_location = revenue_breakdown('location', 'Paid', date_from, date_to, location)
+    by_offense = revenue_breakdown('offense', 'Paid', date_from, date_to, location)
+    criteria = [ClampData.payment_status == 'Paid', ClampData.clamp_date >= date_from, ClampData.clamp_date <= date_to]
+    if location:
+        criteria.append(ClampData.location == location)
+    body = stream_template('invoicing.html', paid_clamps=_invoice_rows(criteria), now=datetime.now(),
+                           total_amount=summary['total'], total_count=summary['count'],
+                           by_location=by_location, by_offense=by_offense,
+                           date_from=date_from, date_to=date_to, location=location or '')
+    # X-Accel-Buffering stops a fronting nginx from holding the stream back
+    return Response(_coalesce(body), mimetype='text/html', headers={'X-Accel-Buffering': 'no'})
+
+
+# Rendered invoices are cached on disk under STATE_DIR, so every worker shares
+# them, keyed by (id, revision): an edit bumps the revision and the next render
+# replaces the old entry. The cached part is partials/invoice.html; the pages
+# around it (generated time, print chrome) are rendered per request.
+invoice_cache = RenderCache(os.path.join(app.config['STATE_DIR'], 'invoices'))
+INVOICE_BATCH_FETCH = 200   # (id, revision) rows per cursor batch on batch prints
+
+
+def _invoice_dir(clamp_id):
+    return (clamp_id // 1000, clamp_id)
+
+
+def _invoice_key(clamp_id, revision):
+    return _invoice_dir(clamp_id) + (revision,)
+
+
+def render_invoice(clamp):
+    """The invoice body for clamp, from the cache or rendered and stored."""
+    key = _invoice_key(clamp.id, clamp.revision)
+    html = invoice_cache.get(key)
+    if html is None:
+        html = invoice_cache.put(key, render_template('partials/invoice.html', clamp=clamp), exclusive=True)
+    return Markup(html)
+
+
+@event.listens_for(ClampData, 'after_delete')
+def _invoice_after_delete(mapper, connection, target):
+    # SQLite may hand the id out again, starting over at revision 1
+    invoice_cache.drop(*_invoice_dir(target.id))
+
+
+def _cached_invoices(stmt):
+    """Yield rendered invoices for the clamps stmt selects (id, revision of).
+
+    Walks the ids a batch at a time; only the cache misses of each batch are
+    loaded as full rows, in one query.
+    """
+    for partition in db.session.execute(stmt.execution_options(yield_per=INVOICE_BATCH_FETCH)).partitions():
+        found = {row.id: invoice_cache.get(_invoice_key(row.id, row.revision)) for row in partition}
+        missing = [clamp_id for clamp_id, html in found.items() if html is None]
+        if missing:
+            for clamp in ClampData.query.filter(ClampData.id.in_(missing)):
+                found[clamp.id] = render_invoice(clamp)
+        for row in partition:
+            yield Markup(found[row.id])
 
 
 @app.route('/presentation/invoice/<int:id>')
 @admin_required
 def presentation_invoice(id):
     clamp = ClampData.query.get_or_404(id)
-    return render_template('presentation_invoice.html', clamp=clamp, now=datetime.now())
+    return render_template('presentation_invoice.html', clamp=clamp, invoice=render_invoice(clamp),
+                           now=datetime.now())
+
+
+@app.route('/presentation/invoices')
+@admin_required
+def print_invoices():
+    """Many invoices in one print document: ?ids=1,2,3 (at most CLAMP_IDS_MAX), or
+    the paid clamps of a period (date_from, date_to, location as on /invoicing)."""
+    stmt = db.select(ClampData.id, ClampData.revision)
+    ids = (request.args.get('ids') or '').strip()
+    if ids:
+        try:
+            wanted = sorted(_parse_ids(ids))
+            if len(wanted) > CLAMP_IDS_MAX:
+                raise ValueError(f'at most {CLAMP_IDS_MAX} ids per request')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        stmt = stmt.where(ClampData.id.in_(wanted)).order_by(ClampData.id)
+        title = f'{len(wanted)} invoices'
+    else:
+        date_from, date_to, location, fix = _invoice_period()
+        if fix:
+            return fix
+        criteria = [ClampData.payment_status == 'Paid', ClampData.clamp_date >= date_from, ClampData.clamp_date <= date_to]
+        if location:
+            criteria.append(ClampData.location == location)
+        stmt = stmt.where(*criteria).order_by(ClampData.clamp_date, ClampData.id)
+        title = f'Paid invoices {date_from.isoformat()} to {date_to.isoformat()}' + (f' ({location})' if location else '')
+    body = stream_template('print_invoices.html', invoices=_cached_invoices(stmt), title=title,
+                           now=datetime.now(), autoprint=request.args.get('print') == '1')
+    return Response(_coalesce(body), mimetype='text/html', headers={'X-Accel-Buffering': 'no'})
 
 
 @app.route('/service-worker.js')
 def service_worker():
-    return send_from_directory('static', 'service-worker.js')
+    # Served from the root so its scope covers every page. The cache version and
+    # precache list come from the asset manifest; url_for yields the hashed URLs.
+    sources = sorted(_asset_manifest['files']) or assets.sources(app.static_folder)
+    body = render_template('service-worker.js', version=_asset_manifest['version'],
+                           precache=['/'] + [url_for('static', filename=rel) for rel in sources],
+                           immutable_prefix=f'{app.static_url_path}/{assets.DIST}/',
+                           add_clamp_url=url_for('add_clamp'), batch_url=url_for('api_clamps_batch'),
+                           events_url=url_for('change_events'), changes_url=url_for('api_changes'),
+                           logout_url=url_for('logout'), clamps_url=url_for('api_clamps'),
+                           page_size=CLAMP_PAGE_SIZE, page_max=CLAMP_PAGE_MAX,
+                           batch_max=CLAMP_BATCH_MAX)
+    # the worker script itself must be revalidated so new deploys are picked up
+    return body, 200, {'Content-Type': 'application/javascript', 'Cache-Control': 'no-cache'}
 
 @app.route('/appeals')
 @admin_required
 def appeals():
-    all_appeals = Appeal.query.all()
+    # the template shows each appeal's clamp location/registration; join them in up front
+    all_appeals = Appeal.query.options(joinedload(Appeal.clamp)).order_by(Appeal.id).all()
     return render_template('appeals.html', appeals=all_appeals)
 
 @app.route('/add-appeal', methods=['POST'])
@@ -494,49 +1658,427 @@ def edit_appeal(id):
 
 @app.route('/api/clamp/<int:id>')
 def get_clamp_details(id):
-    """Return clamp location and registration as JSON for AJAX calls"""
-    clamp = ClampData.query.get(id)
+    """One clamp as JSON; ?fields=a,b limits the fields, and the columns read, to those named."""
+    try:
+        fields = clamp_json.parse(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    clamp = db.session.execute(db.select(*clamp_json.columns(fields, extra=('revision', 'updated_at')))
+                               .where(ClampData.id == id)).first()
     if not clamp:
         return {'error': 'Clamp not found'}, 404
-    # provide a richer JSON payload for client-side features
-    def time_str(t):
-        try:
-            return t.strftime('%H:%M') if t else None
-        except Exception:
-            return None
+    etag = f'clamp-{id}-r{clamp.revision}-v{JSON_REPR_VERSION}'
+    if fields != clamp_json.default:
+        etag += '-' + hashlib.sha1(','.join(fields).encode()).hexdigest()[:8]
+    return (_not_modified(etag, clamp.updated_at)
+            or _with_validators(jsonify(clamp_json.dump(clamp, fields)), etag, clamp.updated_at))
+
+
+SEARCH_LIMIT = 20
+SEARCH_MAX = 100
+
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    """Ranked full-text search over clamp records.
+
+    Query args: q (words, each matched as a prefix) and limit (max
+    SEARCH_MAX). Each item is the clamp's JSON plus a score and, per matching
+    field, an HTML-escaped highlight with <mark> around the matches.
+    """
+    q = (request.args.get('q') or '').strip()
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_LIMIT)), SEARCH_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    hits = search.search(db.session.connection(), q, limit=max(limit, 1))
+    clamps = {c.id: c for c in ClampData.query.filter(ClampData.id.in_([h[0] for h in hits]))} if hits else {}
+    items = [dict(clamp_json.dump(clamps[clamp_id]), score=round(score, 4), highlight=marked)
+             for clamp_id, score, marked in hits if clamp_id in clamps]
+    return jsonify({'q': q, 'items': items})
+
+
+PLATE_HISTORY_MAX = 100
+PLATE_CLAMP_FIELDS = clamp_json.default + ('plate',)
+PLATE_APPEAL_FIELDS = ('id', 'appeal_date', 'appeal_reason', 'appeal_status')
+UNPAID_STATUSES = ('Not Paid', 'Processing')
+
+
+@app.route('/api/plate')
+@login_required
+def api_plate():
+    """Everything on record for a plate, for the officer at the vehicle.
+
+    Query args: q (the plate as typed) and distance (0-2, default 1): how many
+    typing errors a recorded spelling may differ by and still count as this
+    car. Returns the matching spellings, the newest PLATE_HISTORY_MAX clamps
+    across them with their appeals, and the count of clamps still unpaid.
+    Spellings further away, up to plates.MAX_DISTANCE, are listed under
+    "similar" without their history.
+    """
+    plate = plates.normalize(request.args.get('q'))
+    if not plate:
+        return jsonify({'error': 'q must contain letters or digits'}), 400
+    try:
+        max_distance = int(request.args.get('distance', 1))
+    except ValueError:
+        return jsonify({'error': 'distance must be an integer'}), 400
+    max_distance = min(max(max_distance, 0), plates.MAX_DISTANCE)
+
+    found = plates.similar(db.session.connection(), plate)
+    matched = {p: d for p, d, _ in found if d <= max_distance}
+    clamps, appeals, unpaid = [], {}, {'count': 0, 'clamp_ids': []}
+    if matched:
+        clamps = (ClampData.query.filter(ClampData.plate.in_(matched))
+                  .order_by(ClampData.clamp_date.desc(), ClampData.id.desc()).limit(PLATE_HISTORY_MAX).all())
+        for a in Appeal.query.filter(Appeal.clamp_id.in_([c.id for c in clamps])).order_by(Appeal.id):
+            appeals.setdefault(a.clamp_id, []).append(appeal_json.dump(a, PLATE_APPEAL_FIELDS))
+        unpaid_ids = db.session.execute(
+            db.select(ClampData.id).where(ClampData.plate.in_(matched), ClampData.payment_status.in_(UNPAID_STATUSES))
+            .order_by(ClampData.id)).scalars().all()
+        unpaid = {'count': len(unpaid_ids), 'clamp_ids': unpaid_ids}
+    return jsonify({
+        'plate': plate,
+        'matches': [{'plate': p, 'distance': d, 'clamps': n} for p, d, n in found if d <= max_distance],
+        'similar': [{'plate': p, 'distance': d, 'clamps': n} for p, d, n in found if d > max_distance],
+        'clamps': [dict(clamp_json.dump(c, PLATE_CLAMP_FIELDS), appeals=appeals.get(c.id, [])) for c in clamps],
+        'unpaid': unpaid,
+    })
+
+
+def _parse_ids(text):
+    """The distinct ids in a comma-separated list, in the order given."""
+    try:
+        return list(dict.fromkeys(int(i) for i in text.split(',') if i.strip()))
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of integers')
+
+
+@app.route('/api/clamps')
+@login_required
+def api_clamps():
+    """Keyset-paginated clamp listing, or the clamps named by ?ids=.
+
+    Query args: status, date_from, date_to, location, registration (filters),
+    sort (clamp_date|id), order (asc|desc), limit (max CLAMP_PAGE_MAX) and the
+    cursor returned as next_cursor by the previous page. fields=a,b limits the
+    fields of each item, and the columns read, to those named.
+
+    ids=1,2,3 (at most CLAMP_IDS_MAX) instead returns those clamps, in that
+    order, read in one query: {items, missing} with the ids not found.
+    """
+    try:
+        fields = clamp_json.parse(request.args.get('fields'))
+        if 'ids' in request.args:
+            ids = _parse_ids(request.args['ids'])
+            if len(ids) > CLAMP_IDS_MAX:
+                raise ValueError(f'at most {CLAMP_IDS_MAX} ids per request')
+        else:
+            clamps, next_cursor = clamp_page_from_args(request.args, columns=clamp_json.columns(fields))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    dump = clamp_json.dumper(fields)
+    if 'ids' in request.args:
+        rows = db.session.execute(db.select(*clamp_json.columns(fields, extra=('id',)))
+                                  .where(ClampData.id.in_(ids))).all() if ids else []
+        found = {row.id: row for row in rows}
+        return jsonify({'items': [dump(found[i]) for i in ids if i in found],
+                        'missing': [i for i in ids if i not in found]})
+    return jsonify({'items': [dump(c) for c in clamps], 'next_cursor': next_cursor})
+
+
+@app.route('/export/<name>.<fmt>')
+@admin_required
+def export_data(name, fmt):
+    """Download a whole table as CSV or NDJSON, streamed from a server-side cursor."""
+    table = DATA_TABLES.get(name)
+    if table is None or fmt not in dataio.FORMATS:
+        return jsonify({'error': 'unknown table or format'}), 404
+
+    def generate():
+        with db.engine.connect() as conn:
+            yield from dataio.export_chunks(dataio.iter_rows(conn, table), [c.name for c in table.columns], fmt)
+
+    return Response(stream_with_context(generate()), mimetype=dataio.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+CLAMP_BATCH_MAX = 200
 
-    return {
-        'id': clamp.id,
-        'location': clamp.location,
-        'registration': clamp.registration or '',
-        'clamp_date': clamp.clamp_date.strftime('%Y-%m-%d') if clamp.clamp_date else None,
-        'time_in': time_str(clamp.time_in),
-        'offense': clamp.offense or '',
-        'time_called': time_str(clamp.time_called),
-        'time_released': time_str(clamp.time_released),
-        'car_type': clamp.car_type or '',
-        'color': clamp.color or '',
-        'clamp_ref': clamp.clamp_ref or '',
-        'amount_paid': float(clamp.amount_paid or 0.0),
-        'payment_status': clamp.payment_status,
-        'image_filename': clamp.image_filename or None,
-        'image_url': url_for('static', filename=clamp.image_filename) if clamp.image_filename else None,
-    }
+
+# columns a clamp cannot be stored without (the rest are nullable or have defaults)
+CLAMP_REQUIRED = tuple(c.name for c in ClampData.__table__.columns
+                       if not (c.nullable or c.primary_key or c.default is not None or c.server_default is not None))
+
+
+def _batch_record_error(record):
+    """Why a queued record cannot be stored, or None."""
+    missing = [name for name in CLAMP_REQUIRED if record.get(name) in (None, '')]
+    if missing:
+        return f'missing field: {", ".join(missing)}'
+    if record.get('photo') is not None and not isinstance(record['photo'], str):
+        return 'photo must name a file part'
+    return None
+
+
+@app.route('/api/clamps/batch', methods=['POST'])
+@login_required
+def api_clamps_batch():
+    """Insert many clamps in one transaction; used to replay the PWA's offline queue.
+
+    Multipart body: ``records`` is a JSON list of objects with the add-clamp
+    form fields plus a required ``client_key``, and optionally ``photo`` naming
+    the file part that holds its image. Records whose client_key is already
+    stored are reported as duplicates, so replaying a batch is safe. Invalid
+    records (missing fields, or rejected by the database in their own
+    savepoint) are reported and skipped; they would fail the same way on retry.
+    409 means another request stored one of the client_keys meanwhile.
+    """
+    try:
+        records = json.loads(request.form.get('records') or '[]')
+    except ValueError:
+        return jsonify({'error': 'records must be a JSON list'}), 400
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        return jsonify({'error': 'records must be a JSON list of objects'}), 400
+    if len(records) > CLAMP_BATCH_MAX:
+        return jsonify({'error': f'at most {CLAMP_BATCH_MAX} records per batch'}), 400
+
+    keys = [str(r.get('client_key') or '') for r in records]
+    existing = dict(db.session.query(ClampData.client_key, ClampData.id).filter(
+        ClampData.client_key.in_([k for k in keys if k])).all())
+    # one transaction for the batch, one savepoint per record: a record the
+    # database rejects is reported alone and the rest are still stored
+    sqlite_tuning.begin(db.session.connection())
+    results, created = [], {}  # created: client_key -> new ClampData
+    for key, record in zip(keys, records):
+        if not key or len(key) > 64:
+            results.append({'client_key': key, 'status': 'invalid', 'error': 'client_key (1-64 chars) required'})
+            continue
+        if key in existing or key in created:
+            results.append({'client_key': key, 'status': 'duplicate'})
+            continue
+        error = _batch_record_error(record)
+        if error is None:
+            try:
+                clamp = clamp_from_fields({**record, 'client_key': key})
+            except (KeyError, ValueError, TypeError) as e:
+                error = f'bad or missing field: {e}'
+        if error is not None:
+            results.append({'client_key': key, 'status': 'invalid', 'error': error})
+            continue
+        photo = request.files.get(record['photo']) if record.get('photo') else None
+        if photo and photo.filename:
+            clamp.image_filename = save_upload(photo)
+        try:
+            with db.session.begin_nested():
+                db.session.add(clamp)
+        except IntegrityError as e:
+            if 'client_key' in str(e.orig):
+                # a concurrent replay of the same queue committed first; the client
+                # retries and this time the keys are found above
+                db.session.rollback()
+                return jsonify({'error': 'conflicting concurrent batch, retry'}), 409
+            results.append({'client_key': key, 'status': 'invalid', 'error': f'rejected by the database: {e.orig}'})
+            continue
+        created[key] = clamp
+        results.append({'client_key': key, 'status': 'created'})
+    db.session.commit()
+    for result in results:
+        key = result['client_key']
+        if result['status'] != 'invalid':
+            result['id'] = existing[key] if key in existing else created[key].id
+    for clamp in created.values():
+        if clamp.image_filename:
+            schedule_image_variants(clamp.id, clamp.image_filename)
+    return jsonify({'results': results, 'created': len(created)})
 
 @app.route('/clamp/<int:id>/appeals')
 def clamp_appeals(id):
     """Return JSON list of appeals linked to a clamp."""
-    clamp = ClampData.query.get_or_404(id)
-    appeals = []
-    for a in clamp.appeals:
-        appeals.append({
-            'id': a.id,
-            'appeal_date': a.appeal_date.strftime('%Y-%m-%d') if a.appeal_date else None,
-            'appeal_reason': a.appeal_reason,
-            'appeal_status': a.appeal_status,
-            'notes': a.notes or ''
-        })
-    return jsonify({'clamp_id': clamp.id, 'appeals': appeals})
+    # one query: the outer join also tells a clamp without appeals from a missing clamp
+    rows = db.session.execute(
+        db.select(ClampData.id, Appeal).outerjoin(Appeal, Appeal.clamp_id == ClampData.id)
+        .where(ClampData.id == id).order_by(Appeal.id)).all()
+    if not rows:
+        abort(404)
+    found = [a for _, a in rows if a is not None]
+    # the set of (id, revision) pairs changes on every add, edit and delete; a
+    # Last-Modified could not see deletes, so this endpoint only has the ETag
+    versions = ','.join(f'{a.id}:{a.revision}' for a in found)
+    etag = f'appeals-{id}-{hashlib.sha1(versions.encode()).hexdigest()[:16]}-v{JSON_REPR_VERSION}'
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    appeals = [appeal_json.dump(a, APPEAL_LIST_FIELDS) for a in found]
+    return _with_validators(jsonify({'clamp_id': id, 'appeals': appeals}), etag)
+
+
+# Live change feed. Dashboards hold an EventSource on /api/events; each
+# stream polls the change log (changelog.py), which every worker's writes
+# land in, and sends the rows changed since the client's cursor. A stream
+# ends after CHANGE_STREAM_SECONDS and the browser reconnects with the last
+# event id, so no change is skipped. Streams occupy a worker thread each:
+# run gunicorn with threaded workers (see README).
+app.config.setdefault('CHANGE_POLL_SECONDS', 1.0)
+app.config.setdefault('CHANGE_STREAM_SECONDS', 300)
+CHANGE_HEARTBEAT_SECONDS = 15   # comment line that keeps proxies from closing an idle stream
+CHANGE_RETRY_MS = 3000
+CHANGE_BATCH_MAX = 500          # log entries per poll
+CHANGE_TYPES = {'clamp_data': 'clamp', 'appeal': 'appeal'}
+_CHANGE_MODELS = {'clamp_data': ClampData, 'appeal': Appeal}
+
+
+def _change_row(instance):
+    return (clamp_json if isinstance(instance, ClampData) else appeal_json).dump(instance)
+
+
+def change_batch(after, limit=CHANGE_BATCH_MAX):
+    """Return (cursor, changes) for up to limit log entries after seq `after`.
+
+    Each changed row appears once, in the order of its last change, as
+    {type, id, op: 'put', row} with the row's current JSON, or as
+    {type, id, op: 'delete'} when it no longer exists. Rows are loaded
+    with one query per table.
+    """
+    entries = changelog.read(db.session.connection(), after, limit)
+    if not entries:
+        return after, []
+    # dict order: each row's position is that of its last log entry
+    last = {}
+    for _, table, row_id, _op in entries:
+        last.pop((table, row_id), None)
+        last[(table, row_id)] = True
+    rows = {}
+    for table, model in _CHANGE_MODELS.items():
+        ids = [row_id for t, row_id in last if t == table]
+        if ids:
+            rows.update({(table, obj.id): _change_row(obj) for obj in model.query.filter(model.id.in_(ids))})
+    changes = []
+    for key in last:
+        row = rows.get(key)
+        change = {'type': CHANGE_TYPES[key[0]], 'id': key[1], 'op': 'put' if row else 'delete'}
+        if row:
+            change['row'] = row
+        changes.append(change)
+    return entries[-1][0], changes
+
+
+def _sse(event, event_id, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+@app.route('/api/events')
+@login_required
+def change_events():
+    """Server-Sent Events: a `changes` event {cursor, changes} whenever clamps or appeals change."""
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.args.get('since', -1))
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+    if since < 0:
+        # a new dashboard was just rendered: only later changes matter
+        since = changelog.head(db.session.connection())
+    poll, lifetime = app.config['CHANGE_POLL_SECONDS'], app.config['CHANGE_STREAM_SECONDS']
+
+    def stream(cursor):
+        yield f'retry: {CHANGE_RETRY_MS}\n\n'
+        started = quiet_since = time.monotonic()
+        while True:
+            cursor_before = cursor
+            cursor, changes = change_batch(cursor)
+            # hand the connection back to the pool between polls
+            db.session.remove()
+            if changes:
+                yield _sse('changes', cursor, {'cursor': cursor, 'changes': changes})
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= CHANGE_HEARTBEAT_SECONDS:
+                yield ': keepalive\n\n'
+                quiet_since = time.monotonic()
+            if time.monotonic() - started >= lifetime:
+                return
+            # seqs are consecutive, so a full batch means more entries are waiting
+            if cursor - cursor_before < CHANGE_BATCH_MAX:
+                time.sleep(poll)
+
+    return Response(stream_with_context(stream(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Delta sync for offline replicas: the service worker keeps every clamp and
+# appeal in IndexedDB. A client without a cursor, or with one older than the
+# pruned log, is sent a full copy first, SYNC_SNAPSHOT_ROWS rows per call;
+# from then on each sync returns only the rows changed since its cursor, and
+# tombstones for deleted ones. Changes made while a copy is being read are
+# replayed after it, so the replica ends up consistent.
+SYNC_SNAPSHOT_ROWS = 500
+SYNC_CHANGES_MAX = 1000     # log entries per call
+SYNC_MODELS = {'clamp': ClampData, 'appeal': Appeal}
+
+
+def _sync_position(token):
+    """Decode a sync cursor: [seq] while following the log, [seq, type, last id] during a copy."""
+    position = _decode_cursor(token)
+    if len(position) == 1 and isinstance(position[0], int):
+        return position
+    if (len(position) == 3 and isinstance(position[0], int) and position[1] in SYNC_MODELS
+            and isinstance(position[2], int)):
+        return position
+    raise ValueError('malformed cursor')
+
+
+@app.route('/api/changes')
+@login_required
+def api_changes():
+    """Clamps and appeals changed since ?since=<cursor>, for offline replicas.
+
+    Returns {cursor, more, reset, clamp: {put, delete}, appeal: {put, delete}}:
+    rows to store (current JSON) and ids to remove. Call again with the
+    returned cursor while more is true. reset means a full copy starts with
+    this response and local data must be dropped first.
+    """
+    conn = db.session.connection()
+    try:
+        position = _sync_position(request.args['since']) if request.args.get('since') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'invalid cursor'}), 400
+    delta = {kind: {'put': [], 'delete': []} for kind in SYNC_MODELS}
+    reset = position is None or (len(position) == 1 and position[0] < changelog.floor(conn))
+    if reset:
+        position = [changelog.head(conn), 'clamp', 0]
+
+    if len(position) == 3:
+        seq, kind, last_id = position
+        model = SYNC_MODELS[kind]
+        rows = model.query.filter(model.id > last_id).order_by(model.id).limit(SYNC_SNAPSHOT_ROWS).all()
+        delta[kind]['put'] = [_change_row(row) for row in rows]
+        if len(rows) == SYNC_SNAPSHOT_ROWS:
+            position = [seq, kind, rows[-1].id]
+        elif kind == 'clamp':
+            position = [seq, 'appeal', 0]
+        else:
+            position = [seq]
+        # a finished copy is still followed by the changes logged during it
+        more = True
+    else:
+        cursor, changes = change_batch(position[0], SYNC_CHANGES_MAX)
+        for change in changes:
+            if change['op'] == 'put':
+                delta[change['type']]['put'].append(change['row'])
+            else:
+                delta[change['type']]['delete'].append(change['id'])
+        more = cursor - position[0] >= SYNC_CHANGES_MAX
+        position = [cursor]
+    return jsonify(cursor=_encode_cursor(position), more=more, reset=reset, **delta)
+
+
+@app.cli.command('prune-changes')
+@click.option('--days', type=int, default=30, show_default=True, help='Keep entries this many days old.')
+def prune_changes_command(days):
+    """Delete old change-log entries (replicas last synced before then copy everything again)."""
+    with db.engine.begin() as conn:
+        pruned = changelog.prune(conn, datetime.utcnow() - timedelta(days=days))
+    print(f'Pruned {pruned} change-log entries')
 
 
 @app.route('/delete-clamp-with-appeals/<int:id>', methods=['POST'])
@@ -562,6 +2104,12 @@ def delete_clamp_with_appeals(id):
 
 
 # Authentication routes
+@app.errorhandler(HashingBusy)
+def hashing_busy(e):
+    # every hashing slot is taken: fail fast and let the client retry shortly
+    return 'Too many sign-ins in progress, please retry in a moment.', 503, {'Retry-After': '2'}
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -569,8 +2117,12 @@ def login():
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
-            session['user_id'] = user.id
-            session['username'] = user.username
+            if password_hasher.needs_rehash(user.password_hash):
+                # cost parameters changed since this hash was made; same password, so no revocation
+                user.set_password(password)
+                db.session.commit()
+            session.clear()
+            session.update(session_claims(user))
             flash('Logged in successfully', 'success')
             # force password change flow
             if user.force_password_change:
@@ -584,7 +2136,7 @@ def login():
 @app.route('/change-password', methods=['GET', 'POST'])
 @login_required
 def change_password():
-    user = User.query.get(session.get('user_id'))
+    user = db.session.get(User, current_identity()['id'])
     if request.method == 'POST':
         current = request.form.get('current_password')
         newpw = request.form.get('new_password')
@@ -595,9 +2147,13 @@ def change_password():
         if not newpw or newpw != confirm:
             flash('New passwords do not match', 'error')
             return redirect(url_for('change_password'))
-        user.password_hash = generate_password_hash(newpw)
+        user.set_password(newpw)
         user.force_password_change = False
+        bump_credential_version(user)
         db.session.commit()
+        _auth_epoch.bump()
+        # other sessions of this user are now revoked; keep the current one valid
+        session.update(session_claims(user))
         flash('Password changed successfully', 'success')
         return redirect(url_for('index'))
     return render_template('change_password.html')
@@ -629,7 +2185,8 @@ def add_user():
     if User.query.filter_by(username=username).first():
         flash('User already exists', 'error')
         return redirect(url_for('users'))
-    user = User(username=username, password_hash=generate_password_hash(password), is_admin=is_admin) # pyright: ignore[reportCallIssue]
+    user = User(username=username, is_admin=is_admin) # pyright: ignore[reportCallIssue]
+    user.set_password(password)
     db.session.add(user)
     db.session.commit()
     flash('User added', 'success')
@@ -645,29 +2202,27 @@ def delete_user(id):
         return redirect(url_for('users'))
     db.session.delete(user)
     db.session.commit()
+    _auth_epoch.bump()
     flash('User deleted', 'success')
     return redirect(url_for('users'))
 
 if __name__ == '__main__':
     with app.app_context():
-        # Ensure DB schema is migrated for the new `force_password_change` column
-        try:
-            ensure_force_password_column()
-        except Exception as _:
-            # migration issues should not block startup here; they'll be visible in logs
-            pass
-        db.create_all()
+        # the development server migrates for convenience; deployments run `flask migrate`
+        current, expected = migrations.check(db.engine)
+        if current is None or current < expected:
+            upgrade_schema()
         # create default admin user if missing
         try:
             if not User.query.filter_by(username='admin').first():
                 default_pw = os.environ.get('DEFAULT_ADMIN_PASSWORD')
                 if default_pw:
-                    pw_hash = generate_password_hash(default_pw)
+                    pw_hash = password_hasher.hash(default_pw)
                     force_change = False
                     print('Default admin created with provided DEFAULT_ADMIN_PASSWORD env var')
                 else:
                     # fallback to an insecure default but require immediate change on first login
-                    pw_hash = generate_password_hash('admin')
+                    pw_hash = password_hasher.hash('admin')
                     force_change = True
                     print('Default admin created with fallback password; force_password_change=True')
                 admin = User(username='admin', password_hash=pw_hash, is_admin=True, force_password_change=force_change)
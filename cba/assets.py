@@ -0,0 +1,118 @@
+"""Fingerprinted, precompressed copies of the static assets.
+
+``build(static_root)`` copies every asset matched by SOURCES to
+``static/dist/`` under a content-hashed name (``css/style.css`` ->
+``dist/css/style.1a2b3c4d5e.css``), writes ``.gz`` (and, when the optional
+``brotli`` package is installed, ``.br``) siblings for text formats, and
+records the mapping in ``dist/assets-manifest.json`` together with a version
+derived from all hashes. A changed file gets a new name, so the hashed URLs
+can be cached forever (``Cache-Control: immutable``) and the service worker
+cache version changes exactly when an asset does.
+
+The web app manifest is rewritten to point at the hashed icons before it is
+hashed itself. Without a build (development), the manifest file is absent
+and pages use the plain static URLs.
+"""
+import fnmatch
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+from urllib.parse import urljoin
+
+try:
+    import brotli
+except ImportError:  # optional: gzip siblings only
+    brotli = None
+
+DIST = 'dist'
+MANIFEST_NAME = 'assets-manifest.json'
+# static-relative patterns of the files to fingerprint; manifest.json goes last
+# because it refers to the icons
+SOURCES = ('css/*.css', 'js/*.js', 'images/*.png', 'images/*.svg', 'manifest.json')
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg')
+HASH_LEN = 10
+
+
+def _hashed_name(rel, content):
+    stem, ext = posixpath.splitext(rel)
+    return f'{DIST}/{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LEN]}{ext}'
+
+
+def sources(static_root):
+    """Static-relative paths of the files a build fingerprints."""
+    found = []
+    for pattern in SOURCES:
+        directory = posixpath.dirname(pattern)
+        names = sorted(os.listdir(os.path.join(static_root, directory))) if os.path.isdir(
+            os.path.join(static_root, directory)) else []
+        found += [posixpath.join(directory, n) for n in names
+                  if fnmatch.fnmatch(n, posixpath.basename(pattern))
+                  and os.path.isfile(os.path.join(static_root, directory, n))]
+    return found
+
+
+def _rewrite_web_manifest(content, files, static_url):
+    data = json.loads(content)
+    if 'start_url' in data:
+        # keep resolving relative to the original manifest location
+        data['start_url'] = urljoin(f'{static_url}/manifest.json', data['start_url'])
+    for icon in data.get('icons', []):
+        src = icon.get('src', '')
+        if src.startswith(static_url + '/') and src[len(static_url) + 1:] in files:
+            icon['src'] = f'{static_url}/{files[src[len(static_url) + 1:]]}'
+    return json.dumps(data, indent=2).encode('utf-8')
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(content)
+
+
+def build(static_root, static_url='/static'):
+    """Build static/dist; return the manifest dict.
+
+    Files from earlier builds are left in place, so pages rendered before a
+    deploy can still load the assets they reference.
+    """
+    out = os.path.join(static_root, DIST)
+    files = {}
+    for rel in sources(static_root):
+        with open(os.path.join(static_root, rel), 'rb') as fh:
+            content = fh.read()
+        if rel == 'manifest.json':
+            content = _rewrite_web_manifest(content, files, static_url)
+        hashed = _hashed_name(rel, content)
+        target = os.path.join(static_root, hashed)
+        _write(target, content)
+        if rel.endswith(COMPRESSIBLE):
+            _write(target + '.gz', gzip.compress(content, 9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(content))
+        files[rel] = hashed
+    version = hashlib.sha256(''.join(sorted(files.values())).encode()).hexdigest()[:HASH_LEN]
+    manifest = {'version': version, 'files': files}
+    _write(os.path.join(out, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(static_root):
+    """The build manifest, or an empty one ('dev' version) when no build exists."""
+    try:
+        with open(os.path.join(static_root, DIST, MANIFEST_NAME), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {'version': 'dev', 'files': {}}
+
+
+def precompressed(static_root, filename, accepted):
+    """Pick a precompressed sibling of a dist file: (encoding, filename) or (None, filename).
+
+    accepted is the request's Accept-Encoding (a werkzeug Accept object).
+    """
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(os.path.join(static_root, filename + suffix)):
+            return encoding, filename + suffix
+    return None, filename
@@ -0,0 +1,148 @@
+"""Content-addressed storage for uploaded photos.
+
+A photo is stored once per distinct content, at
+
+    images/uploads/<h[0:2]>/<h[2:4]>/<sha256><ext>
+
+relative to the static folder. The hash is computed while the upload streams
+to a temporary file, so the bytes are read exactly once. An identical
+re-upload (a phone retrying a request) finds the blob already present and
+adds nothing to disk. Two levels of 256 shard directories keep every
+directory small at hundreds of thousands of photos.
+
+Blobs can be shared by several clamp records. The app counts references in
+the photo_blob table and a periodic sweep deletes blobs nobody references
+(see sweep_photo_blobs in app.py). Photos saved under the older flat
+``<timestamp>_<name>`` layout are left where they are.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: single-process servers only
+    fcntl = None
+
+UPLOAD_PREFIX = 'images/uploads'
+CHUNK = 64 * 1024
+log = logging.getLogger(__name__)
+_SHARD = re.compile(r'^[0-9a-f]{2}$')
+_BLOB = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$')
+
+
+def _extension(filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if re.fullmatch(r'\.[a-z0-9]{1,8}', ext) else ''
+
+
+def blob_path(digest, ext):
+    return f'{UPLOAD_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+def store(static_root, stream, filename):
+    """Write stream as a blob; return its static-relative path.
+
+    If the same content (and extension) is already stored, the temporary copy
+    is dropped and the existing blob's mtime refreshed, which tells a
+    concurrent sweep that it is in use again.
+    """
+    tmp_dir = os.path.join(static_root, UPLOAD_PREFIX, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    try:
+        with open(tmp, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        rel = blob_path(digest.hexdigest(), _extension(filename))
+        final = os.path.join(static_root, rel)
+        if os.path.exists(final):
+            os.utime(final)
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp, final)
+        return rel
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def is_blob(relpath):
+    """True for paths in the sharded layout (as opposed to legacy flat uploads)."""
+    parts = (relpath or '').split('/')
+    return (len(parts) == 5 and '/'.join(parts[:2]) == UPLOAD_PREFIX and _SHARD.match(parts[2])
+            and _SHARD.match(parts[3]) and bool(_BLOB.match(parts[4])))
+
+
+def older_than(static_root, relpath, cutoff):
+    try:
+        return os.path.getmtime(os.path.join(static_root, relpath)) < cutoff
+    except FileNotFoundError:
+        return True
+
+
+def remove(static_root, relpath, derived=()):
+    """Delete a blob and any files derived from it (e.g. resized variants)."""
+    for rel in (relpath, *derived):
+        try:
+            os.remove(os.path.join(static_root, rel))
+        except FileNotFoundError:
+            pass
+
+
+def walk_blobs(static_root):
+    """Yield the static-relative path of every stored blob (a full directory walk)."""
+    base = os.path.join(static_root, UPLOAD_PREFIX)
+    for a in sorted(os.listdir(base)) if os.path.isdir(base) else ():
+        if not _SHARD.match(a):
+            continue
+        for b in sorted(os.listdir(os.path.join(base, a))):
+            if not _SHARD.match(b):
+                continue
+            for name in os.listdir(os.path.join(base, a, b)):
+                if _BLOB.match(name):
+                    yield f'{UPLOAD_PREFIX}/{a}/{b}/{name}'
+
+
+class Sweeper:
+    """Call fn every interval seconds on a daemon thread.
+
+    Every server process starts one; a non-blocking lock on lock_path makes
+    sure only one of them sweeps at a time.
+    """
+
+    def __init__(self, fn, interval, lock_path):
+        self.fn, self.interval, self.lock_path = fn, interval, lock_path
+        self._started = False
+        self._guard = threading.Lock()
+
+    def start(self):
+        with self._guard:
+            if self._started or self.interval <= 0:
+                return
+            self._started = True
+        threading.Thread(target=self._loop, name='photo-sweeper', daemon=True).start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                log.exception('Photo sweep failed')
+
+    def run_once(self):
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None  # another process is sweeping
+            return self.fn()
@@ -0,0 +1,72 @@
+"""Log of writes to clamp_data and appeal, for live dashboards.
+
+Triggers append one row per insert, update or delete to ``change_log``, so
+every writer is covered: all gunicorn workers, Core bulk imports, the sqlite3
+shell. ``seq`` is AUTOINCREMENT, so a value is never handed out twice even
+after old entries are removed, and because SQLite runs one write transaction
+at a time, entries become visible in ``seq`` order: a reader that has seen
+everything up to N can resume with ``seq > N`` and miss nothing.
+
+The log records only which row changed and how; readers load the current row
+themselves. Old entries are pruned (``prune``); a reader whose cursor is
+older than ``floor`` has to start over from a full copy. ``install`` is
+hooked to each tracked table's create event in app.py and run by a migration
+for existing databases.
+"""
+TABLE = 'change_log'
+TRACKED = ('clamp_data', 'appeal')
+OPS = {'INSERT': ('insert', 'new'), 'UPDATE': ('update', 'new'), 'DELETE': ('delete', 'old')}
+
+LOG_DDL = (
+    f'CREATE TABLE IF NOT EXISTS {TABLE} (seq INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, '
+    f'row_id INTEGER NOT NULL, op TEXT NOT NULL, at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)',
+)
+
+
+def _trigger_ddl(table):
+    return tuple(
+        f"CREATE TRIGGER IF NOT EXISTS {TABLE}_{table}_{op} AFTER {event} ON {table} BEGIN "
+        f"INSERT INTO {TABLE}(tbl, row_id, op) VALUES ('{table}', {ref}.id, '{op}'); END"
+        for event, (op, ref) in OPS.items())
+
+
+def exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).first() is not None
+
+
+def install(conn, table):
+    """Create the log if missing and the triggers recording writes to table."""
+    if table not in TRACKED:
+        raise ValueError(f'{table} is not tracked')
+    for statement in LOG_DDL + _trigger_ddl(table):
+        conn.exec_driver_sql(statement)
+
+
+def drop(conn):
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def head(conn):
+    """The newest seq handed out, or 0 if nothing was ever logged (pruning does not lower it)."""
+    row = conn.exec_driver_sql('SELECT seq FROM sqlite_sequence WHERE name = ?', (TABLE,)).first()
+    return row[0] if row else 0
+
+
+def floor(conn):
+    """The oldest cursor the log can still answer: entries at or before it may have been pruned."""
+    oldest = conn.exec_driver_sql(f'SELECT min(seq) FROM {TABLE}').scalar()
+    return oldest - 1 if oldest is not None else head(conn)
+
+
+def prune(conn, before):
+    """Delete entries logged before the datetime `before`; return how many."""
+    # CURRENT_TIMESTAMP is UTC, as text that sorts like the time
+    stamp = before.strftime('%Y-%m-%d %H:%M:%S')
+    return conn.exec_driver_sql(f'DELETE FROM {TABLE} WHERE at < ?', (stamp,)).rowcount
+
+
+def read(conn, after, limit):
+    """Return up to limit (seq, table, row id, op) entries after seq `after`, oldest first."""
+    return conn.exec_driver_sql(
+        f'SELECT seq, tbl, row_id, op FROM {TABLE} WHERE seq > ? ORDER BY seq LIMIT ?', (after, limit)).all()
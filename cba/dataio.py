@@ -0,0 +1,237 @@
+"""Streaming export and chunked bulk import of whole tables (CSV or NDJSON).
+
+Export walks the table in primary-key order with ``yield_per``, so rows are
+fetched from the database cursor in batches and turned into text chunks as
+they go; memory stays flat however large the table is. Import reads records
+lazily, converts and validates them a chunk at a time, and writes each chunk
+with one ``executemany`` INSERT, committing per chunk. Rows that would collide
+with a stored row (primary key or unique index) are found before the INSERT
+and skipped, so a re-run of a partly applied import only adds what is missing.
+
+Both work on Core tables rather than ORM objects: no identity map, no
+per-row mapper events. Callers must rebuild anything those events maintain
+(see the export/import commands in app.py).
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, Time, UniqueConstraint, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+FORMATS = ('csv', 'ndjson')
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_CHUNK = 2000     # rows fetched per cursor batch / emitted per text chunk
+IMPORT_CHUNK = 5000     # rows per executemany INSERT and transaction
+MAX_ERRORS = 100
+
+
+class ImportErrorLimit(Exception):
+    """Raised when more than MAX_ERRORS rows failed validation; .inserted rows were written before."""
+
+    def __init__(self, message, inserted=0):
+        super().__init__(message)
+        self.inserted = inserted
+
+
+def _text(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(connection, table, chunk=EXPORT_CHUNK):
+    """Yield each row of table as a tuple, in primary-key order, streaming from the cursor."""
+    stmt = select(*table.columns).order_by(*table.primary_key.columns).execution_options(yield_per=chunk)
+    for partition in connection.execute(stmt).partitions():
+        yield from partition
+
+
+def export_chunks(rows, columns, fmt, chunk=EXPORT_CHUNK):
+    """Turn rows into CSV/NDJSON text, yielding a string every `chunk` rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n') if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+    n = 0
+    for row in rows:
+        values = [_text(v) for v in row]
+        if writer:
+            writer.writerow(['' if v is None else v for v in values])
+        else:
+            buf.write(json.dumps(dict(zip(columns, values)), separators=(',', ':')))
+            buf.write('\n')
+        n += 1
+        if n % chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) from a text stream of CSV (with header) or NDJSON.
+
+    An NDJSON line that is not a JSON object is yielded as (line number,
+    ValueError), so import_records reports it with the other invalid rows.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for lineno, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield lineno, ValueError(f'not valid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield lineno, ValueError(f'expected a JSON object, got {type(record).__name__}')
+                continue
+            yield lineno, record
+    else:
+        raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+
+
+def _unique_keys(table):
+    """Column-name tuples whose values must be unique: primary key, unique columns, indexes and constraints."""
+    keys = [tuple(c.name for c in table.primary_key.columns)]
+    keys += [(c.name,) for c in table.columns if c.unique]
+    keys += [tuple(c.name for c in ix.columns) for ix in table.indexes if ix.unique]
+    keys += [tuple(c.name for c in uc.columns) for uc in table.constraints if isinstance(uc, UniqueConstraint)]
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def _drop_conflicts(connection, table, key, batch, errors):
+    """batch without the rows whose key values are already stored or repeat an earlier row's."""
+    columns = [table.c[name] for name in key]
+    # NULL never collides (and a NULL primary key is assigned on insert)
+    wanted = {tuple(row[name] for name in key) for _, row in batch}
+    wanted = [values for values in wanted if None not in values]
+    if not wanted:
+        return batch
+    if len(columns) == 1:
+        stmt = select(columns[0]).where(columns[0].in_([values[0] for values in wanted]))
+    else:
+        stmt = select(*columns).where(tuple_(*columns).in_(wanted))
+    taken = {tuple(row) for row in connection.execute(stmt)}
+    kept, first = [], {}
+    for lineno, row in batch:
+        values = tuple(row[name] for name in key)
+        label = ', '.join(f'{name}={row[name]}' for name in key)
+        if None in values:
+            kept.append((lineno, row))
+        elif values in taken:
+            errors.append((lineno, f'{label} already exists'))
+        elif values in first:
+            errors.append((lineno, f'{label} repeats line {first[values]}'))
+        else:
+            first[values] = lineno
+            kept.append((lineno, row))
+    return kept
+
+
+def _converter(column):
+    kind = column.type
+    if isinstance(kind, DateTime):
+        return datetime.fromisoformat
+    if isinstance(kind, Date):
+        return date.fromisoformat
+    if isinstance(kind, Time):
+        return time.fromisoformat
+    if isinstance(kind, Boolean):
+        return lambda v: v if isinstance(v, bool) else str(v).strip().lower() in ('1', 'true', 'yes', 'y')
+    if isinstance(kind, Integer):
+        return int
+    if isinstance(kind, (Float, Numeric)):
+        return float
+    return str
+
+
+def _default(column):
+    default = column.default
+    if default is None or not (default.is_scalar or default.is_callable):
+        return lambda: None
+    if default.is_scalar:
+        return lambda: default.arg
+    return lambda: default.arg(None)
+
+
+def import_records(connection, table, records, chunk=IMPORT_CHUNK, max_errors=MAX_ERRORS):
+    """Validate and bulk-insert (lineno, dict) records; return (inserted, errors).
+
+    Unknown fields are ignored; the primary key is kept when given. Empty
+    values become NULL (CSV cannot tell the two apart), and missing values
+    take the column default. Rows failing conversion, NOT NULL, foreign-key or
+    uniqueness checks are skipped and reported as (lineno, message). Should the
+    database still reject a chunk, that chunk is rolled back and each of its
+    rows reported. More than max_errors errors abort the import with
+    ImportErrorLimit (chunks already written stay). Records that are not
+    dicts, such as the ValueErrors read_records yields for unreadable lines,
+    are reported too.
+    """
+    columns = list(table.columns)
+    convert = {c.name: _converter(c) for c in columns}
+    defaults = {c.name: _default(c) for c in columns}
+    required = [c.name for c in columns if not c.nullable and not c.primary_key]
+    foreign = [(c.name, fk.column) for c in columns for fk in c.foreign_keys]
+    unique = _unique_keys(table)
+    inserted, errors, batch = 0, [], []
+
+    def flush():
+        nonlocal inserted, batch
+        for name, target in foreign:
+            wanted = {row[name] for _, row in batch if row[name] is not None}
+            found = set(connection.execute(select(target).where(target.in_(wanted))).scalars()) if wanted else set()
+            missing = [(lineno, row) for lineno, row in batch if row[name] is not None and row[name] not in found]
+            for lineno, row in missing:
+                errors.append((lineno, f'{name}={row[name]} does not exist'))
+            batch = [item for item in batch if item[1][name] is None or item[1][name] in found]
+        for key in unique:
+            batch = _drop_conflicts(connection, table, key, batch, errors)
+        if batch:
+            try:
+                connection.execute(table.insert(), [row for _, row in batch])
+            except IntegrityError as e:
+                connection.rollback()
+                errors.extend((lineno, f'chunk rolled back: {e.orig}') for lineno, _ in batch)
+            else:
+                inserted += len(batch)
+        connection.commit()
+        batch = []
+        if len(errors) > max_errors:
+            raise ImportErrorLimit(f'more than {max_errors} invalid rows; stopped after {inserted} inserted', inserted)
+
+    for lineno, record in records:
+        if not isinstance(record, dict):
+            errors.append((lineno, str(record) if isinstance(record, ValueError) else 'not a record'))
+            continue
+        row = {}
+        try:
+            for c in columns:
+                value = record.get(c.name)
+                if value == '':
+                    value = None
+                if value is None:
+                    row[c.name] = None if c.primary_key else defaults[c.name]()
+                else:
+                    row[c.name] = convert[c.name](value)
+        except (TypeError, ValueError) as e:
+            errors.append((lineno, f'{c.name}: {e}'))
+            continue
+        missing = [name for name in required if row[name] is None]
+        if missing:
+            errors.append((lineno, f'missing {", ".join(missing)}'))
+            continue
+        batch.append((lineno, row))
+        if len(batch) >= chunk:
+            flush()
+    flush()
+    return inserted, sorted(errors)
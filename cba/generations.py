@@ -0,0 +1,39 @@
+"""Cross-process generation counters stored as small files.
+
+Gunicorn workers share no memory, so "something changed, drop your cached
+copy" signals go through a file in the shared state directory. Reading a
+counter is one small file read (no database round trip); bumping it takes an
+exclusive lock on a sibling .lock file and atomically replaces the value, so
+readers never see a partial write.
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: single-process servers only
+    fcntl = None
+
+
+class FileCounter:
+    def __init__(self, path):
+        self.path = path
+
+    def current(self):
+        try:
+            with open(self.path, 'rb') as fh:
+                return int(fh.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def bump(self):
+        """Increment the counter and return the new value."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            value = self.current() + 1
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as fh:
+                fh.write(str(value))
+            os.replace(tmp, self.path)
+        return value
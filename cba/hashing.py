@@ -0,0 +1,114 @@
+"""Password hashing off the request thread.
+
+scrypt is deliberately slow (tens to hundreds of milliseconds of CPU per
+call). Run inline, a burst of logins occupies every request worker at once.
+HashingPool sends the work to a small process pool instead and caps how many
+hashes may be queued or running per server process: once the cap is reached,
+further calls fail immediately with HashingBusy (the app answers 503 with
+Retry-After) rather than queueing behind work that will not finish in time.
+
+With workers=0 hashing runs inline in the caller, which is what tests and
+one-off scripts want.
+"""
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Python builds without OpenSSL scrypt fall back to the `scrypt` package. This
+# runs on import; pool processes import this module because the pool runs
+# _hash and _verify below, so they get it too.
+if not hasattr(hashlib, 'scrypt'):
+    import scrypt
+
+    def _scrypt(password, salt, n, r, p, buflen=64, maxmem=0):
+        return scrypt.hash(password, salt, N=n, r=r, p=p, buflen=buflen)
+    hashlib.scrypt = _scrypt
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(Exception):
+    """Raised when the pool already has max_pending hashes in flight."""
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults, so 'scrypt' and 'scrypt:32768:8:1' compare equal."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name] + args + defaults[len(args):])
+
+
+def hash_method(pwhash):
+    """The method prefix stored in front of the salt, e.g. 'scrypt:32768:8:1'."""
+    return pwhash.split('$', 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class HashingPool:
+    def __init__(self, workers=0, max_pending=16, method=DEFAULT_METHOD, timeout=10.0):
+        self.method = normalize_method(method)
+        self.timeout = timeout
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is held until the hash has finished, not until we stop
+        # waiting: a timed-out hash still occupies a pool process
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise HashingBusy()
+
+    def _pool(self):
+        # created on first use, after gunicorn has forked its workers; spawn
+        # keeps the children free of the parent's threads and DB connections
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when pwhash was made with other cost parameters than the configured ones."""
+        return normalize_method(hash_method(pwhash)) != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
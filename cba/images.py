@@ -0,0 +1,83 @@
+"""Resized variants of uploaded clamp photos.
+
+Camera uploads are several megabytes; list views only need a thumbnail.
+For an upload ``images/uploads/<name>.<ext>`` this writes
+``images/uploads/<name>.small.jpg`` and ``<name>.medium.jpg`` next to it,
+rotated upright and re-encoded without EXIF (which carries GPS position and
+device details). The original is kept untouched as the evidence copy.
+
+Variants are built by a background thread so the upload request returns as
+soon as the original is on disk. Until they exist, or when Pillow is not
+installed, pages fall back to the original file.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it there are no variants
+    Image = None
+
+log = logging.getLogger(__name__)
+
+# variant -> longest edge in pixels
+VARIANTS = {'small': 160, 'medium': 640}
+JPEG_QUALITY = 80
+
+
+def variant_path(image_filename, variant):
+    stem, _ = os.path.splitext(image_filename)
+    return f'{stem}.{variant}.jpg'
+
+
+def make_variants(static_root, image_filename):
+    """Write every variant of static_root/image_filename; return {variant: relative path}.
+
+    Returns {} when Pillow is missing or the file is not a readable image.
+    Variants already on disk are reused.
+    """
+    if Image is None:
+        return {}
+    existing = {v: variant_path(image_filename, v) for v in VARIANTS}
+    if all(os.path.exists(os.path.join(static_root, rel)) for rel in existing.values()):
+        return existing  # same content uploaded before (uploads are content-addressed)
+    try:
+        with Image.open(os.path.join(static_root, image_filename)) as src:
+            # apply the EXIF orientation before the metadata is dropped
+            upright = ImageOps.exif_transpose(src).convert('RGB')
+    except (OSError, ValueError) as e:
+        log.warning('No variants for %s: %s', image_filename, e)
+        return {}
+    made = {}
+    for variant, edge in VARIANTS.items():
+        img = upright.copy()
+        img.thumbnail((edge, edge))
+        rel = variant_path(image_filename, variant)
+        tmp = os.path.join(static_root, rel + '.tmp')
+        # a freshly created image has no EXIF block; save() writes none
+        img.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp, os.path.join(static_root, rel))
+        made[variant] = rel
+    return made
+
+
+class VariantWorker:
+    """Runs variant jobs off the request thread; synchronous when sync=True (tests)."""
+
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='image-variants')
+
+    def submit(self, fn, *args, sync=False):
+        if sync:
+            fn(*args)
+            return None
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(_log_failure)
+        return future
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        log.error('Image variant job failed', exc_info=exc)
@@ -0,0 +1,193 @@
+"""Request metrics in Prometheus text format, summed over every worker on the host.
+
+Each process keeps its counters and histograms in memory and a background
+thread writes them, at most once per ``interval`` seconds, to ``<pid>.json``
+under ``root`` (temp file and os.replace, so readers never see half a file).
+``render`` adds up the files of all processes, live or exited: counters and
+histograms only grow, so an exited worker's last values stay part of the
+totals, as Prometheus expects of a counter. A process started by fork drops
+what it inherited from its parent, so nothing is counted twice, and carries on
+from the file of any exited process that had the same pid.
+
+Values from other workers are at most ``interval`` seconds old. Files of
+exited workers stay until the directory is removed, which resets every series.
+"""
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _key(name, labels):
+    return name + '|' + json.dumps(sorted(labels.items()))
+
+
+def _split(key):
+    name, labels = key.split('|', 1)
+    return name, json.loads(labels)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs, extra=()):
+    items = list(pairs) + list(extra)
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}' if items else ''
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metrics:
+    def __init__(self, root, interval=1.0, buckets=BUCKETS):
+        self.root = root
+        self.interval = interval
+        self.buckets = tuple(buckets)
+        self.help = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+        atexit.register(self._flush_at_exit)
+
+    def describe(self, name, text):
+        """Set the HELP text of a metric."""
+        self.help[name] = text
+
+    def _check_pid(self):
+        # called with the lock held, before every read or write of the values
+        pid = os.getpid()
+        if self._pid != pid:
+            # first use, or a process started by fork: drop what the parent counted
+            # and take over the file an exited process with our pid may have left
+            data = self._read(f'{pid}.json') or {'counters': {}, 'histograms': {}}
+            self._counters, self._histograms, self._dirty = data['counters'], data['histograms'], False
+            self._pid = pid
+            threading.Thread(target=self._flush_loop, args=(pid,), name='metrics-flush', daemon=True).start()
+
+    def inc(self, name, labels, value=1):
+        key = _key(name, labels)
+        with self._lock:
+            self._check_pid()
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, labels, value):
+        key = _key(name, labels)
+        with self._lock:
+            self._check_pid()
+            hist = self._histograms.get(key)
+            if hist is None:
+                # per-bucket counts (the last is +Inf), then the sum
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(self.buckets)] += 1
+            hist[-1] += value
+            self._dirty = True
+
+    def _snapshot(self, written=False):
+        with self._lock:
+            self._check_pid()
+            if written:
+                self._dirty = False
+            return {'counters': dict(self._counters), 'histograms': {k: list(v) for k, v in self._histograms.items()}}
+
+    def flush(self):
+        """Write this process's values to its file now."""
+        data = self._snapshot(written=True)
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(data, fh)
+            os.replace(tmp, os.path.join(self.root, f'{os.getpid()}.json'))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _flush_loop(self, pid):
+        while os.getpid() == pid:
+            time.sleep(self.interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    pass  # try again next round
+
+    def _flush_at_exit(self):
+        if self._dirty and self._pid == os.getpid():
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.root, name)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None  # none yet, or removed meanwhile
+
+    def collect(self):
+        """Sum the values of every process; this one's are taken from memory."""
+        counters, histograms = {}, {}
+        sources = [self._snapshot()]
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not name.endswith('.json') or name == f'{os.getpid()}.json':
+                continue
+            data = self._read(name)
+            if data is not None:
+                sources.append(data)
+        for data in sources:
+            for key, value in data['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, hist in data['histograms'].items():
+                if key in histograms and len(histograms[key]) == len(hist):
+                    histograms[key] = [a + b for a, b in zip(histograms[key], hist)]
+                else:
+                    histograms.setdefault(key, list(hist))
+        return counters, histograms
+
+    def render(self):
+        """All metrics in Prometheus text exposition format (version 0.0.4)."""
+        counters, histograms = self.collect()
+        families = {}
+        for kind, values in (('counter', counters), ('histogram', histograms)):
+            for key, value in values.items():
+                name, labels = _split(key)
+                families.setdefault(name, (kind, []))[1].append((labels, value))
+        lines = []
+        for name in sorted(families):
+            kind, series = families[name]
+            if name in self.help:
+                lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(series):
+                if kind == 'counter':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,114 @@
+"""Versioned schema migrations for the SQLite database.
+
+Each migration is a module in this package named ``vNNNN_description.py``
+that defines ``upgrade(conn)``, where ``conn`` is a SQLAlchemy Connection
+inside a transaction. Applied versions are recorded in the ``schema_version``
+table, so every migration runs exactly once per database, in order.
+``v0000`` runs only on databases that predate the table.
+
+Migrations must tolerate running against a database that ``db.create_all()``
+has just created from the current models (use IF NOT EXISTS, or check for a
+column before adding it).
+
+Migrations are applied offline, with ``flask --app app migrate``. Processes
+serving requests only call ``check``: one read of the recorded version,
+compared with ``head()``, the newest version in this package.
+"""
+import importlib
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from sqlalchemy.exc import OperationalError
+
+_MODULE_RE = re.compile(r'^v(\d{4})_(\w+)\.py$')
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def _listing():
+    """[(version, name, module name)] from the file names, sorted by version."""
+    found = []
+    for fname in os.listdir(os.path.dirname(__file__)):
+        m = _MODULE_RE.match(fname)
+        if m:
+            found.append((int(m.group(1)), m.group(2), fname[:-3]))
+    found.sort(key=lambda item: item[0])
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f'duplicate migration versions in {versions}')
+    return found
+
+
+def discover():
+    """Return [(version, name, module)] for every migration, sorted by version."""
+    return [(version, name, importlib.import_module(f'{__name__}.{module}'))
+            for version, name, module in _listing()]
+
+
+@lru_cache(maxsize=None)
+def head():
+    """The newest migration version; a database at this version is up to date."""
+    return _listing()[-1][0]
+
+
+def _ensure_version_table(conn):
+    conn.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        ' version INTEGER PRIMARY KEY,'
+        ' name TEXT NOT NULL,'
+        ' applied_at TEXT NOT NULL)'
+    )
+
+
+def recorded_version(conn):
+    """The newest version applied to the database, or None if none was (or there is no
+    schema_version table). Read-only, so it is safe in every worker at start-up."""
+    try:
+        return conn.exec_driver_sql('SELECT MAX(version) FROM schema_version').scalar()
+    except OperationalError:
+        return None
+
+
+def current_version(conn):
+    _ensure_version_table(conn)
+    return recorded_version(conn)
+
+
+def check(engine):
+    """Return (database version, head()). Equal means the schema matches the code."""
+    with engine.connect() as conn:
+        return recorded_version(conn), head()
+
+
+def pending(engine):
+    """[(version, name)] of the migrations the database has not had yet."""
+    with engine.connect() as conn:
+        start = recorded_version(conn)
+    return [(v, name) for v, name, _ in _listing() if start is None or v > start]
+
+
+def apply_migrations(engine, verbose=True, target=None):
+    """Apply pending migrations up to target (default: all), one transaction each.
+    Returns the versions applied."""
+    applied = []
+    with engine.begin() as conn:
+        start = current_version(conn)
+    for version, name, module in discover():
+        if start is not None and version <= start:
+            continue
+        if target is not None and version > target:
+            break
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.exec_driver_sql(
+                'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                (version, name, datetime.utcnow().isoformat(timespec='seconds')),
+            )
+        applied.append(version)
+        if verbose:
+            print(f'Migration: applied v{version:04d} {name}')
+    return applied
@@ -0,0 +1,24 @@
+"""Add the columns that databases created before versioned migrations may lack
+(formerly added on every start-up, and by migrate_db.py and
+scripts/add_force_password_column.py). Runs only on databases without a
+schema_version table, before the indexes of v0001 need these columns."""
+
+COLUMNS = [
+    ('user', 'force_password_change', 'INTEGER DEFAULT 0'),
+    ('clamp_data', 'registration', 'TEXT'),
+    ('clamp_data', 'amount_paid', 'REAL DEFAULT 0.0'),
+    ('clamp_data', 'image_filename', "TEXT DEFAULT ''"),
+    ('clamp_data', 'time_called', "TEXT DEFAULT ''"),
+    ('clamp_data', 'car_type', "TEXT DEFAULT ''"),
+    ('clamp_data', 'color', "TEXT DEFAULT ''"),
+    ('clamp_data', 'clamp_ref', "TEXT DEFAULT ''"),
+]
+
+
+def upgrade(conn):
+    existing = {}
+    for table, column, decl in COLUMNS:
+        if table not in existing:
+            existing[table] = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info('{table}')")}
+        if existing[table] and column not in existing[table]:
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
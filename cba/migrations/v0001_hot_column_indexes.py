@@ -0,0 +1,18 @@
+"""Index the clamp_data columns the listing, filter and invoicing queries hit,
+and the appeal.clamp_id foreign key used by the per-clamp appeal lookups."""
+
+INDEXES = [
+    ('ix_clamp_data_clamp_date_id', 'clamp_data', 'clamp_date, id'),
+    ('ix_clamp_data_status_date_id', 'clamp_data', 'payment_status, clamp_date, id'),
+    ('ix_clamp_data_location_date_id', 'clamp_data', 'location, clamp_date, id'),
+    ('ix_clamp_data_registration_date_id', 'clamp_data', 'registration, clamp_date, id'),
+    ('ix_clamp_data_created_at', 'clamp_data', 'created_at'),
+    ('ix_appeal_clamp_id', 'appeal', 'clamp_id'),
+]
+
+
+def upgrade(conn):
+    tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for name, table, columns in INDEXES:
+        if table in tables:
+            conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
@@ -0,0 +1,8 @@
+"""Add user.credential_version, the counter carried in session claims so that
+password/role changes and deletions revoke existing sessions."""
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('user')")]
+    if cols and 'credential_version' not in cols:
+        conn.exec_driver_sql('ALTER TABLE user ADD COLUMN credential_version INTEGER NOT NULL DEFAULT 0')
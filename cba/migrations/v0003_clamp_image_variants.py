@@ -0,0 +1,9 @@
+"""Add clamp_data.image_small / image_medium, the resized photo variants.
+Existing photos get them from `flask --app app image-variants`."""
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('clamp_data')")]
+    for col in ('image_small', 'image_medium'):
+        if cols and col not in cols:
+            conn.exec_driver_sql(f'ALTER TABLE clamp_data ADD COLUMN {col} VARCHAR(300)')
@@ -0,0 +1,12 @@
+"""Create photo_blob, the reference counts of content-addressed photo uploads.
+Photos stored before this migration keep their flat paths and are not counted."""
+
+
+def upgrade(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS photo_blob (
+            path VARCHAR(300) NOT NULL PRIMARY KEY,
+            refcount INTEGER NOT NULL,
+            updated_at DATETIME NOT NULL
+        )""")
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_photo_blob_updated_at ON photo_blob (updated_at)')
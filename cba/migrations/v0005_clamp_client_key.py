@@ -0,0 +1,11 @@
+"""Add clamp_data.client_key, the client-generated idempotency key used by the
+offline queue's batch replay, with a unique index (NULLs allowed)."""
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('clamp_data')")]
+    if not cols:
+        return
+    if 'client_key' not in cols:
+        conn.exec_driver_sql('ALTER TABLE clamp_data ADD COLUMN client_key VARCHAR(64)')
+    conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS ix_clamp_data_client_key ON clamp_data (client_key)')
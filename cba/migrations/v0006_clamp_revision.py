@@ -0,0 +1,14 @@
+"""Add clamp_data.revision and updated_at. The revision counts changes to the
+row and keys the rendered-invoice cache; existing rows start at 1."""
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('clamp_data')")]
+    if not cols:
+        return
+    if 'revision' not in cols:
+        conn.exec_driver_sql('ALTER TABLE clamp_data ADD COLUMN revision INTEGER NOT NULL DEFAULT 1')
+    if 'updated_at' not in cols:
+        conn.exec_driver_sql('ALTER TABLE clamp_data ADD COLUMN updated_at DATETIME')
+        if 'created_at' in cols:
+            conn.exec_driver_sql('UPDATE clamp_data SET updated_at = created_at')
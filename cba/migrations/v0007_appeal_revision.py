@@ -0,0 +1,14 @@
+"""Add appeal.revision and updated_at, the row version behind the ETag of a
+clamp's appeal list; existing rows start at 1."""
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('appeal')")]
+    if not cols:
+        return
+    if 'revision' not in cols:
+        conn.exec_driver_sql('ALTER TABLE appeal ADD COLUMN revision INTEGER NOT NULL DEFAULT 1')
+    if 'updated_at' not in cols:
+        conn.exec_driver_sql('ALTER TABLE appeal ADD COLUMN updated_at DATETIME')
+        if 'created_at' in cols:
+            conn.exec_driver_sql('UPDATE appeal SET updated_at = created_at')
@@ -0,0 +1,17 @@
+"""Create the clamp_fts full-text index and its sync triggers (see search.py)
+and fill it from the existing rows."""
+try:
+    from .. import search
+except ImportError:
+    import search
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('clamp_data')")]
+    if not cols or not set(search.COLUMNS) <= set(cols):
+        # nothing to index yet; `flask rebuild-search` installs it later
+        return
+    created = not search.exists(conn)
+    search.install(conn)
+    if created:
+        search.rebuild(conn)
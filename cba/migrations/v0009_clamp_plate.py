@@ -0,0 +1,23 @@
+"""Add clamp_data.plate, the normalized registration, with its index and the
+plate_trgm trigram table (see plates.py), and fill both from existing rows."""
+try:
+    from .. import plates
+except ImportError:
+    import plates
+
+
+def upgrade(conn):
+    cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('clamp_data')")]
+    if not cols or 'registration' not in cols:
+        return
+    if 'plate' not in cols:
+        conn.exec_driver_sql('ALTER TABLE clamp_data ADD COLUMN plate VARCHAR(100)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_clamp_data_plate_date_id ON clamp_data (plate, clamp_date, id)')
+    if plates.exists(conn):
+        plates.backfill(conn, commit=False)
+    else:
+        # fill the column before the triggers exist, then index it in one pass:
+        # several times faster than a trigger firing per backfilled row
+        plates.backfill(conn, commit=False)
+        plates.install(conn)
+        plates.rebuild(conn)
@@ -0,0 +1,13 @@
+"""Create change_log and the triggers that fill it from clamp_data and appeal
+(see changelog.py). Writes from before the upgrade are not logged."""
+try:
+    from .. import changelog
+except ImportError:
+    import changelog
+
+
+def upgrade(conn):
+    tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in changelog.TRACKED:
+        if table in tables:
+            changelog.install(conn, table)
@@ -0,0 +1,128 @@
+"""Normalized registration plates and fuzzy plate lookup.
+
+``clamp_data.registration`` is free text as the officer typed it; ``plate``
+holds the same value reduced to upper-case letters and digits ("ab-12 3" and
+"AB123" are one car), set on every ORM write by app.py and filled in for
+older or bulk-loaded rows by ``backfill``.
+
+Typos that survive normalization ("AB123" entered as "AB128") are found with
+``plate_trgm``, an external-content FTS5 table over ``plate`` using the
+trigram tokenizer and kept in sync by triggers, like search.py's index. A
+lookup reads every row sharing at least one trigram with the query, keeps
+the plates of a close enough length that share enough of them to be within
+the wanted edit distance (the q-gram lemma), and measures the distance
+exactly on the MAX_CANDIDATES distinct plates sharing the most.
+"""
+import re
+
+TABLE = 'plate_trgm'
+MAX_DISTANCE = 2
+MAX_CANDIDATES = 500    # distinct plates measured per lookup
+
+DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(plate, content='clamp_data', content_rowid='id', "
+    f"tokenize='trigram', detail='none')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON clamp_data WHEN new.plate IS NOT NULL BEGIN "
+    f"INSERT INTO {TABLE}(rowid, plate) VALUES (new.id, new.plate); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON clamp_data WHEN old.plate IS NOT NULL BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, plate) VALUES ('delete', old.id, old.plate); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF plate ON clamp_data BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, plate) SELECT 'delete', old.id, old.plate WHERE old.plate IS NOT NULL; "
+    f"INSERT INTO {TABLE}(rowid, plate) SELECT new.id, new.plate WHERE new.plate IS NOT NULL; END",
+)
+
+_NOT_PLATE = re.compile(r'[^0-9A-Z]+')
+
+
+def normalize(text):
+    """Upper-case letters and digits of a typed registration, or None if there are none."""
+    plate = _NOT_PLATE.sub('', (text or '').upper())
+    return plate or None
+
+
+def trigrams(plate):
+    return sorted({plate[i:i + 3] for i in range(len(plate) - 2)})
+
+
+def distance(a, b, limit=MAX_DISTANCE):
+    """Levenshtein distance between a and b, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).first() is not None
+
+
+def install(conn):
+    for statement in DDL:
+        conn.exec_driver_sql(statement)
+
+
+def drop(conn):
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def rebuild(conn):
+    conn.exec_driver_sql(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def backfill(conn, chunk=5000, commit=True):
+    """Set plate on rows that have a registration but no plate yet; return the count.
+
+    Runs in keyset batches of `chunk` ids, committing each unless commit is
+    False (inside a migration's transaction).
+    """
+    last, done = 0, 0
+    while True:
+        rows = conn.exec_driver_sql(
+            'SELECT id, registration FROM clamp_data WHERE id > ? AND plate IS NULL AND registration IS NOT NULL '
+            'ORDER BY id LIMIT ?', (last, chunk)).all()
+        if not rows:
+            return done
+        updates = [(normalize(registration), row_id) for row_id, registration in rows]
+        if any(u[0] for u in updates):
+            conn.exec_driver_sql('UPDATE clamp_data SET plate = ? WHERE id = ?', [u for u in updates if u[0]])
+        if commit:
+            conn.commit()
+        done += sum(1 for u in updates if u[0])
+        last = rows[-1][0]
+
+
+def similar(conn, plate, max_distance=MAX_DISTANCE):
+    """Return [(plate, distance, clamp count)] for recorded plates within max_distance, closest first.
+
+    The exact plate is found through the plate index whatever its trigrams;
+    plates shorter than three characters only match exactly.
+    """
+    found = {}
+    row = conn.exec_driver_sql('SELECT count(*) FROM clamp_data WHERE plate = ?', (plate,)).first()
+    if row[0]:
+        found[plate] = row[0]
+    grams = trigrams(plate)
+    if grams:
+        # q-gram lemma: strings within k edits share at least max(len) - 2 - 3k of
+        # their trigrams counted with repeats; each distinct trigram is counted
+        # once here, which can lose as many as the plate repeats
+        repeats = len(plate) - 2 - len(grams)
+        union = ' UNION ALL '.join(f'SELECT rowid AS id FROM {TABLE} WHERE {TABLE} MATCH ?' for _ in grams)
+        sql = (f'WITH hits AS ({union}), shared AS (SELECT id, count(*) AS n FROM hits GROUP BY id) '
+               f'SELECT c.plate, count(*) FROM clamp_data c JOIN shared s ON s.id = c.id '
+               f'WHERE abs(length(c.plate) - ?) <= ? AND s.n >= max(?, length(c.plate)) - 2 - ? - ? '
+               f'GROUP BY c.plate ORDER BY max(s.n) DESC, abs(length(c.plate) - ?), c.plate LIMIT ?')
+        params = tuple('"%s"' % g.replace('"', '""') for g in grams) + (
+            len(plate), max_distance, len(plate), 3 * max_distance, repeats, len(plate), MAX_CANDIDATES)
+        for candidate, count in conn.exec_driver_sql(sql, params):
+            found.setdefault(candidate, count)
+    matches = [(p, distance(plate, p, max_distance), n) for p, n in found.items()]
+    return sorted((m for m in matches if m[1] <= max_distance), key=lambda m: (m[1], -m[2], m[0]))
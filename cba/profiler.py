@@ -0,0 +1,126 @@
+"""Sampling profiler for single requests.
+
+A ``Sampler`` watches one thread from a helper thread: every ``interval``
+seconds it records the thread's current Python stack. The request runs at
+full speed apart from the GIL hand-overs, so it is safe to turn on for a
+production request, and the samples show where wall time went, waiting on
+SQLite included.
+
+Results are kept as folded stacks ("outer;inner;innermost count" per line),
+the input format of flamegraph.pl and speedscope. ``ProfileStore`` keeps the
+newest profiles as files under a directory shared by the workers, and
+``summary`` turns one into a plain-text table of the busiest functions.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class Sampler:
+    def __init__(self, thread_id=None, interval=0.005, max_depth=64):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = self.elapsed = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the folded stacks."""
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.folded()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break  # the thread has finished
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def summary(folded, top=30):
+    """Table of the functions seen in most samples: total (on the stack) and self (innermost)."""
+    total, own, samples = Counter(), Counter(), 0
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if not stack:
+            continue
+        count = int(count)
+        frames = stack.split(';')
+        samples += count
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    if not samples:
+        return 'No samples: the request finished before the first one.\n'
+    lines = [f'{samples} samples', f"{'total':>7} {'self':>7}  function"]
+    for frame, count in total.most_common(top):
+        lines.append(f'{count / samples:7.1%} {own[frame] / samples:7.1%}  {frame}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProfileStore:
+    """The newest `keep` profiles, as <name>.folded files under root."""
+
+    def __init__(self, root, keep=50):
+        self.root = root
+        self.keep = keep
+
+    def save(self, name, folded):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(folded)
+        os.replace(tmp, self._path(name))
+        for old in self.names()[self.keep:]:
+            try:
+                os.unlink(self._path(old))
+            except FileNotFoundError:
+                pass  # another worker pruned it
+
+    def load(self, name):
+        """The folded stacks saved under name, or None."""
+        try:
+            with open(self._path(name), encoding='utf-8') as fh:
+                return fh.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def names(self):
+        """Saved profile names, newest first (names start with a timestamp)."""
+        try:
+            return sorted((n[:-len('.folded')] for n in os.listdir(self.root) if n.endswith('.folded')), reverse=True)
+        except FileNotFoundError:
+            return []
+
+    def _path(self, name):
+        if not name or not all(c.isalnum() or c in '-_' for c in name):
+            raise ValueError(f'bad profile name {name!r}')
+        return os.path.join(self.root, name + '.folded')
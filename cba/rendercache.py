@@ -0,0 +1,72 @@
+"""On-disk cache of rendered HTML, shared by every worker on the host.
+
+Entries are files under ``root``; a key is a tuple of path components whose
+last element names the file, so related entries (all revisions of one
+record, say) share a directory and can be dropped together. Keys should
+embed whatever version makes an entry stale — entries are never checked for
+freshness, only replaced or removed. Writes go through a temp file and
+os.replace, so readers in other processes see either the old entry or the
+new one, never a partial file.
+
+Hit and miss counts are kept per process (each worker reports its own).
+"""
+import os
+import shutil
+import tempfile
+
+
+class RenderCache:
+    def __init__(self, root):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        parts = [str(p) for p in key]
+        if not parts or any(not p or p in ('.', '..') or os.sep in p for p in parts):
+            raise ValueError(f'bad cache key {key!r}')
+        return os.path.join(self.root, *parts[:-1], parts[-1] + '.html')
+
+    def get(self, key):
+        """Return the cached text for key, or None."""
+        try:
+            with open(self._path(key), encoding='utf-8') as fh:
+                text = fh.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, key, text, exclusive=False):
+        """Store text under key. exclusive=True removes the other entries in its directory."""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                fh.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if exclusive:
+            keep = os.path.basename(path)
+            for name in os.listdir(directory):
+                if name != keep and name.endswith('.html'):
+                    try:
+                        os.unlink(os.path.join(directory, name))
+                    except FileNotFoundError:
+                        pass
+        return text
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None}
+
+    def drop(self, *prefix):
+        """Remove every entry whose key starts with prefix (everything when empty)."""
+        target = os.path.join(self.root, *[str(p) for p in prefix])
+        shutil.rmtree(target, ignore_errors=True)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Measure password verifications ("logins") per second at several hashing costs.
+
+For each method, runs --logins verifications from --clients concurrent
+threads, first inline (every thread hashes on its own, as the request workers
+used to) and then through a HashingPool with --workers processes. Logins the
+pool rejected as busy are counted separately.
+
+Usage: python scripts/bench_hashing.py [--workers 2] [--clients 8] [--logins 32]
+                                       [--method scrypt:16384:8:1 ...]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from hashing import HashingBusy, HashingPool  # noqa: E402
+
+DEFAULT_METHODS = ['scrypt:16384:8:1', 'scrypt:32768:8:1', 'scrypt:65536:8:1', 'pbkdf2:sha256:600000']
+
+
+def run(pool, pwhash, clients, logins):
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            assert pool.verify(pwhash, 'correct horse')
+        except HashingBusy:
+            rejected += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as threads:
+        list(threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return (logins - rejected) / elapsed, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='hashing pool processes')
+    parser.add_argument('--max-pending', type=int, default=16)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent login threads')
+    parser.add_argument('--logins', type=int, default=32, help='logins per measurement')
+    parser.add_argument('--method', action='append', help='hash method (repeatable)')
+    args = parser.parse_args()
+
+    print(f'{"method":<24} {"inline/s":>9} {"pool/s":>9} {"rejected":>9}')
+    for method in args.method or DEFAULT_METHODS:
+        inline = HashingPool(workers=0, max_pending=args.clients, method=method)
+        pool = HashingPool(workers=args.workers, max_pending=args.max_pending, method=method)
+        try:
+            pwhash = inline.hash('correct horse')
+            pool.verify(pwhash, 'correct horse')  # start the worker processes outside the timing
+            inline_rate, _ = run(inline, pwhash, args.clients, args.logins)
+            pool_rate, rejected = run(pool, pwhash, args.clients, args.logins)
+        finally:
+            pool.shutdown()
+        print(f'{method:<24} {inline_rate:>9.1f} {pool_rate:>9.1f} {rejected:>9}')
+
+
+if __name__ == '__main__':
+    main()
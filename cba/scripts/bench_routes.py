@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Time the main routes against seeded databases of several sizes, and compare
+with a saved baseline.
+
+For each --sizes value, a child process seeds a deterministic dataset (clamps,
+one appeal per 20 clamps, a few users; same --seed, same rows) into a temp
+SQLite file, then requests each route through the Flask test client: --repeat
+times, or for at most --max-seconds per route. Each route reports p50/p99
+latency, SQL statements per request (streamed bodies included) and the peak
+Python memory allocated during one request (tracemalloc). Seeded databases are
+kept in --data-dir and reused while the seed and the schema version match;
+every run works on a copy, so writes do not accumulate.
+
+--save writes the results as the new baseline. Otherwise, when the baseline
+file exists, a route counts as a regression when its p50 or peak memory grew by
+more than --threshold (and by more than 2 ms / 64 KB, to ignore noise) or it
+issues more statements; the script then exits with status 1.
+
+Usage: python scripts/bench_routes.py [--sizes 1000 100000 1000000] [--repeat 30]
+                                      [--baseline instance/bench-routes.json] [--save]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+ADMIN = ('bench-admin', 'bench-password')
+START = date(2024, 1, 1)
+DAYS = 730
+LOCATIONS = [f'Loc {i}' for i in range(50)]
+OFFENSES = ['Overstay', 'No permit', 'Disabled bay', 'Double parked']
+STATUSES = ['Paid', 'Processing', 'Not Paid']
+# (name, method, path); {id} is a random existing clamp id per request
+ROUTES = [
+    ('index', 'GET', '/'),
+    ('invoicing', 'GET', '/invoicing?date_from=2025-03-01&date_to=2025-03-31'),
+    ('appeals', 'GET', '/appeals'),
+    ('api_clamp', 'GET', '/api/clamp/{id}'),
+    ('add_clamp', 'POST', '/add-clamp'),
+    ('login', 'POST', '/login'),
+]
+NOISE_MS = 2.0
+NOISE_KB = 64
+
+
+def clamp_records(n, seed):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield i + 1, {
+            'location': rng.choice(LOCATIONS), 'registration': f'{rng.choice("ABCDEFGH")}{rng.randrange(10000):04d}XY',
+            'clamp_date': (START + timedelta(days=rng.randrange(DAYS))).isoformat(),
+            'time_in': f'{rng.randrange(7, 19):02d}:{rng.randrange(60):02d}:00', 'offense': rng.choice(OFFENSES),
+            'payment_status': rng.choice(STATUSES), 'amount_paid': str(rng.choice((0, 25, 50, 75))),
+        }
+
+
+def appeal_records(n_clamps, seed):
+    rng = random.Random(seed + 1)
+    for i in range(n_clamps // 20):
+        yield i + 1, {'clamp_id': str(rng.randrange(1, n_clamps + 1)), 'appeal_reason': 'Signage unclear',
+                      'appeal_status': rng.choice(('Pending', 'Approved', 'Rejected'))}
+
+
+def seed_database(n, seed):
+    """Fill the (empty) app database with the dataset for n clamps."""
+    import dataio
+    import plates
+    from app import (app, db, password_hasher, upgrade_schema, rebuild_clamp_rollup,
+                     Appeal, ClampData, User)
+
+    with app.app_context():
+        upgrade_schema(verbose=False)
+        db.session.add(User(username=ADMIN[0], password_hash=password_hasher.hash(ADMIN[1]), is_admin=True))
+        db.session.add_all(User(username=f'clerk{i}', password_hash='x') for i in range(9))
+        db.session.commit()
+        with db.engine.connect() as conn:
+            dataio.import_records(conn, ClampData.__table__, clamp_records(n, seed))
+            dataio.import_records(conn, Appeal.__table__, appeal_records(n, seed))
+        rebuild_clamp_rollup()
+        with db.engine.connect() as conn:
+            plates.backfill(conn)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        db.engine.dispose()
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure(n, seed, repeat, max_seconds):
+    """Time every route against the app's database (n clamps); return {route: stats}."""
+    from sqlalchemy import event
+    from app import app, db, session_claims, User
+
+    app.config['TESTING'] = True
+    rng = random.Random(seed + 2)
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+        claims = session_claims(User.query.filter_by(username=ADMIN[0]).one())
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(claims)
+
+    def request(method, path):
+        if method == 'GET':
+            resp = client.get(path.format(id=rng.randrange(1, n + 1)))
+        elif path == '/login':
+            # a fresh client, so the benchmark session stays logged in
+            resp = app.test_client().post(path, data={'username': ADMIN[0], 'password': ADMIN[1]})
+        else:
+            resp = client.post(path, data={
+                'location': rng.choice(LOCATIONS), 'registration': f'BENCH{rng.randrange(10000)}',
+                'clamp_date': '2025-06-02', 'time_in': '09:00', 'offense': 'Overstay',
+                'payment_status': 'Processing', 'amount_paid': '25'})
+        resp.get_data()
+        resp.close()
+        if resp.status_code >= 400:
+            raise RuntimeError(f'{method} {path}: HTTP {resp.status_code}')
+
+    results = {}
+    for name, method, path in ROUTES:
+        request(method, path)  # warm caches and compiled statements
+        statements[0] = 0
+        tracemalloc.start()
+        request(method, path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        queries = statements[0]
+        samples = []
+        deadline = time.perf_counter() + max_seconds
+        while len(samples) < repeat and (len(samples) < 3 or time.perf_counter() < deadline):
+            started = time.perf_counter()
+            request(method, path)
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = {'p50_ms': round(_percentile(samples, 50), 3), 'p99_ms': round(_percentile(samples, 99), 3),
+                         'queries': queries, 'peak_kb': round(peak / 1024), 'samples': len(samples)}
+    return results
+
+
+def run_size(args):
+    """Child process: prepare the database for args.size and print its results as JSON."""
+    from migrations import head
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    cached = data_dir / f'bench-{args.size}-seed{args.seed}-v{head():04d}.db'
+    work = Path(tempfile.mkdtemp(prefix='cba-bench-'))
+    os.environ.update({'DATABASE_URL': f'sqlite:///{work / "bench.db"}', 'CBA_STATE_DIR': str(work / 'state'),
+                       'SECRET_KEY': 'bench', 'HASH_POOL_WORKERS': '0', 'SCHEMA_CHECK': 'off'})
+    fresh = not (cached.exists() and Path(f'{cached}.ok').exists())
+    if not fresh:
+        shutil.copyfile(cached, work / 'bench.db')
+    try:
+        if fresh:
+            started = time.perf_counter()
+            seed_database(args.size, args.seed)
+            print(f'seeded {args.size:,} clamps in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+            shutil.copyfile(work / 'bench.db', cached)
+            Path(f'{cached}.ok').touch()
+        results = measure(args.size, args.seed, args.repeat, args.max_seconds)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(json.dumps(results))
+
+
+def compare(results, baseline, threshold):
+    """[(size, route, message)] for every regression against baseline."""
+    regressions = []
+    for size, routes in results.items():
+        for route, now in routes.items():
+            before = baseline.get(size, {}).get(route)
+            if not before:
+                continue
+            if now['p50_ms'] > before['p50_ms'] * (1 + threshold) and now['p50_ms'] - before['p50_ms'] > NOISE_MS:
+                regressions.append((size, route, f"p50 {before['p50_ms']:.1f} -> {now['p50_ms']:.1f} ms"))
+            if now['queries'] > before['queries']:
+                regressions.append((size, route, f"queries {before['queries']} -> {now['queries']}"))
+            if now['peak_kb'] > before['peak_kb'] * (1 + threshold) and now['peak_kb'] - before['peak_kb'] > NOISE_KB:
+                regressions.append((size, route, f"peak {before['peak_kb']} -> {now['peak_kb']} KB"))
+    return regressions
+
+
+def report(results, baseline):
+    print(f"{'rows':>9} {'route':<10} {'p50 ms':>9} {'p99 ms':>9} {'queries':>7} {'peak KB':>8} {'vs base p50':>11}")
+    for size, routes in results.items():
+        for route, r in routes.items():
+            before = baseline.get(size, {}).get(route)
+            delta = f"{(r['p50_ms'] / before['p50_ms'] - 1) * 100:+10.0f}%" if before and before['p50_ms'] else ''
+            print(f"{int(size):>9,} {route:<10} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {r['queries']:7d} "
+                  f"{r['peak_kb']:8d} {delta:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--max-seconds', type=float, default=20.0, help='per route and size (at least 3 samples)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'cba-bench-data'))
+    parser.add_argument('--baseline', default=str(ROOT / 'instance' / 'bench-routes.json'))
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.size is not None:
+        return run_size(args)
+
+    results = {}
+    for size in args.sizes:
+        # one process per size: the app binds its database when imported
+        child = subprocess.run(
+            [sys.executable, __file__, '--size', str(size), '--seed', str(args.seed), '--repeat', str(args.repeat),
+             '--max-seconds', str(args.max_seconds), '--data-dir', args.data_dir],
+            stdout=subprocess.PIPE, text=True, check=True)
+        results[str(size)] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() and not args.save else {}
+    report(results, baseline)
+    if args.save:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Baseline saved to {baseline_path}')
+        return
+    regressions = compare(results, baseline, args.threshold)
+    for size, route, message in regressions:
+        print(f'REGRESSION {int(size):,} rows {route}: {message}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
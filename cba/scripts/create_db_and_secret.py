@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-"""Helper: generate SECRET_KEY (runtime) and run db.create_all().
+"""Helper: generate SECRET_KEY (runtime) and create or upgrade the database schema.
 
 Run: python scripts/create_db_and_secret.py
 
@@ -18,8 +18,8 @@ print('Generated SECRET_KEY:', secret)
 repo_dir = pathlib.Path(__file__).resolve().parents[1]
 os.chdir(str(repo_dir))
 
-from app import app, db
+from app import app, upgrade_schema
 
 with app.app_context():
-    db.create_all()
-    print('db.create_all() completed')
+    upgrade_schema()
+    print('Database schema is up to date')
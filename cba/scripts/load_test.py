@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Drive a local gunicorn instance with concurrent mixed traffic and report per
+endpoint throughput, latency and errors.
+
+Seeds a throwaway database (the bench_routes.py dataset, --rows clamps),
+starts `gunicorn -w --workers cba.app:app` on 127.0.0.1 against it, as
+deploy/gunicorn_https.service does in production, and runs --clients
+concurrent clients for --duration seconds. Each client logs in and then
+picks operations at random by --mix weight:
+
+    login      POST /login
+    dashboard  GET /
+    add_clamp  POST /add-clamp with a --photo-kb photo
+    edit       POST /edit-clamp/<id> for a random clamp
+    appeal     POST /add-appeal for a random clamp
+
+Per endpoint it prints requests/s, p50/p95/p99/max latency, a latency
+histogram and failures: HTTP errors, client timeouts (--timeout) and
+rejected writes. Afterwards it counts the rows the writes should have created,
+and it counts `database is locked` and worker timeouts in the gunicorn log.
+Runs offline: only gunicorn is needed besides the app's own requirements.
+Uploaded photos are removed from static/ at the end.
+
+Usage: python scripts/load_test.py [--workers 4] [--clients 32] [--duration 30]
+                                   [--mix login=1,dashboard=6,add_clamp=2,edit=2,appeal=1]
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bench_routes import ADMIN, LOCATIONS, OFFENSES, seed_database  # noqa: E402
+
+OPERATIONS = ('login', 'dashboard', 'add_clamp', 'edit', 'appeal')
+DEFAULT_MIX = 'login=1,dashboard=6,add_clamp=2,edit=2,appeal=1'
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LOAD_TAG = 'LOAD'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation {name!r}; choose from {", ".join(OPERATIONS)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def noise_png(kb):
+    """A PNG of random pixels, about kb kilobytes. It decodes, so the variant builder
+    does its real work, and no two calls return the same image."""
+    side = max(1, int((kb * 1024 / 3) ** 0.5))
+    raw = b''.join(b'\x00' + os.urandom(side * 3) for _ in range(side))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', side, side, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: image/png\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.failures = {}
+
+    def record(self, op, elapsed_ms, failure=None):
+        with self.lock:
+            if failure:
+                counts = self.failures.setdefault(op, {})
+                counts[failure] = counts.get(failure, 0) + 1
+            else:
+                self.latencies.setdefault(op, []).append(elapsed_ms)
+
+
+class Client:
+    """One browser: a keep-alive connection and the session cookie."""
+
+    def __init__(self, port, timeout, rng, args, stats, n_clamps):
+        self.port, self.timeout, self.rng, self.args, self.stats = port, timeout, rng, args, stats
+        self.n_clamps = n_clamps
+        self.conn = None
+        self.cookie = None
+        self.added = self.appealed = 0
+
+    def send(self, method, path, body=None, content_type=None, accept=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+        headers = {}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        if content_type:
+            headers['Content-Type'] = content_type
+        if accept:
+            headers['Accept'] = accept
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            resp.read()
+        except Exception:
+            # the connection is unusable after a timeout or reset
+            self.conn.close()
+            self.conn = None
+            raise
+        cookie = resp.getheader('Set-Cookie')
+        if cookie and cookie.startswith('session='):
+            self.cookie = cookie.split(';', 1)[0]
+        return resp.status
+
+    def form(self, path, fields, accept=None):
+        return self.send('POST', path, urlencode(fields), 'application/x-www-form-urlencoded', accept)
+
+    def clamp_fields(self):
+        rng = self.rng
+        return {'location': rng.choice(LOCATIONS), 'registration': f'{LOAD_TAG}{rng.randrange(100000)}',
+                'clamp_date': '2025-06-02', 'time_in': f'{rng.randrange(7, 19):02d}:{rng.randrange(60):02d}',
+                'offense': rng.choice(OFFENSES), 'payment_status': 'Processing', 'amount_paid': '25'}
+
+    def run_op(self, op):
+        """Run one operation; return None or the kind of failure."""
+        if op == 'login':
+            status = self.form('/login', {'username': ADMIN[0], 'password': ADMIN[1]})
+            return None if status == 302 else f'HTTP {status}'
+        if op == 'dashboard':
+            status = self.send('GET', '/')
+            return None if status == 200 else f'HTTP {status}'
+        if op == 'add_clamp':
+            photo = ('photo.png', self.rng.choice(self.args.photo_data))
+            body, content_type = multipart(self.clamp_fields(), {'image': photo})
+            # with Accept: json a failed insert answers 400 instead of redirecting with a flash
+            status = self.send('POST', '/add-clamp', body, content_type, accept='application/json')
+            if status == 302:
+                self.added += 1
+                return None
+            return f'HTTP {status}'
+        if op == 'edit':
+            clamp_id = self.rng.randrange(1, self.n_clamps + 1)
+            # JSON on success; a failed save redirects with a flash
+            status = self.form(f'/edit-clamp/{clamp_id}', self.clamp_fields(), accept='application/json')
+            return None if status == 200 else ('rejected' if status == 302 else f'HTTP {status}')
+        if op == 'appeal':
+            clamp_id = self.rng.randrange(1, self.n_clamps + 1)
+            status = self.form('/add-appeal', {'clamp_id': clamp_id, 'appeal_reason': f'{LOAD_TAG} appeal'})
+            if status == 302:
+                self.appealed += 1
+                return None
+            return f'HTTP {status}'
+        raise ValueError(op)
+
+    def run(self, deadline, mix):
+        ops, weights = list(mix), list(mix.values())
+        pending = ['login']
+        while time.monotonic() < deadline:
+            op = pending.pop() if pending else self.rng.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                failure = self.run_op(op)
+            except (socket.timeout, TimeoutError):
+                failure = 'timeout'
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                failure = type(e).__name__
+            self.stats.record(op, (time.perf_counter() - started) * 1000, failure)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(args, env, port, log_path):
+    cmd = [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{port}',
+           '--chdir', str(ROOT.parent), '--error-logfile', str(log_path), '--timeout', str(args.worker_timeout)]
+    if args.threads > 1:
+        cmd += ['-k', 'gthread', '--threads', str(args.threads)]
+    server = subprocess.Popen(cmd + ['cba.app:app'], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'gunicorn exited with status {server.returncode}; see {log_path}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/login')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit('gunicorn did not answer within 30s')
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(stats, elapsed):
+    total = sum(len(v) for v in stats.latencies.values())
+    print(f'\n{total:,} successful requests in {elapsed:.1f}s: {total / elapsed:,.1f}/s')
+    print(f"{'endpoint':<10} {'ok/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  failures")
+    for op in OPERATIONS:
+        samples = sorted(stats.latencies.get(op, []))
+        failures = stats.failures.get(op, {})
+        if not samples and not failures:
+            continue
+        row = (f'{len(samples) / elapsed:8.1f} ' + ' '.join(f'{_percentile(samples, p):8.1f}' for p in (50, 95, 99))
+               + f' {samples[-1]:8.1f}') if samples else f"{0:8.1f} {'-':>8} {'-':>8} {'-':>8} {'-':>8}"
+        print(f'{op:<10} {row}  ' + (', '.join(f'{k}: {v}' for k, v in sorted(failures.items())) or '-'))
+    print('\nlatency histogram (ms, successful requests)')
+    edges = [f'<{b}' for b in BUCKETS_MS] + [f'>={BUCKETS_MS[-1]}']
+    print(f"{'endpoint':<10} " + ' '.join(f'{e:>7}' for e in edges))
+    for op in OPERATIONS:
+        samples = stats.latencies.get(op)
+        if not samples:
+            continue
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for ms in samples:
+            counts[next((i for i, b in enumerate(BUCKETS_MS) if ms < b), len(BUCKETS_MS))] += 1
+        print(f'{op:<10} ' + ' '.join(f'{c:>7}' for c in counts))
+
+
+def reconcile(db_path, clients, n_seeded):
+    """Compare the rows in the database with the writes the server acknowledged."""
+    conn = sqlite3.connect(db_path)
+    try:
+        # seeded clamps have ids 1..n_seeded
+        clamps = conn.execute('SELECT count(*) FROM clamp_data WHERE id > ?', (n_seeded,)).fetchone()[0]
+        appeals = conn.execute('SELECT count(*) FROM appeal WHERE appeal_reason = ?', (f'{LOAD_TAG} appeal',)).fetchone()[0]
+        photos = {row[0] for row in conn.execute(
+            'SELECT image_filename FROM clamp_data WHERE image_filename IS NOT NULL UNION '
+            'SELECT image_small FROM clamp_data WHERE image_small IS NOT NULL UNION '
+            'SELECT image_medium FROM clamp_data WHERE image_medium IS NOT NULL')}
+    finally:
+        conn.close()
+    added = sum(c.added for c in clients)
+    appealed = sum(c.appealed for c in clients)
+    print(f'\nclamps acknowledged {added}, stored {clamps}; appeals acknowledged {appealed}, stored {appeals}')
+    return photos
+
+
+def scan_log(log_path):
+    text = log_path.read_text(errors='replace') if log_path.exists() else ''
+    locked = len(re.findall(r'database is locked', text))
+    timeouts = len(re.findall(r'WORKER TIMEOUT', text))
+    print(f'gunicorn log: {locked} "database is locked", {timeouts} worker timeouts ({log_path})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1, help='>1 runs gthread workers')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--rows', type=int, default=10_000, help='clamps seeded before the run')
+    parser.add_argument('--photo-kb', type=int, default=200)
+    parser.add_argument('--photos', type=int, default=16, help='distinct photos uploaded (they are deduplicated)')
+    parser.add_argument('--timeout', type=float, default=10.0, help='client timeout per request, seconds')
+    parser.add_argument('--worker-timeout', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='keep the temp directory (database, log)')
+    args = parser.parse_args()
+    if importlib.util.find_spec('gunicorn') is None:
+        sys.exit('gunicorn is not installed: pip install gunicorn')
+
+    work = Path(tempfile.mkdtemp(prefix='cba-load-'))
+    db_path = work / 'load.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', CBA_STATE_DIR=str(work / 'state'),
+               SECRET_KEY=uuid.uuid4().hex, SCHEMA_CHECK='strict')
+    # this process creates the schema; the workers refuse to start without it
+    os.environ.update(env, SCHEMA_CHECK='off')
+    print(f'seeding {args.rows:,} clamps in {work}')
+    seed_database(args.rows, args.seed)
+
+    rng = random.Random(args.seed)
+    # random per run, so cleaning up cannot remove a photo stored by anyone else
+    args.photo_data = [noise_png(args.photo_kb) for _ in range(args.photos)]
+    port = _free_port()
+    log_path = work / 'gunicorn.log'
+    server = start_gunicorn(args, env, port, log_path)
+    stats = Stats()
+    clients = [Client(port, args.timeout, random.Random(rng.random()), args, stats, args.rows)
+               for _ in range(args.clients)]
+    print(f'{args.clients} clients, {args.workers} workers x {args.threads} threads, {args.duration:.0f}s, '
+          f'mix {json.dumps(args.mix)}')
+    started = time.monotonic()
+    threads = [threading.Thread(target=c.run, args=(started + args.duration, args.mix)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    server.terminate()
+    server.wait(timeout=30)
+
+    report(stats, elapsed)
+    photos = reconcile(db_path, clients, args.rows)
+    scan_log(log_path)
+    static = ROOT / 'static'
+    for rel in photos:
+        path = static / rel
+        path.unlink(missing_ok=True)
+        # and the shard directories this left empty
+        for parent in path.parents:
+            if parent == static or any(parent.iterdir()):
+                break
+            parent.rmdir()
+    if args.keep:
+        print(f'kept {work}')
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Full-text search over clamp records with an SQLite FTS5 index.
+
+``clamp_fts`` is an external-content FTS5 table over the text columns of
+``clamp_data``: it stores only the index, reading column values back from
+clamp_data by rowid, and is kept in step by triggers, so every writer (the
+ORM, Core bulk inserts, the sqlite3 shell) updates it. ``install`` is hooked
+to clamp_data's create/drop events in app.py and run by a migration for
+existing databases; ``rebuild`` regenerates the index from the table.
+
+Queries are built from the user's words, each matched as a prefix and all
+required (``mai st`` finds "Main Street"). Only the newest CANDIDATES matches
+are read, straight off the index in rowid order, and ranked here by which
+columns matched and whether a word matched whole. FTS5's bm25 is not used:
+it counts every row containing each term to weigh it, and for a common word
+at a million rows that pass alone costs tens of milliseconds.
+"""
+import html
+import re
+
+TABLE = 'clamp_fts'
+COLUMNS = ('location', 'registration', 'offense', 'clamp_ref', 'car_type', 'color')
+CANDIDATES = 200    # newest matches considered for ranking
+# a hit in a column counts this much; a whole-word hit counts double
+WEIGHTS = {'registration': 8, 'clamp_ref': 6, 'location': 3, 'car_type': 2, 'color': 1, 'offense': 1}
+MAX_TERMS = 8
+
+_cols = ', '.join(COLUMNS)
+_new = ', '.join(f'new.{c}' for c in COLUMNS)
+_old = ', '.join(f'old.{c}' for c in COLUMNS)
+
+# FTS5 answers a prefix query from a prefix index of exactly that length as
+# cheaply as a whole word; without one it first merges the row lists of every
+# matching term, which for a common word ("toyota") is most of the table. The
+# indexes for lengths 1-8 roughly double the index size (about 270 MB at a
+# million rows) and keep as-you-type queries under a millisecond or two.
+DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5({_cols}, content='clamp_data', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6 7 8')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON clamp_data BEGIN "
+    f"INSERT INTO {TABLE}(rowid, {_cols}) VALUES (new.id, {_new}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON clamp_data BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, {_cols}) VALUES ('delete', old.id, {_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF {_cols} ON clamp_data BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, {_cols}) VALUES ('delete', old.id, {_old}); "
+    f"INSERT INTO {TABLE}(rowid, {_cols}) VALUES (new.id, {_new}); END",
+)
+
+# control characters do not occur in clamp text, so they serve as markers
+# to put around matches before the value is HTML-escaped
+_OPEN, _CLOSE = '\x02', '\x03'
+_WORD = re.compile(r'\w+', re.UNICODE)
+_SPAN = re.compile(_OPEN + '(.*?)' + _CLOSE)
+
+
+def exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).first() is not None
+
+
+def install(conn):
+    """Create the FTS table and its triggers if missing."""
+    for statement in DDL:
+        conn.exec_driver_sql(statement)
+
+
+def drop(conn):
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def rebuild(conn):
+    """Regenerate the whole index from clamp_data."""
+    conn.exec_driver_sql(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query of quoted prefix terms, or None if it has no words."""
+    terms = _WORD.findall(text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join('"%s"*' % t.replace('"', '""') for t in terms)
+
+
+def _marked(value):
+    return html.escape(value or '').replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def search(conn, text, limit=20, candidates=CANDIDATES):
+    """Return [(id, score, {column: highlighted html})] best first.
+
+    Only columns containing a match appear in the highlight dict; their
+    values are HTML-escaped with matches wrapped in <mark>. Equal scores
+    keep the newer record first.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    words = {w.lower() for w in _WORD.findall(text)}
+    highlights = ', '.join(f"highlight({TABLE}, {i}, ?, ?)" for i in range(len(COLUMNS)))
+    sql = f'SELECT rowid, {highlights} FROM {TABLE} WHERE {TABLE} MATCH ? ORDER BY rowid DESC LIMIT ?'
+    params = (_OPEN, _CLOSE) * len(COLUMNS) + (expression, candidates)
+    results = []
+    for row in conn.exec_driver_sql(sql, params):
+        score, marked = 0, {}
+        for column, value in zip(COLUMNS, row[1:]):
+            if not value or _OPEN not in value:
+                continue
+            spans = _SPAN.findall(value)
+            whole = any(span.lower() in words for span in spans)
+            score += WEIGHTS[column] * (2 if whole else 1)
+            marked[column] = _marked(value)
+        results.append((row[0], score, marked))
+    # stable sort: rows arrive newest first
+    results.sort(key=lambda r: -r[1])
+    return results[:limit]
@@ -0,0 +1,95 @@
+"""SQLite engine profile for running under several gunicorn workers.
+
+Every worker process holds its own connection pool against the same database
+file. With SQLite's defaults (rollback journal, no busy timeout) a writer
+locks out readers and a second writer fails at once with "database is
+locked". The profile below is applied to each new DB-API connection:
+
+- journal_mode=WAL: readers no longer block on the writer, and vice versa
+- busy_timeout: a writer waits for the write lock instead of failing
+- synchronous=NORMAL: fsync at checkpoints rather than every commit; safe
+  against corruption in WAL mode, a power cut may lose the last commits
+- mmap_size / cache_size: serve hot pages from memory
+- foreign_keys=ON: enforce the appeal -> clamp_data reference
+
+Values can be overridden with SQLITE_PRAGMAS, e.g.
+``SQLITE_PRAGMAS="synchronous=FULL,mmap_size=0"``.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,          # ms
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -16000,          # negative = KiB, i.e. 16 MB per connection
+    'foreign_keys': 'ON',
+}
+# journal_mode and mmap_size make no sense for a private in-memory database
+_FILE_ONLY = ('journal_mode', 'mmap_size')
+
+
+def parse_pragmas(spec, base=None):
+    """Overlay 'name=value,name=value' onto base (DEFAULT_PRAGMAS by default)."""
+    pragmas = dict(DEFAULT_PRAGMAS if base is None else base)
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = item.partition('=')
+        pragmas[name.strip().lower()] = value.strip()
+    return pragmas
+
+
+def _in_memory(database):
+    return not database or database == ':memory:' or database.startswith('file::memory:')
+
+
+def engine_options(url, pool_size=5, max_overflow=5, pool_timeout=10, busy_timeout_ms=5000):
+    """SQLAlchemy create_engine() options for one worker process.
+
+    A sync gunicorn worker uses one connection at a time, so a small pool is
+    plenty; threaded workers need about one connection per thread. The
+    driver-level timeout mirrors busy_timeout for statements issued before
+    the connect pragmas have run. In-memory and non-SQLite URLs keep
+    SQLAlchemy's own pool choice.
+    """
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or _in_memory(url.database):
+        return {}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'connect_args': {'timeout': busy_timeout_ms / 1000.0},
+    }
+
+
+def install(engine, pragmas=None):
+    """Apply the pragma profile to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+    in_memory = _in_memory(engine.url.database)
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas.items()
+                  if not (in_memory and name in _FILE_ONLY)]
+
+    @event.listens_for(engine, 'connect')
+    def _apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def begin(connection):
+    """Open the database transaction of a SQLAlchemy Connection now, if it is not open.
+
+    The sqlite3 driver only sends BEGIN before a write, so a SAVEPOINT issued
+    first (Session.begin_nested) starts the transaction itself, and releasing
+    it commits. Call this before the first savepoint so that savepoints nest
+    inside the session's transaction.
+    """
+    dbapi_connection = connection.connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
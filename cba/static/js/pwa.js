@@ -1,10 +1,69 @@
 // Register service worker
 if ('serviceWorker' in navigator) {
-  navigator.serviceWorker.register('/static/service-worker.js').then(reg => {
+  navigator.serviceWorker.register('/service-worker.js').then(reg => {
     console.log('Service worker registered.', reg);
   }).catch(err => console.warn('SW registration failed:', err));
 }
 
+// Offline clamp queue (see service-worker.js). Forms with a client_key field get
+// a fresh idempotency key per page load, so a resubmitted or replayed entry is
+// recorded once.
+(function setupClampQueue(){
+  function newClientKey() {
+    if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+  document.querySelectorAll('input[name="client_key"]').forEach(input => {
+    if (!input.value) input.value = newClientKey();
+  });
+
+  function showNotice(text) {
+    const note = document.createElement('div');
+    note.className = 'alert alert-success';
+    note.textContent = text;
+    const container = document.querySelector('.page-container') || document.body;
+    container.insertBefore(note, container.firstChild);
+  }
+  if (new URLSearchParams(window.location.search).has('queued')) {
+    showNotice('No connection: the clamp was saved on this device and will upload automatically.');
+  }
+
+  if (!('serviceWorker' in navigator)) return;
+  // browsers without Background Sync replay the queue when the page is (back) online
+  function requestFlush() {
+    if (navigator.onLine && navigator.serviceWorker.controller) {
+      navigator.serviceWorker.controller.postMessage({type: 'flush-clamp-queue'});
+    }
+  }
+  window.addEventListener('online', requestFlush);
+  navigator.serviceWorker.ready.then(requestFlush);
+  navigator.serviceWorker.addEventListener('message', ev => {
+    if (ev.data && ev.data.type === 'clamp-queue-flushed' && ev.data.created) {
+      showNotice(`${ev.data.created} clamp(s) saved offline have been uploaded.`);
+    }
+  });
+})();
+
+// Offline replica of clamps and appeals (see service-worker.js): synced when a
+// page opens, when the connection returns and when the dashboard's live feed
+// reports changes.
+(function setupReplicaSync(){
+  if (!('serviceWorker' in navigator)) return;
+  let timer = null;
+  function requestSync() {
+    clearTimeout(timer);
+    // a burst of feed events makes one sync
+    timer = setTimeout(() => {
+      if (navigator.onLine && navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage({type: 'sync-replica'});
+      }
+    }, 500);
+  }
+  window.addEventListener('online', requestSync);
+  window.addEventListener('cba:changes', requestSync);
+  navigator.serviceWorker.ready.then(requestSync);
+})();
+
 // Simple multi-display helper: try Presentation API then fallback to window.open + postMessage
 window.PresentationHelper = (function(){
   let presentationWindow = null;
@@ -0,0 +1,293 @@
+// Rendered by the /service-worker.js route: the cache version and precache list
+// come from the static asset manifest (assets.py), so a deploy that changes
+// any asset installs a new cache and drops the old one.
+const CACHE_NAME = 'clamping-admin-{{ version }}';
+const ASSETS_TO_CACHE = {{ precache|tojson }};
+// fingerprinted assets never change under the same URL
+const IMMUTABLE_PREFIX = '{{ immutable_prefix }}';
+// Per-record JSON carries an ETag from the row version. The worker keeps the
+// last copy of each and revalidates it: an unchanged record costs a 304 with
+// no body, and the stored copy also answers while offline.
+const API_CACHE = CACHE_NAME + '-api';
+const REVALIDATED = [/^\/api\/clamp\/\d+$/, /^\/clamp\/\d+\/appeals$/];
+
+// Offline write queue: add-clamp submissions that cannot reach the server are
+// kept in IndexedDB and replayed in one request to /api/clamps/batch when the
+// connection returns (Background Sync, or a message from the page where that
+// API is missing). Each record carries the form's client_key, so a replay the
+// server already saw is reported as a duplicate instead of inserted again.
+const QUEUE_DB = 'clamp-queue';
+const QUEUE_STORE = 'clamps';
+const SYNC_TAG = 'clamp-queue';
+const BATCH_URL = '{{ batch_url }}';
+const BATCH_MAX = {{ batch_max }};
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(QUEUE_DB, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore(QUEUE_STORE, {keyPath: 'client_key'});
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+// run fn(store) in one transaction; resolves with fn's request result once committed
+function queueTx(mode, fn) {
+  return openQueue().then(db => new Promise((resolve, reject) => {
+    const tx = db.transaction(QUEUE_STORE, mode);
+    const req = fn(tx.objectStore(QUEUE_STORE));
+    tx.oncomplete = () => { db.close(); resolve(req ? req.result : undefined); };
+    tx.onerror = tx.onabort = () => { db.close(); reject(tx.error); };
+  }));
+}
+
+function newClientKey() {
+  if (self.crypto && self.crypto.randomUUID) return self.crypto.randomUUID();
+  return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+function queueClamp(formData) {
+  const fields = {};
+  let photo = null;
+  for (const [name, value] of formData.entries()) {
+    if (value instanceof File) {
+      if (value.size) photo = value;
+    } else {
+      fields[name] = value;
+    }
+  }
+  const record = {client_key: fields.client_key || newClientKey(), fields, photo, queued_at: Date.now()};
+  return queueTx('readwrite', store => store.put(record)).then(() => {
+    if (self.registration.sync) {
+      return self.registration.sync.register(SYNC_TAG).catch(() => {});
+    }
+  });
+}
+
+async function sendBatch(records) {
+  const body = new FormData();
+  body.append('records', JSON.stringify(records.map((r, n) =>
+    Object.assign({}, r.fields, {client_key: r.client_key}, r.photo ? {photo: 'photo_' + n} : {}))));
+  records.forEach((r, n) => {
+    if (r.photo) body.append('photo_' + n, r.photo, r.photo.name || 'photo.jpg');
+  });
+  const res = await fetch(BATCH_URL, {method: 'POST', body, credentials: 'same-origin',
+                                      headers: {'Accept': 'application/json'}});
+  // a login redirect or server error leaves the queue as it is for the next attempt
+  if (!res.ok || !(res.headers.get('Content-Type') || '').includes('application/json')) {
+    throw new Error('Batch upload failed: ' + res.status);
+  }
+  const data = await res.json();
+  // created, duplicate and invalid records are all settled; drop them from the queue
+  await queueTx('readwrite', store => {
+    data.results.forEach(r => store.delete(r.client_key));
+  });
+  return data.created;
+}
+
+let flushing = null;
+
+function flushQueue() {
+  if (!flushing) {
+    flushing = (async () => {
+      const records = await queueTx('readonly', store => store.getAll());
+      let created = 0;
+      for (let i = 0; i < records.length; i += BATCH_MAX) {
+        created += await sendBatch(records.slice(i, i + BATCH_MAX));
+      }
+      if (records.length) {
+        const clients = await self.clients.matchAll({type: 'window'});
+        clients.forEach(c => c.postMessage({type: 'clamp-queue-flushed', created}));
+      }
+    })().finally(() => { flushing = null; });
+  }
+  return flushing;
+}
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(flushQueue());
+  }
+});
+
+self.addEventListener('message', (event) => {
+  if (event.data && event.data.type === 'flush-clamp-queue') {
+    event.waitUntil(flushQueue().catch(err => console.warn('Clamp queue not flushed:', err)));
+  }
+  if (event.data && event.data.type === 'sync-replica') {
+    event.waitUntil(syncReplica().catch(err => console.warn('Replica not synced:', err)));
+  }
+});
+
+// Local replica of every clamp and appeal, kept in IndexedDB and brought up to
+// date from /api/changes: the first sync copies everything, later ones fetch
+// only rows changed since the stored cursor (deleted rows come as ids). Each
+// response is applied in one transaction together with its cursor, so an
+// interrupted sync resumes where it stopped. While offline, plain clamp
+// listings are answered from the replica.
+const REPLICA_DB = 'replica';
+const REPLICA_TYPES = ['clamp', 'appeal'];
+const CHANGES_URL = '{{ changes_url }}';
+const LOGOUT_URL = '{{ logout_url }}';
+const CLAMPS_URL = '{{ clamps_url }}';
+const PAGE_SIZE = {{ page_size }};
+const PAGE_MAX = {{ page_max }};
+
+function openReplica() {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(REPLICA_DB, 1);
+    req.onupgradeneeded = () => {
+      REPLICA_TYPES.forEach(type => req.result.createObjectStore(type, {keyPath: 'id'}));
+      req.result.createObjectStore('meta');
+    };
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+// run fn(tx) over the replica stores; resolves with fn's request result once committed
+function replicaTx(mode, fn) {
+  return openReplica().then(db => new Promise((resolve, reject) => {
+    const tx = db.transaction(REPLICA_TYPES.concat('meta'), mode);
+    const req = fn(tx);
+    tx.oncomplete = () => { db.close(); resolve(req ? req.result : undefined); };
+    tx.onerror = tx.onabort = () => { db.close(); reject(tx.error); };
+  }));
+}
+
+let syncing = null;
+
+function syncReplica() {
+  if (!syncing) {
+    syncing = (async () => {
+      let more = true;
+      while (more) {
+        const cursor = await replicaTx('readonly', tx => tx.objectStore('meta').get('cursor'));
+        const url = CHANGES_URL + (cursor ? '?since=' + encodeURIComponent(cursor) : '');
+        const res = await fetch(url, {credentials: 'same-origin', cache: 'no-store',
+                                      headers: {'Accept': 'application/json'}});
+        // signed out (login redirect) or server error: try again on the next trigger
+        if (!res.ok || !(res.headers.get('Content-Type') || '').includes('application/json')) {
+          throw new Error('Replica sync failed: ' + res.status);
+        }
+        const data = await res.json();
+        await replicaTx('readwrite', tx => {
+          REPLICA_TYPES.forEach(type => {
+            const store = tx.objectStore(type);
+            if (data.reset) store.clear();
+            data[type].put.forEach(row => store.put(row));
+            data[type].delete.forEach(id => store.delete(id));
+          });
+          tx.objectStore('meta').put(data.cursor, 'cursor');
+        });
+        more = data.more;
+      }
+    })().finally(() => { syncing = null; });
+  }
+  return syncing;
+}
+
+function clearReplica() {
+  return replicaTx('readwrite', tx => {
+    REPLICA_TYPES.forEach(type => tx.objectStore(type).clear());
+    tx.objectStore('meta').delete('cursor');
+  });
+}
+
+// /api/clamps from the replica, for the unfiltered (or status-only) first page
+async function replicaClamps(url) {
+  const status = url.searchParams.get('status');
+  const all = await replicaTx('readonly', tx => tx.objectStore('clamp').getAll());
+  const items = all
+    .filter(c => !status || c.payment_status === status)
+    .sort((a, b) => (b.clamp_date || '').localeCompare(a.clamp_date || '') || b.id - a.id)
+    .slice(0, Math.min(Number(url.searchParams.get('limit')) || PAGE_SIZE, PAGE_MAX));
+  return new Response(JSON.stringify({items, next_cursor: null, offline: true}),
+                      {headers: {'Content-Type': 'application/json'}});
+}
+
+function fromReplica(url) {
+  return url.pathname === CLAMPS_URL && [...url.searchParams.keys()].every(k => k === 'status' || k === 'limit');
+}
+
+async function revalidate(req) {
+  const cache = await caches.open(API_CACHE);
+  const cached = await cache.match(req);
+  const headers = new Headers(req.headers);
+  if (cached && cached.headers.get('ETag')) {
+    headers.set('If-None-Match', cached.headers.get('ETag'));
+  }
+  let res;
+  try {
+    // no-store: the conditional request is ours, not the HTTP cache's
+    res = await fetch(req.url, {headers, credentials: 'same-origin', cache: 'no-store'});
+  } catch (err) {
+    if (cached) return cached;
+    throw err;
+  }
+  if (res.status === 304 && cached) return cached;
+  if (res.ok && res.headers.get('ETag')) {
+    await cache.put(req, res.clone());
+  } else if (res.status === 404) {
+    await cache.delete(req);
+  }
+  return res;
+}
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(CACHE_NAME).then(cache => cache.addAll(ASSETS_TO_CACHE))
+  );
+  self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys().then(keys => Promise.all(
+      keys.filter(k => k !== CACHE_NAME && k !== API_CACHE).map(k => caches.delete(k))
+    ))
+  );
+  self.clients.claim();
+});
+
+self.addEventListener('fetch', (event) => {
+  const req = event.request;
+  const url = new URL(req.url);
+  if (req.method === 'POST' && url.origin === self.location.origin && url.pathname === '{{ add_clamp_url }}') {
+    // keep a copy of the body: if the network is unreachable, queue the clamp
+    const copy = req.clone();
+    event.respondWith(fetch(req).catch(() => copy.formData()
+      .then(queueClamp)
+      .then(() => Response.redirect(new URL('/?queued=1', self.location.origin).href, 303))));
+    return;
+  }
+  if (req.method === 'GET' && url.origin === self.location.origin && url.pathname === LOGOUT_URL) {
+    // the next user of this device must not see the previous one's data
+    event.waitUntil(clearReplica().catch(() => {}));
+  }
+  // the live change feed is a long-lived stream: leave it to the browser
+  if (req.method !== 'GET' || url.pathname === '{{ events_url }}') {
+    return;
+  }
+  if (url.origin === self.location.origin && url.pathname.startsWith(IMMUTABLE_PREFIX)) {
+    // cache-first without revalidation: a hit never touches the network
+    event.respondWith(caches.match(req).then(hit => hit || fetch(req).then(res => {
+      if (res.ok) {
+        const copy = res.clone();
+        caches.open(CACHE_NAME).then(cache => cache.put(req, copy));
+      }
+      return res;
+    })));
+    return;
+  }
+  if (url.origin === self.location.origin && REVALIDATED.some(re => re.test(url.pathname))) {
+    event.respondWith(revalidate(req));
+    return;
+  }
+  if (url.origin === self.location.origin && fromReplica(url)) {
+    event.respondWith(fetch(req).catch(() => replicaClamps(url)));
+    return;
+  }
+  // pages, API calls and unversioned files: network first, cache when offline
+  event.respondWith(fetch(req).catch(() => caches.match(req)));
+});
@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+from datetime import date, time
+
+import pytest
+
+# Point the app at a throwaway database before it is imported anywhere, so the
+# test run never touches instance/clamping_business.db.
+_tmpdir = tempfile.mkdtemp(prefix='cba-tests-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_tmpdir, 'test.db'))
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('CBA_STATE_DIR', os.path.join(_tmpdir, 'state'))
+os.environ.setdefault('HASH_POOL_WORKERS', '0')
+# the fixtures below build the schema; skip the start-up version check
+os.environ.setdefault('SCHEMA_CHECK', 'off')
+
+# Ensure test project root is on sys.path so `import app` works when pytest runs
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def app_ctx():
+    from app import app, db, migrations, _auth_epoch, invoice_cache, fragment_cache
+    app.config['TESTING'] = True
+    # a fresh database invalidates every cached credential version and rendering
+    _auth_epoch.bump()
+    invoice_cache.drop()
+    fragment_cache.drop()
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE IF EXISTS schema_version')
+        db.create_all()
+        migrations.apply_migrations(db.engine, verbose=False)
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app_ctx):
+    return app_ctx.test_client()
+
+
+# cheap hashes keep the tests fast; the production default is scrypt
+FAST_HASH = 'pbkdf2:sha256:1000'
+CLAMP_DEFAULTS = dict(location='Main St', registration='ABC123', clamp_date=date(2025, 6, 2), time_in=time(9, 0),
+                      offense='Overstay', payment_status='Paid', amount_paid=40.0)
+
+
+@pytest.fixture
+def make_user(app_ctx):
+    """make_user(username, password=None, is_admin=False) stores a user; without a password it cannot log in."""
+    from werkzeug.security import generate_password_hash
+    from app import db, User
+
+    def make_user(username, password=None, is_admin=False):
+        pwhash = generate_password_hash(password, FAST_HASH) if password else 'x'
+        user = User(username=username, password_hash=pwhash, is_admin=is_admin)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def login(make_user):
+    """login(client, is_admin=True) stores an admin ('boss') or clerk and signs client in as them."""
+    from app import session_claims
+
+    def login(client, is_admin=True):
+        user = make_user('boss' if is_admin else 'clerk', is_admin=is_admin)
+        with client.session_transaction() as sess:
+            sess.update(session_claims(user))
+        return user
+    return login
+
+
+@pytest.fixture
+def make_clamp(app_ctx):
+    """make_clamp(**fields) stores a clamp; fields override CLAMP_DEFAULTS."""
+    from app import db, ClampData
+
+    def make_clamp(**fields):
+        clamp = ClampData(**{**CLAMP_DEFAULTS, **fields})
+        db.session.add(clamp)
+        db.session.commit()
+        return clamp
+    return make_clamp
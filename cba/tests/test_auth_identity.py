@@ -0,0 +1,77 @@
+from sqlalchemy import event
+
+from app import app, db
+
+
+def _sign_in(username, password='secret'):
+    """A new client logged in through the login form."""
+    client = app.test_client()
+    resp = client.post('/login', data={'username': username, 'password': password})
+    assert resp.status_code == 302
+    return client
+
+
+def _user_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM user' in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        resp = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return resp, statements
+
+
+def test_admin_pages_need_no_user_queries_once_warm(app_ctx, make_user):
+    make_user('boss', 'secret', is_admin=True)
+    client = _sign_in('boss')
+    client.get('/appeals')
+    db.session.remove()
+    resp, statements = _user_queries(client, '/appeals')
+    assert resp.status_code == 200
+    assert statements == []
+
+
+def test_non_admin_is_denied_by_session_role(app_ctx, make_user):
+    make_user('clerk', 'secret')
+    client = _sign_in('clerk')
+    assert client.get('/appeals').status_code == 403
+
+
+def test_password_change_revokes_other_sessions(app_ctx, make_user):
+    make_user('boss', 'secret', is_admin=True)
+    laptop, phone = _sign_in('boss'), _sign_in('boss')
+    assert phone.get('/users').status_code == 200
+
+    resp = laptop.post('/change-password', data={'current_password': 'secret', 'new_password': 'n3w',
+                                                 'confirm_password': 'n3w'})
+    assert resp.headers['Location'].endswith('/')
+
+    assert laptop.get('/users').status_code == 200
+    resp = phone.get('/users')
+    assert resp.status_code == 302 and '/login' in resp.headers['Location']
+
+
+def test_deleted_user_is_logged_out(app_ctx, make_user):
+    make_user('boss', 'secret', is_admin=True)
+    clerk = make_user('clerk', 'secret')
+    boss, clerk_client = _sign_in('boss'), _sign_in('clerk')
+    assert clerk_client.get('/change-password').status_code == 200
+
+    boss.get(f'/users/delete/{clerk.id}')
+    resp = clerk_client.get('/change-password')
+    assert resp.status_code == 302 and '/login' in resp.headers['Location']
+
+
+def test_legacy_session_is_upgraded_with_claims(app_ctx, make_user):
+    boss = make_user('boss', 'secret', is_admin=True)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = boss.id
+    assert client.get('/users').status_code == 200
+    with client.session_transaction() as sess:
+        assert sess['role'] == 'admin' and sess['cred_v'] == 0
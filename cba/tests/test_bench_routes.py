@@ -0,0 +1,31 @@
+"""Smoke test for scripts/bench_routes.py: a tiny run completes, and a saved
+baseline turns a slower or chattier route into a failing exit status."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[1] / 'scripts' / 'bench_routes.py'
+
+
+def _bench(tmp_path, *args):
+    return subprocess.run([sys.executable, str(SCRIPT), '--sizes', '200', '--repeat', '3', '--data-dir', str(tmp_path),
+                           '--baseline', str(tmp_path / 'baseline.json'), *args],
+                          capture_output=True, text=True, timeout=300)
+
+
+def test_bench_saves_and_compares_with_a_baseline(tmp_path):
+    saved = _bench(tmp_path, '--save')
+    assert saved.returncode == 0, saved.stderr
+    baseline = json.loads((tmp_path / 'baseline.json').read_text())
+    routes = baseline['200']
+    assert set(routes) == {'index', 'invoicing', 'appeals', 'api_clamp', 'add_clamp', 'login'}
+    assert all(r['queries'] >= 1 and r['p99_ms'] >= r['p50_ms'] > 0 for r in routes.values())
+
+    # the seeded database is reused; a route issuing more statements than before is reported
+    routes['api_clamp'].update(p50_ms=0.001, queries=0)
+    (tmp_path / 'baseline.json').write_text(json.dumps(baseline))
+    rerun = _bench(tmp_path)
+    assert 'seeded' not in rerun.stderr
+    assert rerun.returncode == 1
+    assert 'REGRESSION 200 rows api_clamp: queries 0 -> 1' in rerun.stdout
@@ -0,0 +1,156 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import app, db, ClampData, Appeal, change_batch, changelog
+
+
+@pytest.fixture
+def short_streams(app_ctx):
+    # one poll per stream, so a test can read a response to the end
+    saved = app.config['CHANGE_STREAM_SECONDS']
+    app.config['CHANGE_STREAM_SECONDS'] = 0
+    yield
+    app.config['CHANGE_STREAM_SECONDS'] = saved
+
+
+def _log():
+    return [tuple(row[1:]) for row in changelog.read(db.session.connection(), 0, 100)]
+
+
+def _events(client, **headers):
+    resp = client.get('/api/events?since=0' if not headers else '/api/events', headers=headers)
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/event-stream'
+    body = resp.get_data(as_text=True)
+    resp.close()
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if fields.get('event') == 'changes':
+            events.append((int(fields['id']), json.loads(fields['data'])))
+    return events
+
+
+def test_triggers_log_every_write(app_ctx, make_clamp):
+    clamp = make_clamp()
+    appeal = Appeal(clamp_id=clamp.id, appeal_reason='Signage unclear')
+    db.session.add(appeal)
+    db.session.commit()
+    clamp.payment_status = 'Paid'
+    db.session.commit()
+    clamp_id, appeal_id = clamp.id, appeal.id
+    db.session.delete(appeal)
+    db.session.commit()
+    # writes around the ORM are logged too
+    db.session.execute(ClampData.__table__.delete())
+    db.session.commit()
+    assert _log() == [('clamp_data', clamp_id, 'insert'), ('appeal', appeal_id, 'insert'),
+                      ('clamp_data', clamp_id, 'update'), ('appeal', appeal_id, 'delete'),
+                      ('clamp_data', clamp_id, 'delete')]
+
+
+def test_batch_sends_each_row_once_with_its_current_state(app_ctx, make_clamp):
+    kept = make_clamp(location='Harbour Rd')
+    gone = make_clamp()
+    kept_id, gone_id = kept.id, gone.id
+    kept.location = 'Quay St'
+    db.session.commit()
+    db.session.delete(gone)
+    db.session.commit()
+    cursor, changes = change_batch(0)
+    assert cursor == changelog.head(db.session.connection())
+    assert changes == [
+        {'type': 'clamp', 'id': kept_id, 'op': 'put', 'row': changes[0]['row']},
+        {'type': 'clamp', 'id': gone_id, 'op': 'delete'},
+    ]
+    assert changes[0]['row']['location'] == 'Quay St'
+    assert change_batch(cursor) == (cursor, [])
+
+
+def test_event_stream_resumes_from_last_event_id(client, short_streams, login, make_clamp):
+    login(client, is_admin=False)
+    first_id = make_clamp(location='Harbour Rd').id
+    [(seq, data)] = _events(client)
+    assert data['cursor'] == seq
+    assert [(c['id'], c['row']['location']) for c in data['changes']] == [(first_id, 'Harbour Rd')]
+
+    second_id = make_clamp(location='Dock Lane').id
+    [(_, data)] = _events(client, **{'Last-Event-ID': str(seq)})
+    assert [c['id'] for c in data['changes']] == [second_id]
+
+
+def test_new_stream_starts_at_the_head(client, short_streams, login, make_clamp):
+    login(client, is_admin=False)
+    make_clamp()
+    resp = client.get('/api/events')
+    assert 'event: changes' not in resp.get_data(as_text=True)
+    resp.close()
+
+
+def test_event_stream_requires_login(client):
+    assert client.get('/api/events').status_code == 302
+
+
+def _sync(client, cursor=None):
+    resp = client.get('/api/changes' + (f'?since={cursor}' if cursor else ''))
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def _replica(client, store, cursor=None):
+    """Apply /api/changes responses to store like the service worker does; return the cursor."""
+    while True:
+        data = _sync(client, cursor)
+        for kind in ('clamp', 'appeal'):
+            if data['reset']:
+                store[kind] = {}
+            store[kind].update({row['id']: row for row in data[kind]['put']})
+            for row_id in data[kind]['delete']:
+                store[kind].pop(row_id, None)
+        cursor = data['cursor']
+        if not data['more']:
+            return cursor
+
+
+def test_sync_copies_everything_then_only_changes(client, monkeypatch, login, make_clamp):
+    monkeypatch.setattr(app_module, 'SYNC_SNAPSHOT_ROWS', 2)
+    login(client, is_admin=False)
+    ids = [make_clamp(location=f'Loc {i}').id for i in range(5)]
+    db.session.add(Appeal(clamp_id=ids[0], appeal_reason='Signage unclear'))
+    db.session.commit()
+
+    store = {}
+    cursor = _replica(client, store)
+    assert sorted(store['clamp']) == ids and len(store['appeal']) == 1
+
+    db.session.get(ClampData, ids[1]).location = 'Quay St'
+    db.session.delete(db.session.get(ClampData, ids[4]))
+    db.session.commit()
+    delta = _sync(client, cursor)
+    assert not delta['reset'] and not delta['more']
+    assert [row['id'] for row in delta['clamp']['put']] == [ids[1]]
+    assert delta['clamp']['delete'] == [ids[4]]
+    _replica(client, store, cursor)
+    assert store['clamp'][ids[1]]['location'] == 'Quay St' and ids[4] not in store['clamp']
+
+
+def test_sync_starts_over_when_the_cursor_was_pruned(client, login, make_clamp):
+    login(client, is_admin=False)
+    make_clamp()
+    cursor = _replica(client, {})
+    make_clamp()
+    db.session.execute(db.text("UPDATE change_log SET at = '2000-01-01 00:00:00'"))
+    db.session.commit()
+    with db.engine.begin() as conn:
+        assert changelog.prune(conn, datetime.utcnow() - timedelta(days=30)) == 2
+    data = _sync(client, cursor)
+    assert data['reset'] and len(data['clamp']['put']) == 2
+
+
+def test_sync_rejects_bad_cursors(client, login):
+    login(client, is_admin=False)
+    assert client.get('/api/changes?since=bogus').status_code == 400
+    assert client.get('/api/changes?since=WyJ4Il0').status_code == 400
@@ -0,0 +1,122 @@
+import re
+from datetime import date, time, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db, ClampData
+
+
+@pytest.fixture
+def client(client, login):
+    """The API is read as a logged-in clerk."""
+    login(client, is_admin=False)
+    return client
+
+
+def _seed(n, start=date(2025, 1, 1)):
+    rows = []
+    for i in range(n):
+        rows.append(ClampData(
+            location='Main St' if i % 2 else 'Harbour Rd',
+            registration=f'REG{i:03d}',
+            # two clamps per day so the id tiebreaker matters
+            clamp_date=start + timedelta(days=i // 2),
+            time_in=time(9, 0),
+            offense='No permit',
+            payment_status='Paid' if i % 3 == 0 else 'Processing',
+            amount_paid=10.0,
+        ))
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def _walk(client, query):
+    seen, cursor = [], None
+    while True:
+        url = f'/api/clamps?{query}' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        seen.extend(item['id'] for item in data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return seen
+
+
+def test_keyset_pages_cover_every_row_once(client):
+    rows = _seed(25)
+    ids = _walk(client, 'limit=7')
+    assert sorted(ids) == sorted(r.id for r in rows)
+    assert len(ids) == len(set(ids))
+
+    expected = [r.id for r in sorted(rows, key=lambda r: (r.clamp_date, r.id), reverse=True)]
+    assert ids == expected
+
+
+def test_ascending_order_and_filters(client):
+    rows = _seed(20)
+    ids = _walk(client, 'limit=4&order=asc&status=Paid&location=Harbour%20Rd')
+    expected = [r.id for r in sorted(rows, key=lambda r: (r.clamp_date, r.id))
+                if r.payment_status == 'Paid' and r.location == 'Harbour Rd']
+    assert ids == expected
+
+    data = client.get('/api/clamps?date_from=2025-01-02&date_to=2025-01-03').get_json()
+    assert {item['clamp_date'] for item in data['items']} == {'2025-01-02', '2025-01-03'}
+    assert data['next_cursor'] is None
+
+
+def test_listing_requires_login(client):
+    _seed(1)
+    resp = app.test_client().get('/api/clamps')
+    assert resp.status_code == 302 and '/login' in resp.headers['Location']
+
+
+def test_bad_arguments_are_rejected(client):
+    assert client.get('/api/clamps?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/clamps?date_from=yesterday').status_code == 400
+    assert client.get('/api/clamps?sort=offense').status_code == 400
+
+
+def test_index_renders_first_page_only(client):
+    _seed(60)
+    body = client.get('/').get_data(as_text=True)
+    assert len(re.findall(r'<tr id="row-\d+"', body)) == 50
+    # the button is visible and carries the cursor of the second page
+    assert re.search(r'id="clamp-rows-more" class="btn" data-cursor="[^"]+">', body)
+
+
+def _statements(client, url):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        resp = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return resp, seen
+
+
+def test_fields_limit_the_payload_and_the_columns_read(client):
+    clamp_id = _seed(1)[0].id
+    resp, statements = _statements(client, f'/api/clamp/{clamp_id}?fields=registration,thumb_url')
+    assert resp.get_json() == {'registration': 'REG000', 'thumb_url': None}
+    assert 'offense' not in statements[-1] and 'image_small' in statements[-1]
+    # each projection has its own validator
+    assert resp.headers['ETag'] != client.get(f'/api/clamp/{clamp_id}').headers['ETag']
+    assert list(client.get('/api/clamps?fields=id,plate').get_json()['items'][0]) == ['id', 'plate']
+    assert 'unknown fields: nope' in client.get('/api/clamps?fields=id,nope').get_json()['error']
+
+
+def test_ids_fetch_many_clamps_in_one_query(client):
+    ids = [r.id for r in _seed(5)]
+    wanted = [ids[3], ids[0], 999999, ids[3]]
+    resp, statements = _statements(client, '/api/clamps?fields=id,location&ids=' + ','.join(map(str, wanted)))
+    assert len([s for s in statements if 'FROM clamp_data' in s]) == 1
+    data = resp.get_json()
+    assert [item['id'] for item in data['items']] == [ids[3], ids[0]]
+    assert data['missing'] == [999999]
+    assert client.get('/api/clamps?ids=1,x').status_code == 400
+    too_many = ','.join(str(i) for i in range(1, 202))
+    assert client.get(f'/api/clamps?ids={too_many}').status_code == 400
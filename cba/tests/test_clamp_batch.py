@@ -0,0 +1,110 @@
+import io
+import json
+import os
+
+from app import app, db, ClampData, ClampDailyRollup
+
+RECORD = {'location': 'Main St', 'clamp_date': '2025-03-01', 'time_in': '09:00', 'offense': 'Overstay',
+          'payment_status': 'Paid', 'amount_paid': '20'}
+
+
+def _batch(client, records, files=None):
+    data = {'records': json.dumps(records), **(files or {})}
+    return client.post('/api/clamps/batch', data=data, content_type='multipart/form-data')
+
+
+def test_batch_inserts_in_one_transaction_and_skips_replays(client, login):
+    login(client)
+    records = [{**RECORD, 'client_key': f'k{i}', 'registration': f'REG{i}'} for i in range(5)]
+    resp = _batch(client, records)
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['created'] == 5
+    assert [r['status'] for r in body['results']] == ['created'] * 5
+    assert ClampData.query.count() == 5
+    assert db.session.query(ClampDailyRollup.clamp_count).scalar() == 5
+
+    # the phone lost the response and replays the queue with one new entry
+    replay = _batch(client, records + [{**RECORD, 'client_key': 'k5'}]).get_json()
+    assert replay['created'] == 1
+    assert [r['status'] for r in replay['results']] == ['duplicate'] * 5 + ['created']
+    assert replay['results'][0]['id'] == body['results'][0]['id']
+    assert ClampData.query.count() == 6
+
+
+def test_batch_reports_invalid_records_and_keeps_the_rest(client, login):
+    login(client)
+    resp = _batch(client, [
+        {**RECORD, 'client_key': 'ok'},
+        {**RECORD, 'client_key': 'bad-date', 'clamp_date': '01/03/2025'},
+        {**RECORD},
+        {**RECORD, 'client_key': 'ok'},
+    ])
+    statuses = [r['status'] for r in resp.get_json()['results']]
+    assert statuses == ['created', 'invalid', 'invalid', 'duplicate']
+    assert ClampData.query.count() == 1
+
+
+def test_batch_rejects_records_missing_required_fields_or_with_a_bad_photo(client, login):
+    login(client)
+    resp = _batch(client, [
+        {**RECORD, 'client_key': 'no-location', 'location': None},
+        {**RECORD, 'client_key': 'no-offense', 'offense': ''},
+        {**RECORD, 'client_key': 'list-photo', 'photo': ['photo_0']},
+        {**RECORD, 'client_key': 'ok', 'registration': 'GOOD1'},
+    ])
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['status'] for r in results] == ['invalid', 'invalid', 'invalid', 'created']
+    assert 'location' in results[0]['error'] and 'offense' in results[1]['error']
+    assert [c.client_key for c in ClampData.query.all()] == ['ok']
+
+
+def test_batch_record_rejected_by_the_database_keeps_the_rest(client, login):
+    login(client)
+    db.session.execute(db.text(
+        "CREATE TRIGGER reject_bad BEFORE INSERT ON clamp_data WHEN NEW.registration = 'BAD' "
+        "BEGIN SELECT RAISE(ABORT, 'rejected'); END"))
+    db.session.commit()
+    resp = _batch(client, [
+        {**RECORD, 'client_key': 'a', 'registration': 'A1'},
+        {**RECORD, 'client_key': 'b', 'registration': 'BAD'},
+        {**RECORD, 'client_key': 'c', 'registration': 'C1'},
+    ])
+    assert resp.status_code == 200
+    assert [r['status'] for r in resp.get_json()['results']] == ['created', 'invalid', 'created']
+    db.session.rollback()
+    assert sorted(c.client_key for c in ClampData.query.all()) == ['a', 'c']
+
+
+def test_batch_stores_photos(client, login):
+    login(client)
+    resp = _batch(client, [{**RECORD, 'client_key': 'p1', 'photo': 'photo_0'}],
+                  {'photo_0': (io.BytesIO(b'queued-photo-bytes'), 'car.jpg')})
+    assert resp.status_code == 200
+    clamp = ClampData.query.one()
+    path = os.path.join(app.root_path, 'static', clamp.image_filename)
+    try:
+        assert clamp.client_key == 'p1'
+        assert open(path, 'rb').read() == b'queued-photo-bytes'
+    finally:
+        os.remove(path)
+
+
+def test_batch_requires_login_and_a_list(client, login):
+    assert _batch(client, []).status_code == 302
+    login(client)
+    assert _batch(client, {'not': 'a list'}).status_code == 400
+
+
+def test_add_clamp_form_resubmit_is_recorded_once(client):
+    form = {**RECORD, 'client_key': 'form-1'}
+    client.post('/add-clamp', data=form)
+    client.post('/add-clamp', data=form)
+    assert ClampData.query.count() == 1
+
+
+def test_service_worker_queues_add_clamp_posts(client):
+    body = client.get('/service-worker.js').get_data(as_text=True)
+    assert "url.pathname === '/add-clamp'" in body
+    assert "const BATCH_URL = '/api/clamps/batch';" in body
@@ -0,0 +1,76 @@
+from datetime import date, time
+
+from app import db, ClampData, Appeal
+
+
+def _seed():
+    clamp = ClampData(location='Main St', registration='ABC123', clamp_date=date(2025, 6, 2), time_in=time(9, 0),
+                      offense='Overstay', payment_status='Paid', amount_paid=40.0)
+    db.session.add(clamp)
+    db.session.flush()
+    db.session.add(Appeal(clamp_id=clamp.id, appeal_reason='Signage unclear'))
+    db.session.commit()
+    return clamp
+
+
+def test_clamp_json_is_revalidated_by_etag(client):
+    clamp = _seed()
+    first = client.get(f'/api/clamp/{clamp.id}')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert first.headers['Last-Modified']
+
+    again = client.get(f'/api/clamp/{clamp.id}', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b'' and again.headers['ETag'] == etag
+
+    clamp.amount_paid = 55.0
+    db.session.commit()
+    changed = client.get(f'/api/clamp/{clamp.id}', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['amount_paid'] == 55.0 and changed.headers['ETag'] != etag
+
+
+def test_if_modified_since_is_honoured(client):
+    clamp = _seed()
+    last_modified = client.get(f'/api/clamp/{clamp.id}').headers['Last-Modified']
+    assert client.get(f'/api/clamp/{clamp.id}', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_appeal_list_etag_tracks_edits_adds_and_deletes(client):
+    clamp = _seed()
+    url = f'/clamp/{clamp.id}/appeals'
+    etags = [client.get(url).headers['ETag']]
+
+    appeal = Appeal.query.one()
+    appeal.notes = 'called the office'
+    db.session.commit()
+    assert appeal.revision == 2
+    etags.append(client.get(url).headers['ETag'])
+
+    db.session.add(Appeal(clamp_id=clamp.id, appeal_reason='Wrong plate'))
+    db.session.commit()
+    etags.append(client.get(url).headers['ETag'])
+
+    db.session.delete(appeal)
+    db.session.commit()
+    resp = client.get(url, headers={'If-None-Match': etags[-1]})
+    assert resp.status_code == 200 and len(resp.get_json()['appeals']) == 1
+    etags.append(resp.headers['ETag'])
+    assert len(set(etags)) == 4
+
+    assert client.get(url, headers={'If-None-Match': etags[-1]}).status_code == 304
+
+
+def test_appeals_of_missing_clamp_is_404(client):
+    assert client.get('/clamp/999/appeals').status_code == 404
+    clamp = ClampData(location='Main St', clamp_date=date(2025, 6, 2), time_in=time(9, 0), offense='Overstay')
+    db.session.add(clamp)
+    db.session.commit()
+    assert client.get(f'/clamp/{clamp.id}/appeals').get_json() == {'clamp_id': clamp.id, 'appeals': []}
+
+
+def test_service_worker_revalidates_record_json(client):
+    body = client.get('/service-worker.js').get_data(as_text=True)
+    assert "headers.set('If-None-Match'" in body
+    assert 'res.status === 304 && cached' in body
@@ -0,0 +1,157 @@
+import io
+import json
+from datetime import date, time, timedelta
+
+import pytest
+
+import dataio
+import plates
+from app import app, db, ClampData, Appeal, ClampDailyRollup, import_table, rebuild_clamp_rollup, revenue_summary
+
+N = 2500
+
+
+def _seed():
+    db.session.execute(ClampData.__table__.insert(), [
+        {'location': f'Loc {i % 3}', 'registration': f'REG{i}', 'clamp_date': date(2025, 1, 1) + timedelta(days=i % 90),
+         'time_in': time(9, i % 60), 'offense': 'Overstay, "double" parked', 'payment_status': 'Paid' if i % 2 else 'Processing',
+         'amount_paid': 5.5, 'car_type': None} for i in range(N)])
+    db.session.execute(Appeal.__table__.insert(), [
+        {'clamp_id': i + 1, 'appeal_date': date(2025, 2, 1), 'appeal_reason': 'Signage\nunclear'} for i in range(0, N, 10)])
+    db.session.commit()
+    rebuild_clamp_rollup()
+    with db.engine.connect() as conn:
+        plates.backfill(conn)
+
+
+def _rows(table):
+    return [tuple(r) for r in db.session.execute(db.select(table).order_by(table.c.id))]
+
+
+def test_export_streams_in_chunks(client, login):
+    _seed()
+    login(client)
+    resp = client.get('/export/clamps.csv')
+    assert resp.status_code == 200 and resp.is_streamed
+    assert resp.headers['Content-Disposition'] == 'attachment; filename=clamps.csv'
+    chunks = list(resp.response)
+    assert len(chunks) == -(-N // dataio.EXPORT_CHUNK)
+    assert b''.join(chunks).count(b'\n') > N
+
+    lines = client.get('/export/appeals.ndjson').get_data(as_text=True).splitlines()
+    assert json.loads(lines[0])['appeal_reason'] == 'Signage\nunclear'
+    assert client.get('/export/users.csv').status_code == 404
+
+
+def test_round_trip_restores_rows_and_rollup(client, login):
+    _seed()
+    login(client)
+    clamps_before, appeals_before = _rows(ClampData.__table__), _rows(Appeal.__table__)
+    paid_before = revenue_summary(date_from=date(2025, 1, 1), date_to=date(2025, 12, 31))
+    exported = {(name, fmt): client.get(f'/export/{name}.{fmt}').get_data(as_text=True)
+                for name in ('clamps', 'appeals') for fmt in dataio.FORMATS}
+
+    for fmt in dataio.FORMATS:
+        db.session.execute(Appeal.__table__.delete())
+        db.session.execute(ClampData.__table__.delete())
+        db.session.execute(ClampDailyRollup.__table__.delete())
+        db.session.commit()
+        assert import_table('clamps', io.StringIO(exported['clamps', fmt]), fmt) == (N, [])
+        assert import_table('appeals', io.StringIO(exported['appeals', fmt]), fmt) == (len(appeals_before), [])
+        db.session.expire_all()
+        assert _rows(Appeal.__table__) == appeals_before
+        after = _rows(ClampData.__table__)
+        if fmt == 'ndjson':
+            assert after == clamps_before
+        else:
+            # CSV has no NULL: '' and NULL both come back as NULL
+            assert [tuple('' if v is None else v for v in r) for r in after] == \
+                   [tuple('' if v is None else v for v in r) for r in clamps_before]
+        assert revenue_summary(date_from=date(2025, 1, 1), date_to=date(2025, 12, 31)) == paid_before
+
+
+def test_import_skips_and_reports_invalid_rows(app_ctx):
+    clamps = io.StringIO(
+        'location,clamp_date,time_in,offense,payment_status,amount_paid\n'
+        'Main St,2025-03-01,09:00,Overstay,Paid,10\n'
+        'Main St,01/03/2025,09:00,Overstay,Paid,10\n'
+        ',2025-03-01,09:00,Overstay,Paid,10\n'
+        'Main St,2025-03-02,09:30,Overstay,,\n')
+    inserted, errors = import_table('clamps', clamps, 'csv')
+    assert inserted == 2
+    assert [lineno for lineno, _ in errors] == [3, 4]
+    assert ClampData.query.filter_by(clamp_date=date(2025, 3, 2)).one().payment_status == 'Processing'
+
+    appeals = io.StringIO('{"clamp_id": 1, "appeal_reason": "ok"}\n{"clamp_id": 999, "appeal_reason": "orphan"}\n')
+    inserted, errors = import_table('appeals', appeals, 'ndjson')
+    assert inserted == 1 and errors == [(2, 'clamp_id=999 does not exist')]
+
+
+def test_import_skips_rows_that_collide_with_stored_or_earlier_rows(app_ctx):
+    first = io.StringIO('id,location,clamp_date,time_in,offense,client_key\n'
+                        '1,Main St,2025-03-01,09:00,Overstay,k1\n')
+    assert import_table('clamps', first, 'csv') == (1, [])
+
+    # a re-run of a partly applied file, plus rows clashing with each other
+    again = io.StringIO('id,location,clamp_date,time_in,offense,client_key\n'
+                        '1,Main St,2025-03-01,09:00,Overstay,k1\n'
+                        '2,Main St,2025-03-02,09:00,Overstay,k1\n'
+                        '3,Quay St,2025-03-03,09:00,Overstay,k3\n'
+                        '3,Quay St,2025-03-03,09:00,Overstay,k4\n'
+                        '4,Dock Lane,2025-03-04,09:00,Overstay,\n')
+    inserted, errors = import_table('clamps', again, 'csv')
+    assert inserted == 2
+    assert errors == [(2, 'id=1 already exists'), (3, 'client_key=k1 already exists'), (5, 'id=3 repeats line 4')]
+    assert [c.id for c in ClampData.query.order_by(ClampData.id)] == [1, 3, 4]
+    assert db.session.query(ClampDailyRollup.clamp_count).filter_by(day=date(2025, 3, 4)).scalar() == 1
+
+
+def test_import_rolls_back_a_chunk_the_database_rejects(app_ctx):
+    db.session.execute(db.text(
+        "CREATE TRIGGER reject_bad BEFORE INSERT ON clamp_data WHEN NEW.location = 'Bad' "
+        "BEGIN SELECT RAISE(ABORT, 'rejected'); END"))
+    db.session.commit()
+    records = [(i + 2, {'location': 'Bad' if i == 3 else 'Main St', 'clamp_date': '2025-03-01',
+                        'time_in': '09:00', 'offense': 'Overstay'}) for i in range(6)]
+    with db.engine.connect() as conn:
+        inserted, errors = dataio.import_records(conn, ClampData.__table__, records, chunk=3)
+    assert inserted == 3
+    assert [lineno for lineno, _ in errors] == [5, 6, 7]
+    assert 'rejected' in errors[0][1]
+    assert ClampData.query.count() == 3
+
+
+def test_import_reports_unreadable_ndjson_lines(app_ctx):
+    lines = io.StringIO('{"location": "Main St", "clamp_date": "2025-03-01", "time_in": "09:00", "offense": "Overstay"}\n'
+                        '{"location": "Main St", \n'
+                        '[1, 2]\n'
+                        '"x"\n'
+                        '{"location": "Quay St", "clamp_date": "2025-03-02", "time_in": "09:00", "offense": "Overstay"}\n')
+    inserted, errors = import_table('clamps', lines, 'ndjson')
+    assert inserted == 2
+    assert [lineno for lineno, _ in errors] == [2, 3, 4]
+    assert errors[0][1].startswith('not valid JSON') and errors[1][1] == 'expected a JSON object, got list'
+
+
+def test_aborted_import_still_rebuilds_the_rollup(app_ctx):
+    good = '{"location": "Main St", "clamp_date": "2025-03-01", "time_in": "09:00", "offense": "Overstay"}\n'
+    lines = io.StringIO(good * 3 + '[]\n' * (dataio.MAX_ERRORS + 1))
+    with pytest.raises(dataio.ImportErrorLimit):
+        import_table('clamps', lines, 'ndjson')
+    assert ClampData.query.count() == 3
+    assert db.session.query(ClampDailyRollup.clamp_count).scalar() == 3
+
+
+def test_cli_export_and_import(app_ctx, tmp_path):
+    _seed()
+    runner = app.test_cli_runner()
+    out = tmp_path / 'clamps.ndjson'
+    assert runner.invoke(args=['export-data', 'clamps', '-o', str(out)]).exit_code == 0
+    assert len(out.read_text().splitlines()) == N
+
+    db.session.execute(Appeal.__table__.delete())
+    db.session.execute(ClampData.__table__.delete())
+    db.session.commit()
+    result = runner.invoke(args=['import-data', 'clamps', str(out)])
+    assert result.exit_code == 0, result.output
+    assert f'Imported {N} clamps' in result.output
@@ -0,0 +1,80 @@
+import io
+import os
+
+from app import db, ClampData, User, _clamp_generation, fragment_cache, import_table
+
+
+def _dashboard(client):
+    db.session.remove()
+    resp = client.get('/')
+    assert resp.status_code == 200
+    return resp.get_data(as_text=True), int(resp.headers['X-Query-Count'])
+
+
+def test_generation_moves_on_committed_clamp_writes_only(app_ctx, make_clamp):
+    before = _clamp_generation.current()
+    clamp = make_clamp()
+    assert _clamp_generation.current() == before + 1
+    clamp.color = 'Blue'
+    db.session.rollback()
+    assert _clamp_generation.current() == before + 1
+    db.session.add(User(username='someone', password_hash='x'))
+    db.session.commit()
+    assert _clamp_generation.current() == before + 1
+    ClampData.query.filter_by(id=clamp.id).update({'color': 'Red'})
+    db.session.commit()
+    assert _clamp_generation.current() == before + 2
+
+
+def test_cached_dashboard_skips_clamp_queries(client, login, make_clamp):
+    login(client)
+    make_clamp(location='Harbour Rd')
+    body, misses = _dashboard(client)
+    assert 'Harbour Rd' in body
+    hits_before = fragment_cache.hits
+    cached, queries = _dashboard(client)
+    assert cached == body
+    assert fragment_cache.hits == hits_before + 3
+    # only the admin tab's user list is still read
+    assert queries == 1 < misses
+
+
+def test_write_invalidates_cached_sections(client, login, make_clamp):
+    login(client)
+    clamp_id = make_clamp(location='Harbour Rd').id
+    _dashboard(client)
+    db.session.get(ClampData, clamp_id).location = 'Quay St'
+    db.session.commit()
+    body, _ = _dashboard(client)
+    assert 'Quay St' in body and 'Harbour Rd' not in body
+    # the superseded entries were replaced, not kept alongside
+    assert len(os.listdir(os.path.join(fragment_cache.root, 'clamp_rows', 'admin'))) == 1
+
+
+def test_bulk_import_bumps_generation(client, login):
+    login(client)
+    _dashboard(client)
+    import_table('clamps', io.StringIO('location,clamp_date,time_in,offense,payment_status\n'
+                                       'Dock Lane,2025-06-03,10:00:00,Overstay,Paid\n'), 'csv')
+    body, _ = _dashboard(client)
+    assert 'Dock Lane' in body
+
+
+def test_sections_are_cached_per_role(client, login, make_clamp):
+    login(client, is_admin=False)
+    make_clamp()
+    body, _ = _dashboard(client)
+    assert 'class="btn btn-view" onclick="editPaidRow(1)"' in body
+    assert 'confirmDeleteClamp(1)' not in body and 'id="paid-rows"' not in body
+    login(client)
+    body, _ = _dashboard(client)
+    assert 'confirmDeleteClamp(1)' in body and 'id="paid-rows"' in body
+
+
+def test_cache_stats_endpoint(client, login):
+    login(client)
+    _dashboard(client)
+    stats = client.get('/api/cache-stats').get_json()
+    assert stats['clamp_generation'] == _clamp_generation.current()
+    assert stats['fragments']['misses'] >= 3
+    assert set(stats['invoices']) == {'hits', 'misses', 'hit_ratio'}
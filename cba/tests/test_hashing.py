@@ -0,0 +1,67 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import db, User, password_hasher
+from hashing import HashingBusy, HashingPool, normalize_method
+
+
+def test_normalize_method_spells_out_defaults():
+    assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+    assert normalize_method('scrypt:16384') == 'scrypt:16384:8:1'
+    assert normalize_method('pbkdf2:sha256:1000') == 'pbkdf2:sha256:1000'
+
+
+def test_saturated_pool_rejects_immediately():
+    pool = HashingPool(workers=0, max_pending=1, method='pbkdf2:sha256:1000')
+    pool._slots.acquire()
+    with pytest.raises(HashingBusy):
+        pool.hash('secret')
+    pool._slots.release()
+    assert pool.verify(pool.hash('secret'), 'secret')
+
+
+def test_process_pool_hashes_and_verifies():
+    pool = HashingPool(workers=1, method='pbkdf2:sha256:1000')
+    try:
+        pwhash = pool.hash('secret')
+        assert pwhash.startswith('pbkdf2:sha256:1000$')
+        assert pool.verify(pwhash, 'secret') and not pool.verify(pwhash, 'wrong')
+    finally:
+        pool.shutdown()
+
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes():
+    pool = HashingPool(workers=1, max_pending=1, method='pbkdf2:sha256:3000000', timeout=0.01)
+    try:
+        with pytest.raises(HashingBusy):
+            pool.hash('slow')
+        # the hash is still running in the pool, so it still counts
+        assert not pool._slots.acquire(blocking=False)
+    finally:
+        pool.shutdown()
+    assert pool._slots.acquire(blocking=False)
+
+
+def test_login_rehashes_when_cost_changes(client, monkeypatch):
+    monkeypatch.setattr(password_hasher, 'method', 'pbkdf2:sha256:2000')
+    user = User(username='clerk', password_hash=generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+    db.session.add(user)
+    db.session.commit()
+
+    resp = client.post('/login', data={'username': 'clerk', 'password': 'secret'})
+    assert resp.status_code == 302
+    db.session.refresh(user)
+    assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+    assert user.credential_version == 0
+
+
+def test_busy_pool_answers_503(client, monkeypatch):
+    user = User(username='clerk', password_hash=generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+    db.session.add(user)
+    db.session.commit()
+    monkeypatch.setattr(password_hasher, '_slots', HashingPool(max_pending=1)._slots)
+    password_hasher._slots.acquire()
+
+    resp = client.post('/login', data={'username': 'clerk', 'password': 'secret'})
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After']
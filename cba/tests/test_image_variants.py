@@ -0,0 +1,66 @@
+import io
+import os
+
+import pytest
+
+import images
+from app import app, ClampData
+
+STATIC = os.path.join(app.root_path, 'static')
+
+
+def test_upload_records_variants_built_after_commit(client, monkeypatch, login):
+    login(client)
+    built = []
+
+    def fake_variants(static_root, image_filename):
+        built.append(image_filename)
+        return {v: images.variant_path(image_filename, v) for v in images.VARIANTS}
+    monkeypatch.setattr(images, 'make_variants', fake_variants)
+
+    resp = client.post('/add-clamp', data={
+        'location': 'Main St', 'clamp_date': '2025-03-01', 'time_in': '09:00', 'offense': 'Overstay',
+        'payment_status': 'Processing', 'image': (io.BytesIO(b'jpeg-bytes'), 'car.jpg'),
+    }, content_type='multipart/form-data')
+    assert resp.status_code == 302
+
+    clamp = ClampData.query.one()
+    try:
+        assert built == [clamp.image_filename]
+        assert clamp.image_small == images.variant_path(clamp.image_filename, 'small')
+        assert clamp.image_medium.endswith('.medium.jpg')
+    finally:
+        os.remove(os.path.join(STATIC, clamp.image_filename))
+
+
+def test_lists_serve_lazy_thumbnails_with_original_fallback(client, login, make_clamp):
+    login(client)
+    make_clamp(image_filename='images/uploads/x.jpg', image_small='images/uploads/x.small.jpg')
+    make_clamp(image_filename='images/uploads/y.jpg')
+
+    body = client.get('/').get_data(as_text=True)
+    assert 'src="/static/images/uploads/x.small.jpg" data-full="/static/images/uploads/x.jpg" loading="lazy"' in body
+    # no variant yet: the original is the thumbnail
+    assert 'src="/static/images/uploads/y.jpg" data-full="/static/images/uploads/y.jpg"' in body
+
+    items = client.get('/api/clamps?order=asc').get_json()['items']
+    assert [i['thumb_url'] for i in items] == ['/static/images/uploads/x.small.jpg', '/static/images/uploads/y.jpg']
+
+
+def test_variants_without_pillow_fall_back(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, 'Image', None)
+    (tmp_path / 'a.jpg').write_bytes(b'jpeg-bytes')
+    assert images.make_variants(str(tmp_path), 'a.jpg') == {}
+
+
+def test_variants_are_resized_and_stripped(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'  # Make
+    Image.new('RGB', (2000, 1500), 'red').save(tmp_path / 'a.jpg', exif=exif)
+
+    made = images.make_variants(str(tmp_path), 'a.jpg')
+    assert set(made) == set(images.VARIANTS)
+    with Image.open(tmp_path / made['small']) as small:
+        assert max(small.size) == images.VARIANTS['small']
+        assert not small.getexif()
@@ -0,0 +1,71 @@
+from datetime import date
+
+from app import db, CLAMP_IDS_MAX, invoice_cache
+
+
+def test_revision_bumps_on_edit_only(app_ctx, make_clamp):
+    clamp = make_clamp()
+    assert clamp.revision == 1
+    clamp.amount_paid = 45.0
+    db.session.commit()
+    assert clamp.revision == 2
+    db.session.commit()
+    assert clamp.revision == 2
+
+
+def test_invoice_cache_is_keyed_by_revision(client, login, make_clamp):
+    login(client)
+    clamp = make_clamp()
+    first = client.get(f'/presentation/invoice/{clamp.id}').get_data(as_text=True)
+    assert '40.00 USD' in first
+    assert invoice_cache.get((0, clamp.id, 1)) is not None
+
+    client.post(f'/edit-clamp/{clamp.id}', data={'location': 'Main St', 'clamp_date': '2025-06-02', 'time_in': '09:00',
+                                                 'offense': 'Overstay', 'payment_status': 'Paid', 'amount_paid': '55'})
+    db.session.expire_all()
+    assert clamp.revision == 2
+    assert '55.00 USD' in client.get(f'/presentation/invoice/{clamp.id}').get_data(as_text=True)
+    # the old revision's entry was replaced, not kept alongside
+    assert invoice_cache.get((0, clamp.id, 1)) is None
+
+
+def test_batch_print_renders_misses_once_and_serves_hits_from_cache(client, login, make_clamp):
+    login(client)
+    ids = [make_clamp(registration=f'R{i}', amount_paid=10.0 + i).id for i in range(5)]
+    url = '/presentation/invoices?ids=' + ','.join(map(str, ids))
+    resp = client.get(url)
+    assert resp.is_streamed
+    body = resp.get_data(as_text=True)
+    assert body.count('PAID INVOICE') == 5 and '14.00 USD' in body
+
+    # a second pass is served from the cache: tamper with one entry to prove it
+    invoice_cache.put((0, ids[0], 1), '<p>cached copy</p>')
+    assert 'cached copy' in client.get(url).get_data(as_text=True)
+
+
+def test_batch_print_caps_the_number_of_ids(client, login):
+    login(client)
+    ids = ','.join(str(i) for i in range(1, CLAMP_IDS_MAX + 2))
+    resp = client.get('/presentation/invoices?ids=' + ids)
+    assert resp.status_code == 400
+    assert str(CLAMP_IDS_MAX) in resp.get_json()['error']
+
+
+def test_batch_print_by_period(client, login, make_clamp):
+    login(client)
+    make_clamp(clamp_date=date(2025, 6, 2))
+    make_clamp(clamp_date=date(2025, 7, 2), registration='JULY')
+    make_clamp(clamp_date=date(2025, 6, 3), payment_status='Not Paid', registration='UNPAID')
+    body = client.get('/presentation/invoices?date_from=2025-06-01&date_to=2025-06-30').get_data(as_text=True)
+    assert body.count('PAID INVOICE') == 1 and 'JULY' not in body and 'UNPAID' not in body
+    assert client.get('/presentation/invoices').status_code == 302
+    assert client.get('/presentation/invoices?ids=1,x').status_code == 400
+
+
+def test_deleting_a_clamp_drops_its_cached_invoice(client, login, make_clamp):
+    login(client)
+    clamp = make_clamp()
+    client.get(f'/presentation/invoice/{clamp.id}')
+    db.session.delete(clamp)
+    db.session.commit()
+    assert invoice_cache.get((0, clamp.id, 1)) is None
@@ -0,0 +1,105 @@
+import io
+import re
+from datetime import date, time
+
+import pytest
+
+import app as app_module
+import metrics
+from app import app, db, ClampData
+
+
+@pytest.fixture
+def fresh_metrics(tmp_path, monkeypatch):
+    registry = metrics.Metrics(str(tmp_path / 'metrics'))
+    registry.help = app_module.request_metrics.help
+    monkeypatch.setattr(app_module, 'request_metrics', registry)
+    return registry
+
+
+def _get(client, url, **kwargs):
+    resp = client.get(url, **kwargs)
+    body = resp.get_data(as_text=True)
+    resp.close()
+    return resp, body
+
+
+def _value(text, series):
+    match = re.search(r'^' + re.escape(series) + r' (\S+)$', text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_requests_are_timed_and_counted(client, fresh_metrics, login):
+    login(client)
+    db.session.add(ClampData(location='Main St', registration='ABC123', clamp_date=date(2025, 6, 2),
+                             time_in=time(9, 0), offense='Overstay', payment_status='Paid'))
+    db.session.commit()
+    for _ in range(2):
+        _get(client, '/api/clamps')
+    _get(client, '/')
+    _, text = _get(client, '/metrics')
+
+    assert '# TYPE cba_http_request_duration_seconds histogram' in text
+    assert _value(text, 'cba_http_requests_total{endpoint="api_clamps",method="GET",status="200"}') == 2
+    assert _value(text, 'cba_http_request_duration_seconds_count{endpoint="api_clamps",method="GET"}') == 2
+    assert _value(text, 'cba_http_request_duration_seconds_bucket{endpoint="api_clamps",method="GET",le="+Inf"}') == 2
+    assert _value(text, 'cba_db_statements_total{endpoint="api_clamps"}') >= 2
+    assert _value(text, 'cba_db_seconds_total{endpoint="api_clamps"}') > 0
+    assert _value(text, 'cba_template_render_seconds_count{template="index.html"}') == 1
+
+
+def test_upload_bytes_are_counted(client, fresh_metrics, login):
+    login(client)
+    data = {'location': 'Main St', 'clamp_date': '2025-06-02', 'time_in': '09:00', 'offense': 'Overstay',
+            'payment_status': 'Paid', 'image': (io.BytesIO(b'x' * 2048), 'photo.jpg')}
+    resp = client.post('/add-clamp', data=data, content_type='multipart/form-data')
+    resp.close()
+    _, text = _get(client, '/metrics')
+    assert _value(text, 'cba_upload_bytes_total{endpoint="add_clamp"}') > 2048
+
+
+def test_values_are_summed_over_worker_processes(tmp_path, monkeypatch):
+    registry = metrics.Metrics(str(tmp_path))
+    registry.inc('hits_total', {'route': 'a'})
+    registry.observe('latency_seconds', {}, 0.2)
+    registry.flush()
+    # another worker: a forked process starts empty and writes its own file
+    monkeypatch.setattr(metrics.os, 'getpid', lambda: 99999)
+    registry.inc('hits_total', {'route': 'a'}, 2)
+    registry.observe('latency_seconds', {}, 20)
+    registry.flush()
+    monkeypatch.undo()
+
+    text = registry.render()
+    assert _value(text, 'hits_total{route="a"}') == 3
+    assert _value(text, 'latency_seconds_bucket{le="0.25"}') == 1
+    assert _value(text, 'latency_seconds_bucket{le="+Inf"}') == 2
+    assert _value(text, 'latency_seconds_sum') == 20.2
+
+
+def test_metrics_need_an_admin_or_the_token(client, monkeypatch):
+    assert client.get('/metrics').status_code == 403
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    resp = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert resp.status_code == 200 and resp.mimetype == 'text/plain'
+
+
+def test_admins_can_profile_a_request(client, monkeypatch, login):
+    monkeypatch.setitem(app.config, 'PROFILE_INTERVAL_MS', 0.5)
+    login(client)
+    resp, _ = _get(client, '/', headers={'X-Profile': '1'})
+    url = resp.headers['X-Profile']
+    report, text = _get(client, url)
+    assert report.status_code == 200
+    assert 'samples' in text
+    assert url in _get(client, '/profiles')[1]
+    folded, _ = _get(client, url + '?format=folded')
+    assert folded.status_code == 200
+    assert client.get('/profiles/not..valid').status_code == 404
+
+
+def test_profiling_is_for_admins_only(client, login):
+    login(client, is_admin=False)
+    resp, _ = _get(client, '/', headers={'X-Profile': '1'})
+    assert 'X-Profile' not in resp.headers
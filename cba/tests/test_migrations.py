@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, event
+
+import app as app_module
+from app import app, db, migrations
+
+
+def _legacy_db(path):
+    # a database from before versioned migrations: no schema_version, older columns
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE user (id INTEGER PRIMARY KEY, username TEXT, password_hash TEXT, is_admin BOOLEAN);
+        CREATE TABLE clamp_data (id INTEGER PRIMARY KEY, location TEXT, clamp_date DATE,
+                                 payment_status TEXT, created_at DATETIME);
+        CREATE TABLE appeal (id INTEGER PRIMARY KEY, clamp_id INTEGER);
+    """)
+    conn.close()
+    return create_engine(f'sqlite:///{path}')
+
+
+def _columns(path, table):
+    conn = sqlite3.connect(path)
+    cols = {row[1] for row in conn.execute(f"PRAGMA table_info('{table}')")}
+    conn.close()
+    return cols
+
+
+def test_legacy_database_gets_its_missing_columns_first(tmp_path):
+    path = tmp_path / 'legacy.db'
+    engine = _legacy_db(path)
+    assert migrations.check(engine) == (None, migrations.head())
+
+    applied = migrations.apply_migrations(engine, verbose=False)
+    assert applied[:2] == [0, 1]
+    assert {'registration', 'amount_paid', 'clamp_ref'} <= _columns(path, 'clamp_data')
+    assert 'force_password_change' in _columns(path, 'user')
+    assert migrations.check(engine) == (migrations.head(), migrations.head())
+    engine.dispose()
+
+
+def test_roll_forward_in_steps(tmp_path):
+    engine = _legacy_db(tmp_path / 'legacy.db')
+    assert migrations.apply_migrations(engine, verbose=False, target=2) == [0, 1, 2]
+    assert migrations.check(engine)[0] == 2
+    assert [v for v, _ in migrations.pending(engine)] == list(range(3, migrations.head() + 1))
+    assert migrations.apply_migrations(engine, verbose=False)[0] == 3
+    assert migrations.pending(engine) == []
+    engine.dispose()
+
+
+def test_start_up_check_is_one_read(tmp_path, monkeypatch):
+    engine = _legacy_db(tmp_path / 'legacy.db')
+    migrations.apply_migrations(engine, verbose=False)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    migrations.check(engine)
+    assert statements == ['SELECT MAX(version) FROM schema_version']
+    engine.dispose()
+
+
+def test_strict_check_refuses_an_old_schema(app_ctx, monkeypatch):
+    monkeypatch.setitem(app.config, 'SCHEMA_CHECK', 'strict')
+    app_module.check_schema()  # the fixture migrated to head
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('DELETE FROM schema_version WHERE version = ?', (migrations.head(),))
+    with pytest.raises(migrations.SchemaOutOfDate):
+        app_module.check_schema()
+    monkeypatch.setitem(app.config, 'SCHEMA_CHECK', 'warn')
+    app_module.check_schema()
+
+
+def test_migrate_command(app_ctx):
+    runner = app.test_cli_runner()
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('DELETE FROM schema_version WHERE version = ?', (migrations.head(),))
+    result = runner.invoke(args=['migrate', '--status'])
+    assert f'pending v{migrations.head():04d}' in result.output
+    result = runner.invoke(args=['migrate'])
+    assert f'applied v{migrations.head():04d}' in result.output
+    assert 'Schema is up to date' in runner.invoke(args=['migrate']).output
@@ -0,0 +1,79 @@
+import hashlib
+import io
+import os
+
+import blobstore
+from app import app, db, ClampData, PhotoBlob, sweep_photo_blobs
+
+STATIC = os.path.join(app.root_path, 'static')
+FORM = {'location': 'Main St', 'clamp_date': '2025-03-01', 'time_in': '09:00', 'offense': 'Overstay',
+        'payment_status': 'Processing'}
+
+
+def _add(client, content, name='car.JPG'):
+    resp = client.post('/add-clamp', data={**FORM, 'image': (io.BytesIO(content), name)},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 302
+    return ClampData.query.order_by(ClampData.id.desc()).first()
+
+
+def _refcount(path):
+    db.session.expire_all()
+    blob = db.session.get(PhotoBlob, path)
+    return blob.refcount if blob else None
+
+
+def test_store_hashes_into_shards_and_dedupes(tmp_path):
+    content = b'photo-bytes' * 10000
+    digest = hashlib.sha256(content).hexdigest()
+    first = blobstore.store(str(tmp_path), io.BytesIO(content), 'IMG_1.JPG')
+    again = blobstore.store(str(tmp_path), io.BytesIO(content), 'retry.jpg')
+
+    assert first == again == f'images/uploads/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+    assert blobstore.is_blob(first)
+    assert (tmp_path / first).read_bytes() == content
+    assert os.listdir(tmp_path / 'images' / 'uploads' / 'tmp') == []
+
+
+def test_identical_uploads_share_one_counted_blob(client, login):
+    login(client)
+    a = _add(client, b'same-photo-1')
+    b = _add(client, b'same-photo-1')
+    assert a.image_filename == b.image_filename
+    assert _refcount(a.image_filename) == 2
+
+    resp = client.get(f'/delete-clamp/{a.id}')
+    assert resp.status_code == 302
+    assert _refcount(b.image_filename) == 1
+    assert sweep_photo_blobs(grace=0) == []
+    assert os.path.exists(os.path.join(STATIC, b.image_filename))
+
+    client.post(f'/delete-clamp-with-appeals/{b.id}')
+    assert _refcount(b.image_filename) == 0
+    assert sweep_photo_blobs(grace=0) == [b.image_filename]
+    assert not os.path.exists(os.path.join(STATIC, b.image_filename))
+    assert _refcount(b.image_filename) is None
+
+
+def test_replacing_a_photo_moves_the_reference(client, login):
+    login(client)
+    clamp = _add(client, b'first-photo-2')
+    old = clamp.image_filename
+    client.post(f'/edit-clamp/{clamp.id}', data={**FORM, 'image': (io.BytesIO(b'second-photo-2'), 'new.jpg')},
+                content_type='multipart/form-data')
+    db.session.expire_all()
+    new = db.session.get(ClampData, clamp.id).image_filename
+    assert new != old
+    assert (_refcount(old), _refcount(new)) == (0, 1)
+    # the grace period protects recently touched blobs
+    assert sweep_photo_blobs(grace=3600) == []
+    assert sweep_photo_blobs(grace=0) == [old]
+    client.post(f'/delete-clamp-with-appeals/{clamp.id}')
+    sweep_photo_blobs(grace=0)
+
+
+def test_walk_removes_untracked_blobs(client):
+    path = blobstore.store(STATIC, io.BytesIO(b'never-committed-3'), 'x.jpg')
+    assert sweep_photo_blobs(grace=0) == []
+    assert path in sweep_photo_blobs(walk=True, grace=0)
+    assert not os.path.exists(os.path.join(STATIC, path))
@@ -0,0 +1,70 @@
+from datetime import date, time
+
+import plates
+from app import db, ClampData, Appeal
+
+
+def test_normalize_and_distance():
+    assert plates.normalize(' ab-12 3 ') == 'AB123'
+    assert plates.normalize('--') is None
+    assert plates.distance('AB123', 'AB128') == 1
+    assert plates.distance('AB123', 'BA123') == 2
+    assert plates.distance('AB123', 'XYZ99') == plates.MAX_DISTANCE + 1
+
+
+def test_plate_is_set_on_write(app_ctx, make_clamp):
+    clamp = make_clamp(registration='ab 123')
+    assert clamp.plate == 'AB123'
+    clamp.registration = 'cd-456'
+    db.session.commit()
+    assert clamp.plate == 'CD456'
+
+
+def test_lookup_gathers_spellings_history_and_unpaid(client, login, make_clamp):
+    login(client, is_admin=False)
+    first = make_clamp(registration='AB 123', payment_status='Not Paid', clamp_date=date(2025, 6, 1))
+    second = make_clamp(registration='ab-123', payment_status='Paid', clamp_date=date(2025, 6, 2))
+    typo = make_clamp(registration='AB128', payment_status='Processing', clamp_date=date(2025, 6, 3))
+    make_clamp(registration='AB129X', clamp_date=date(2025, 6, 4))   # two edits away: listed, not counted
+    make_clamp(registration='XY999', clamp_date=date(2025, 6, 5))
+    db.session.add(Appeal(clamp_id=first.id, appeal_reason='Signage unclear'))
+    db.session.commit()
+
+    body = client.get('/api/plate?q=ab123').get_json()
+    assert body['plate'] == 'AB123'
+    assert [(m['plate'], m['distance'], m['clamps']) for m in body['matches']] == [('AB123', 0, 2), ('AB128', 1, 1)]
+    assert [m['plate'] for m in body['similar']] == ['AB129X']
+    assert [c['id'] for c in body['clamps']] == [typo.id, second.id, first.id]
+    assert body['clamps'][2]['appeals'][0]['appeal_reason'] == 'Signage unclear'
+    assert body['unpaid'] == {'count': 2, 'clamp_ids': [first.id, typo.id]}
+
+    exact = client.get('/api/plate?q=AB 123&distance=0').get_json()
+    assert [c['id'] for c in exact['clamps']] == [second.id, first.id]
+
+
+def test_lookup_rejects_empty_plates(client, login):
+    login(client, is_admin=False)
+    assert client.get('/api/plate?q=--').status_code == 400
+
+
+def test_backfill_fills_bulk_loaded_rows(app_ctx):
+    db.session.execute(ClampData.__table__.insert(), [
+        {'location': 'Main St', 'registration': 'ef 789', 'clamp_date': date(2025, 6, 1), 'time_in': time(9, 0),
+         'offense': 'Overstay'}])
+    db.session.commit()
+    with db.engine.connect() as conn:
+        assert plates.backfill(conn) == 1
+        assert [p for p, _, _ in plates.similar(conn, 'EF788')] == ['EF789']
+
+
+def test_candidates_are_bounded_by_length_and_shared_trigrams(app_ctx, monkeypatch, make_clamp):
+    # longer plates containing the query share all its trigrams but are too long to be a typo of it
+    db.session.execute(ClampData.__table__.insert(), [
+        {'location': 'Main St', 'registration': f'AB0XYZ13{i:04d}', 'plate': f'AB0XYZ13{i:04d}',
+         'clamp_date': date(2025, 6, 1), 'time_in': time(9, 0), 'offense': 'Overstay'} for i in range(20)])
+    db.session.commit()
+    make_clamp(registration='AB0XYZ12')
+    make_clamp(registration='QQ0XYZ99')  # shares two trigrams, fewer than a one-edit typo must
+    monkeypatch.setattr(plates, 'MAX_CANDIDATES', 1)
+    with db.engine.connect() as conn:
+        assert plates.similar(conn, 'AB0XYZ13', max_distance=1) == [('AB0XYZ12', 1, 1)]
@@ -0,0 +1,84 @@
+"""Each route must issue a fixed number of SQL statements, however many rows
+the tables hold. The count comes from the X-Query-Count header set by the
+per-request counter in app.py."""
+from datetime import date, time, timedelta
+
+import pytest
+
+from app import db, ClampData, Appeal, User, session_claims
+
+# route -> maximum statements per request
+BUDGETS = {
+    '/': 4,
+    '/dashboard': 3,
+    '/clamp_list': 1,
+    '/api/clamps': 1,
+    '/api/clamps?status=Paid': 1,
+    '/api/clamp/{id}': 1,
+    '/clamp/{id}/appeals': 1,
+    '/appeals': 1,
+    # rollup reads only: the row query streams after the header is set
+    '/invoicing?date_from=2025-01-01&date_to=2025-12-31': 3,
+    '/presentation/invoice/{id}': 1,
+}
+
+
+def _seed(n_clamps):
+    admin = User(username='boss', password_hash='x', is_admin=True)
+    db.session.add(admin)
+    for i in range(n_clamps):
+        clamp = ClampData(location=f'Loc {i % 4}', registration=f'REG{i}', clamp_date=date(2025, 1, 1) + timedelta(days=i % 200),
+                          time_in=time(9, 0), offense='Overstay', payment_status='Paid' if i % 2 else 'Processing',
+                          amount_paid=5.0)
+        db.session.add(clamp)
+        db.session.flush()
+        # several appeals per clamp so lazy loads would multiply
+        for _ in range(3):
+            db.session.add(Appeal(clamp_id=clamp.id, appeal_reason='Signage unclear'))
+    db.session.commit()
+    return admin, ClampData.query.order_by(ClampData.id).first().id
+
+
+def _counts(client, n_clamps):
+    admin, clamp_id = _seed(n_clamps)
+    with client.session_transaction() as sess:
+        sess.update(session_claims(admin))
+    # the first request on a worker checks the session's credential version
+    # against the database; budgets are for the steady state after that
+    client.get('/dashboard')
+    counts = {}
+    for route in BUDGETS:
+        # start from an empty identity map, as a fresh request in production would
+        db.session.remove()
+        resp = client.get(route.format(id=clamp_id))
+        assert resp.status_code == 200, route
+        counts[route] = int(resp.headers['X-Query-Count'])
+    return counts
+
+
+@pytest.fixture
+def small_counts(client):
+    return _counts(client, 3)
+
+
+def test_query_counts_are_flat_and_within_budget(small_counts, app_ctx):
+    db.drop_all()
+    db.create_all()
+    large_counts = _counts(app_ctx.test_client(), 120)
+
+    for route, budget in BUDGETS.items():
+        assert large_counts[route] <= budget, f'{route}: {large_counts[route]} statements (budget {budget})'
+        assert large_counts[route] == small_counts[route], f'{route}: count grows with row count'
+
+
+def test_deleting_clamp_with_appeals_does_not_load_them(client):
+    admin, clamp_id = _seed(1)
+    with client.session_transaction() as sess:
+        sess.update(session_claims(admin))
+    client.get('/dashboard')
+    db.session.remove()
+    resp = client.post(f'/delete-clamp-with-appeals/{clamp_id}')
+    assert resp.get_json()['status'] == 'ok'
+    # clamp fetch, bulk appeal delete, rollup upsert + cleanup, clamp delete
+    assert int(resp.headers['X-Query-Count']) <= 5
+    assert Appeal.query.count() == 0
@@ -0,0 +1,128 @@
+"""Run EXPLAIN QUERY PLAN on every statement the routes issue and fail on full
+table scans of the hot tables. A plan step like "SCAN clamp_data" (no index)
+means a query has degraded to reading the whole table."""
+import re
+import sqlite3
+from datetime import date, time, timedelta
+
+from sqlalchemy import event
+
+from app import db, migrations, ClampData, Appeal, User
+
+HOT_TABLES = ('clamp_data', 'appeal', 'clamp_daily_rollup')
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(%s)(?: AS \w+)?$' % '|'.join(HOT_TABLES))
+# endpoints that list a whole table by design
+FULL_SCAN_ALLOWED = {'appeals'}
+# an unfiltered walk in rowid order that stops at LIMIT reads only LIMIT rows
+ROWID_PAGE = re.compile(r'ORDER BY \w+\.id(?: ASC| DESC)?\s+LIMIT ')
+
+
+def _seed():
+    admin = User(username='boss', password_hash='x', is_admin=True)
+    db.session.add(admin)
+    for i in range(30):
+        clamp = ClampData(location=f'Loc {i % 3}', registration=f'REG{i}', clamp_date=date(2025, 1, 1) + timedelta(days=i),
+                          time_in=time(9, 0), offense='Overstay', payment_status='Paid' if i % 2 else 'Processing',
+                          amount_paid=10.0)
+        db.session.add(clamp)
+        db.session.flush()
+        db.session.add(Appeal(clamp_id=clamp.id, appeal_reason='Signage unclear'))
+    db.session.commit()
+    return admin
+
+
+def _capture(client, urls):
+    from flask import has_request_context, request
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            endpoint = request.endpoint if has_request_context() else None
+            statements.append((endpoint, statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        for method, url in urls:
+            resp = client.open(url, method=method)
+            assert resp.status_code < 500, (url, resp.status_code)
+            # streamed bodies run their queries while being read
+            resp.get_data()
+            resp.close()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+    return statements
+
+
+def _plan(statement, parameters):
+    with db.engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+def test_route_queries_use_indexes(client):
+    admin = _seed()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin.id
+    clamp_id = ClampData.query.order_by(ClampData.id).first().id
+    page = client.get('/api/clamps?limit=5').get_json()
+
+    urls = [
+        ('GET', '/'),
+        ('GET', '/dashboard'),
+        ('GET', '/clamp_list'),
+        ('GET', '/clamp_list?status=Paid'),
+        ('GET', '/api/clamps?limit=5&cursor=' + page['next_cursor']),
+        ('GET', '/api/clamps?status=Paid&limit=5'),
+        ('GET', '/api/clamps?location=Loc%201&order=asc'),
+        ('GET', '/api/clamps?registration=REG7'),
+        ('GET', '/api/clamps?date_from=2025-01-05&date_to=2025-01-10'),
+        ('GET', '/api/clamps?sort=id&limit=5'),
+        ('GET', '/api/search?q=loc 2'),
+        ('GET', '/api/plate?q=reg 7'),
+        ('GET', '/invoicing?date_from=2025-01-01&date_to=2025-01-31'),
+        ('GET', '/invoicing?date_from=2025-01-01&date_to=2025-01-31&location=Loc%202'),
+        ('GET', f'/api/clamp/{clamp_id}'),
+        ('GET', f'/clamp/{clamp_id}/appeals'),
+        ('GET', f'/presentation/invoice/{clamp_id}'),
+        ('GET', f'/presentation/invoices?ids={clamp_id},{clamp_id + 1}'),
+        ('GET', '/presentation/invoices?date_from=2025-01-01&date_to=2025-01-31&location=Loc%202'),
+        ('GET', '/appeals'),
+        ('GET', f'/delete-clamp/{clamp_id + 1}'),
+        ('POST', f'/delete-clamp-with-appeals/{clamp_id}'),
+    ]
+    statements = _capture(client, urls)
+    assert statements
+
+    offenders = []
+    for endpoint, statement, parameters in statements:
+        if endpoint in FULL_SCAN_ALLOWED:
+            continue
+        if ' WHERE ' not in statement and ROWID_PAGE.search(statement):
+            continue
+        for step in _plan(statement, parameters):
+            if FULL_SCAN.match(step):
+                offenders.append((endpoint, step, ' '.join(statement.split())))
+    assert not offenders, '\n'.join(map(str, offenders))
+
+
+def test_index_migration_upgrades_legacy_database(tmp_path):
+    from sqlalchemy import create_engine
+
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE clamp_data (id INTEGER PRIMARY KEY, location TEXT, registration TEXT, clamp_date DATE,
+                                 payment_status TEXT, created_at DATETIME);
+        CREATE TABLE appeal (id INTEGER PRIMARY KEY, clamp_id INTEGER);
+    """)
+    conn.close()
+
+    engine = create_engine(f'sqlite:///{path}')
+    applied = migrations.apply_migrations(engine, verbose=False)
+    assert 1 in applied
+    assert migrations.apply_migrations(engine, verbose=False) == []
+
+    conn = sqlite3.connect(path)
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+    assert {'ix_clamp_data_status_date_id', 'ix_appeal_clamp_id', 'ix_clamp_data_created_at'} <= names
+    engine.dispose()
@@ -0,0 +1,88 @@
+from datetime import date, time
+
+from app import db, ClampData, ClampDailyRollup, rebuild_clamp_rollup, revenue_summary, revenue_breakdown
+
+
+def _rollup_rows():
+    return sorted(
+        (r.payment_status, r.day, r.location, r.offense, r.clamp_count, round(r.amount_total, 2))
+        for r in ClampDailyRollup.query.all()
+    )
+
+
+def _form(**overrides):
+    data = {
+        'location': 'Main St', 'registration': 'ABC123', 'clamp_date': '2025-03-10',
+        'time_in': '09:00', 'offense': 'No permit', 'payment_status': 'Paid', 'amount_paid': '50.00',
+    }
+    data.update(overrides)
+    return data
+
+
+def test_rollup_tracks_add_edit_delete(client, login):
+    login(client)
+    client.post('/add-clamp', data=_form())
+    client.post('/add-clamp', data=_form(amount_paid='25.00'))
+    client.post('/add-clamp', data=_form(location='Harbour Rd', payment_status='Not Paid'))
+    assert revenue_summary('Paid') == {'count': 2, 'total': 75.0}
+
+    first, second, third = ClampData.query.order_by(ClampData.id).all()
+    # move one paid clamp to another day and amount, mark the unpaid one as paid
+    client.post(f'/edit-clamp/{second.id}', data=_form(clamp_date='2025-03-11', amount_paid='30.00'))
+    client.post(f'/edit-clamp/{third.id}', data=_form(location='Harbour Rd', amount_paid='10.00'))
+    client.get(f'/delete-clamp/{first.id}')
+
+    incremental = _rollup_rows()
+    rebuild_clamp_rollup()
+    assert incremental == _rollup_rows()
+    assert revenue_summary('Paid') == {'count': 2, 'total': 40.0}
+    assert revenue_summary('Not Paid') == {'count': 0, 'total': 0.0}
+
+
+def test_revenue_queries_respect_range_and_grouping(app_ctx):
+    for day, loc, amount in [(1, 'A', 10), (1, 'B', 20), (2, 'A', 5), (20, 'A', 100)]:
+        db.session.add(ClampData(location=loc, clamp_date=date(2025, 4, day), time_in=time(8, 0),
+                                 offense='Overstay', payment_status='Paid', amount_paid=amount))
+    db.session.commit()
+
+    assert revenue_summary('Paid', date(2025, 4, 1), date(2025, 4, 2)) == {'count': 3, 'total': 35.0}
+    assert revenue_summary('Paid', date(2025, 4, 1), date(2025, 4, 30), location='A')['total'] == 115.0
+    by_location = revenue_breakdown('location', 'Paid', date(2025, 4, 1), date(2025, 4, 2))
+    assert [(r['key'], r['count'], r['total']) for r in by_location] == [('A', 2, 15.0), ('B', 1, 20.0)]
+    by_day = revenue_breakdown('day', 'Paid')
+    assert [r['key'] for r in by_day] == [date(2025, 4, 1), date(2025, 4, 2), date(2025, 4, 20)]
+
+
+def test_invoicing_uses_date_range(client, login):
+    login(client)
+    client.post('/add-clamp', data=_form(clamp_date='2025-05-02', amount_paid='12.50'))
+    client.post('/add-clamp', data=_form(clamp_date='2025-06-02', amount_paid='99.00'))
+    body = client.get('/invoicing?date_from=2025-05-01&date_to=2025-05-31').get_data(as_text=True)
+    assert '12.50 USD' in body
+    assert '99.00' not in body
+
+
+def test_invoicing_streams_rows_with_database_total(client, login):
+    login(client)
+    for i in range(30):
+        client.post('/add-clamp', data=_form(clamp_date='2025-05-02', location='A' if i % 2 else 'B',
+                                              registration=f'R{i}', amount_paid='1.25'))
+    resp = client.get('/invoicing?date_from=2025-05-01&date_to=2025-05-31&location=A')
+    assert resp.is_streamed
+    assert resp.headers['X-Accel-Buffering'] == 'no'
+    body = resp.get_data(as_text=True)
+    assert body.count('<span class="status-paid">Paid</span>') == 15
+    # the footer total comes from the rollup, after the streamed rows
+    assert body.index('18.75 USD') > body.rindex('status-paid')
+
+
+def test_invoicing_requires_a_period(client, login):
+    login(client)
+    today = date.today()
+    resp = client.get('/invoicing?location=A')
+    assert resp.status_code == 302
+    assert f'date_from={today.replace(day=1).isoformat()}' in resp.location
+    assert f'date_to={today.isoformat()}' in resp.location and 'location=A' in resp.location
+
+    backwards = client.get('/invoicing?date_from=2025-05-31&date_to=2025-05-01')
+    assert backwards.status_code == 302 and 'date_from=2025-05-31' not in backwards.location
@@ -0,0 +1,55 @@
+
+from app import app, db
+import search
+
+
+def test_search_ranks_prefix_matches_and_highlights(client, login, make_clamp):
+    login(client, is_admin=False)
+    make_clamp(location='Harbour Road', registration='XY 999', car_type='Toyota')
+    target = make_clamp(location='Main Street', registration='TOY 123', car_type='Honda')
+    items = client.get('/api/search?q=toy').get_json()['items']
+    # a registration hit outranks a car type hit
+    assert [i['id'] for i in items][0] == target.id
+    assert items[0]['highlight'] == {'registration': '<mark>TOY</mark> 123'}
+    assert len(items) == 2
+
+    # every word must match, each as a prefix
+    items = client.get('/api/search?q=harb toyo').get_json()['items']
+    assert len(items) == 1 and items[0]['highlight']['location'] == '<mark>Harbour</mark> Road'
+
+
+def test_index_follows_updates_and_deletes(client, login, make_clamp):
+    login(client, is_admin=False)
+    clamp = make_clamp(clamp_ref='R-100')
+    clamp.clamp_ref = 'Z-200'
+    db.session.commit()
+    assert client.get('/api/search?q=R 100').get_json()['items'] == []
+    assert len(client.get('/api/search?q=Z 200').get_json()['items']) == 1
+    db.session.delete(clamp)
+    db.session.commit()
+    assert client.get('/api/search?q=Z 200').get_json()['items'] == []
+
+
+def test_highlights_are_escaped_and_queries_are_not_fts_syntax(client, login, make_clamp):
+    login(client, is_admin=False)
+    make_clamp(location='<b>Bold</b> Ave')
+    items = client.get('/api/search?q=bold').get_json()['items']
+    assert items[0]['highlight']['location'] == '&lt;b&gt;<mark>Bold</mark>&lt;/b&gt; Ave'
+    # operators and quotes are treated as plain words, never as FTS5 syntax
+    assert client.get('/api/search?q="NEAR(main OR" *').status_code == 200
+    assert client.get('/api/search?q=').get_json()['items'] == []
+
+
+def test_rebuild_command_restores_the_index(client, make_clamp):
+    make_clamp(registration='ABC123')
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO clamp_fts(clamp_fts) VALUES ('delete-all')")
+        assert search.search(conn, 'abc123') == []
+    result = app.test_cli_runner().invoke(args=['rebuild-search'])
+    assert 'rebuilt' in result.output
+    with db.engine.connect() as conn:
+        assert len(search.search(conn, 'abc123')) == 1
+
+
+def test_search_requires_login(client):
+    assert client.get('/api/search?q=main').status_code == 302
@@ -0,0 +1,70 @@
+import gzip
+import shutil
+
+import pytest
+from flask import url_for
+
+import assets
+from app import app, load_asset_manifest
+
+
+@pytest.fixture
+def built_static(tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns('uploads', 'dist'))
+    manifest = assets.build(str(static))
+    monkeypatch.setattr(app, 'static_folder', str(static))
+    load_asset_manifest()
+    yield manifest
+    monkeypatch.undo()
+    load_asset_manifest()
+
+
+def test_build_hashes_assets_and_rewrites_web_manifest(built_static):
+    files = built_static['files']
+    assert {'css/style.css', 'js/pwa.js', 'manifest.json', 'images/icon-192.png'} <= set(files)
+    assert files['css/style.css'].startswith('dist/css/style.') and files['css/style.css'].endswith('.css')
+
+    web_manifest = (app.static_folder + '/' + files['manifest.json'])
+    with open(web_manifest) as fh:
+        body = fh.read()
+    assert '/static/' + files['images/icon-192.png'] in body
+    assert '"start_url": "/static/"' in body
+
+
+def test_url_for_static_points_at_hashed_names(built_static, app_ctx):
+    with app.test_request_context():
+        assert url_for('static', filename='css/style.css') == '/static/' + built_static['files']['css/style.css']
+        # files outside the build are untouched
+        assert url_for('static', filename='images/uploads/a.jpg') == '/static/images/uploads/a.jpg'
+
+
+def test_hashed_assets_are_immutable_and_precompressed(built_static, client):
+    url = '/static/' + built_static['files']['css/style.css']
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert resp.status_code == 200
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in resp.headers['Cache-Control'] and 'max-age=31536000' in resp.headers['Cache-Control']
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    with open(app.static_folder + '/css/style.css', 'rb') as fh:
+        assert gzip.decompress(resp.data) == fh.read()
+
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+
+
+def test_service_worker_precaches_manifest_urls(built_static, client):
+    resp = client.get('/service-worker.js')
+    body = resp.get_data(as_text=True)
+    assert resp.headers['Content-Type'].startswith('application/javascript')
+    assert resp.headers['Cache-Control'] == 'no-cache'
+    assert f"clamping-admin-{built_static['version']}" in body
+    assert '/static/' + built_static['files']['css/style.css'] in body
+    assert '"/static/css/style.css"' not in body
+
+
+def test_service_worker_without_build_uses_plain_urls(client):
+    body = client.get('/service-worker.js').get_data(as_text=True)
+    assert 'clamping-admin-dev' in body
+    assert '"/static/css/style.css"' in body